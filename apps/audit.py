@@ -0,0 +1,210 @@
+"""
+Write-behind audit pipeline for registration, login and deletion events.
+
+crud functions only enqueue events after their own transaction has committed; a
+single background thread drains the bounded queue and writes RegistrationLog and
+UserEvent rows with multi-row INSERTs, flushing every AUDIT_BATCH_SIZE events or
+AUDIT_FLUSH_INTERVAL_MS, whichever comes first.
+
+When the queue is full, AUDIT_OVERFLOW=block makes the caller wait up to
+AUDIT_BLOCK_TIMEOUT_MS (backpressure) before the event is dropped; "drop" drops
+it at once. Callers on the event loop thread (including crud run through
+AsyncSession.run_sync) never wait. Events still queued when a worker is killed
+without a clean shutdown are lost, so nothing that must happen goes through the
+queue: deleting a user removes their RegistrationLog rows in the deleting
+transaction, after `erasing` has made the writer discard registrations of that
+user still queued from before; `deleted` only records the event.
+"""
+import queue
+import asyncio
+import logging
+import itertools
+import threading
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from config import settings
+from database import SessionLocal
+from models import RegistrationLog, UserEvent
+
+_STOP = object()
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+class AuditPipeline:
+    def __init__(self, enabled: bool, max_queue: int, batch_size: int, flush_interval: float,
+                 overflow: str = "block", block_timeout: float = 0.05):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._sequence = itertools.count()
+        self._erased = {}  # user_mail -> sequence number of its deletion, until the writer is past it
+        self._erased_lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.backpressure = 0
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        logging.info(f"✅ Audit pipeline started (batch {self.batch_size}, every {self.flush_interval * 1000:.0f} ms).")
+
+    def shutdown(self):
+        """Flushes everything still queued and stops the writer thread."""
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join()
+        logging.info(f"🛑 Audit pipeline stopped: {self.written} events written, {self.dropped} dropped, {self.failed} failed.")
+
+    # Producers
+
+    def submit(self, kind: str, row: dict, wait: bool = True) -> bool:
+        """Queues one event; returns False if it was dropped. Never waits on the event loop thread."""
+        if not self.enabled:
+            return False
+        item = (next(self._sequence), kind, row)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if not (wait and self.overflow == "block") or _on_event_loop():
+                self.dropped += 1
+                return False
+            self.backpressure += 1
+            try:
+                self._queue.put(item, timeout=self.block_timeout)
+            except queue.Full:
+                self.dropped += 1
+                return False
+        self.enqueued += 1
+        return True
+
+    def registered(self, username: str, user_mail: str, role_id: int, wait: bool = True):
+        self.submit("registration", {
+            "username": username, "user_mail": user_mail, "role_id": role_id, "log_date": datetime.now(),
+        }, wait)
+
+    def login(self, user_mail: str, user_id, success: bool, wait: bool = True):
+        self.submit("event", {
+            "event_type": "login_success" if success else "login_failure",
+            "user_mail": user_mail, "user_id": user_id, "event_date": datetime.now(),
+        }, wait)
+
+    def deregistered(self, user_mails, wait: bool = True):
+        """Records soft deletions; the RegistrationLog rows stay until the user is purged (see `deleted`)."""
+        now = datetime.now()
+        for user_mail in user_mails:
+            self.submit("event", {"event_type": "deregistered", "user_mail": user_mail, "user_id": None, "event_date": now}, wait)
+
+    def erasing(self, user_mails):
+        """
+        Called right before deleting the RegistrationLog rows of `user_mails`: registrations of
+        these users queued until now are never written. Waits for a batch being written, so the
+        DELETE that follows also sees its rows.
+        """
+        if not self.enabled:
+            return
+        with self._erased_lock:
+            sequence = next(self._sequence)
+            for user_mail in user_mails:
+                self._erased[user_mail] = sequence
+
+    def deleted(self, user_mails, wait: bool = True):
+        """Records account deletions, whose RegistrationLog rows the caller already deleted (see `erasing`)."""
+        if not self.enabled:
+            return
+        now = datetime.now()
+        for user_mail in user_mails:
+            self.submit("event", {"event_type": "deleted", "user_mail": user_mail, "user_id": None, "event_date": now}, wait)
+
+    # Writer thread
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            while True:
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    # Drain whatever is already queued (everything, when stopping) without waiting
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch):
+        events = [row for _, kind, row in batch if kind == "event"]
+        db = SessionLocal()
+        try:
+            # Filtered and committed under one lock, so a deletion (`erasing`) either keeps these
+            # registrations from being written or waits until its DELETE can see them
+            with self._erased_lock:
+                # A registration queued before its user was deleted must not be written after the deletion;
+                # one queued after it (a re-registration) is kept
+                registrations = [
+                    row for sequence, kind, row in batch
+                    if kind == "registration" and sequence > self._erased.get(row["user_mail"], -1)
+                ]
+                if registrations:
+                    db.execute(insert(RegistrationLog).values(registrations))
+                if events:
+                    db.execute(insert(UserEvent).values(events))
+                db.commit()
+                # Producers may enqueue slightly out of order, so only erasures older than the
+                # newest event of this batch are forgotten
+                newest = max(sequence for sequence, _, _ in batch)
+                self._erased = {mail: sequence for mail, sequence in self._erased.items() if sequence > newest}
+            self.written += len(batch)
+        except SQLAlchemyError as e:
+            db.rollback()
+            self.failed += len(batch)
+            logging.error(f"🔥 Failed to write {len(batch)} audit events: {e}")
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "backpressure": self.backpressure,
+        }
+
+
+audit_pipeline = AuditPipeline(
+    settings.AUDIT_ENABLED,
+    settings.AUDIT_QUEUE_SIZE,
+    settings.AUDIT_BATCH_SIZE,
+    settings.AUDIT_FLUSH_INTERVAL_MS / 1000,
+    settings.AUDIT_OVERFLOW,
+    settings.AUDIT_BLOCK_TIMEOUT_MS / 1000,
+)
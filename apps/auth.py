@@ -0,0 +1,96 @@
+import logging
+from typing import NamedTuple, Optional
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from cache import TTLCache
+from config import settings
+from crud import get_user_by_email, read_user_by_email
+from database import open_session, close_session
+from revocation import revocation_store
+from utils import decode_access_token
+
+
+class CurrentUser(NamedTuple):
+    """Compact identity of an authenticated caller, safe to cache across requests."""
+    id: int
+    email: str
+    phone: str
+    role_id: int
+
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+# Recently verified tokens -> (CurrentUser, claims), each entry capped at the token's exp
+verified_token_cache = TTLCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL_SECONDS)
+
+
+def _unauthorized(detail: str):
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+async def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)) -> CurrentUser:
+    """
+    Resolves the bearer token to the calling user.
+    Hot tokens are served from the verified-token cache, skipping signature
+    verification and the UserMaster lookup; misses read UserMaster from the user's shard or a replica when configured.
+    Revocation is checked on every request, cached or not, against the in-memory store.
+    """
+    if credentials is None:
+        raise _unauthorized("Not authenticated.")
+    return await user_for_token(credentials.credentials)
+
+
+async def user_for_token(token: str, payload: Optional[dict] = None) -> CurrentUser:
+    """get_current_user for a raw token; `payload`, the claims from token_claims, saves verifying the signature again."""
+    cached = verified_token_cache.get(token)
+    if cached is not None:
+        current_user, payload = cached
+        check_not_revoked(payload)
+        return current_user
+
+    payload = payload or decode_access_token(token)
+    check_not_revoked(payload)
+    db = open_session()
+    try:
+        user = await read_user_by_email(db, get_user_by_email, payload["sub"])
+    finally:
+        await close_session(db)
+    if user is None:
+        logging.warning(f"⚠ Token presented for unknown user: {payload['sub']}")
+        raise _unauthorized("User no longer exists.")
+
+    current_user = CurrentUser(user.id, user.user_mail, user.user_number, user.role_id)
+    verified_token_cache.set(token, (current_user, payload), expires_at=payload["exp"])
+    return current_user
+
+
+def check_not_revoked(payload: dict):
+    """Rejects tokens revoked individually (by jti) or through their subject."""
+    if revocation_store.is_revoked(payload.get("jti"), payload["sub"], payload.get("iat", 0)):
+        raise _unauthorized("Token has been revoked.")
+
+
+def token_claims(credentials: Optional[HTTPAuthorizationCredentials]) -> Optional[dict]:
+    """
+    Claims of a correctly signed, unexpired bearer token that may since have been revoked, or
+    None for a missing or invalid one. Read from the verified-token cache when the token is
+    there; never touches the database.
+    """
+    if credentials is None:
+        return None
+    cached = verified_token_cache.get(credentials.credentials)
+    if cached is not None:
+        return cached[1]
+    try:
+        return decode_access_token(credentials.credentials)
+    except HTTPException:
+        return None
+
+
+async def get_token_claims(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+    current_user: CurrentUser = Depends(get_current_user),
+) -> dict:
+    """Claims of the already-authenticated bearer token, for endpoints that act on the token itself."""
+    cached = verified_token_cache.get(credentials.credentials)
+    return cached[1] if cached is not None else decode_access_token(credentials.credentials)
@@ -0,0 +1,166 @@
+"""
+Bloom filter over registered emails and phone numbers.
+
+A negative answer is exact: the identity is not in UserRegistration or UserMaster
+(as of the last rebuild plus every registration this worker has made since).
+A positive answer only means "probably taken" and must be confirmed with an
+indexed lookup. Deleted users stay in the filter until the next rebuild, which
+only costs an extra exact check. Each worker builds its own filter in a background
+thread; until the first build finishes every identity counts as a probable hit.
+"""
+import math
+import hashlib
+import logging
+import threading
+from sqlalchemy import select
+from config import settings
+from database import SessionLocal
+from sharding import shard_router
+from models import UserRegistration, UserMaster
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over a single blake2b digest."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class IdentityFilter:
+    """Emails and phone numbers in one Bloom filter, rebuilt from the database every `rebuild_seconds`."""
+
+    def __init__(self, capacity: int, error_rate: float, rebuild_seconds: float, scan_batch: int = 10000):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_seconds = rebuild_seconds
+        self.scan_batch = scan_batch
+        self._filter = None
+        self._pending = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.negatives = 0
+        self.probable_hits = 0
+        self.false_positives = 0
+        self.rebuilds = 0
+
+    @staticmethod
+    def _mail_key(email: str) -> str:
+        return "mail:" + email
+
+    @staticmethod
+    def _phone_key(phone: str) -> str:
+        return "phone:" + phone
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="identity-filter", daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def _run(self):
+        while True:
+            try:
+                self.rebuild()
+            except Exception as e:
+                logging.error(f"❌ Failed to build the identity filter: {e}")
+            if self._stop.wait(self.rebuild_seconds):
+                return
+
+    def rebuild(self):
+        """Streams every email and phone number into a fresh filter and swaps it in."""
+        with self._lock:
+            self._pending = []
+        try:
+            # Every shard holds a share of the users; unsharded, the primary holds them all
+            sessionmakers = [shard.SessionLocal for shard in shard_router.shards] if shard_router.enabled else [SessionLocal]
+            sessions = [make_session() for make_session in sessionmakers]
+            try:
+                total = sum(db.query(UserRegistration).count() + db.query(UserMaster).count() for db in sessions)
+                bloom = BloomFilter(max(self.capacity, 2 * total), self.error_rate)
+                for db in sessions:
+                    for model in (UserRegistration, UserMaster):
+                        rows = db.execute(select(model.user_mail, model.user_number).execution_options(yield_per=self.scan_batch))
+                        for mail, number in rows:
+                            bloom.add(self._mail_key(mail))
+                            bloom.add(self._phone_key(number))
+            finally:
+                for db in sessions:
+                    db.close()
+            with self._lock:
+                # Registrations made while the scan was running may have been missed by it
+                for key in self._pending:
+                    bloom.add(key)
+                self._filter = bloom
+        finally:
+            with self._lock:
+                self._pending = None
+        self.rebuilds += 1
+        logging.info(f"✅ Identity filter rebuilt: {total} users, {bloom.num_bits // 8 // 1024} KiB.")
+
+    def add(self, email: str, phone: str):
+        """Records a new registration so it is seen before the next rebuild."""
+        keys = (self._mail_key(email), self._phone_key(phone))
+        with self._lock:
+            if self._filter is not None:
+                for key in keys:
+                    self._filter.add(key)
+            if self._pending is not None:
+                self._pending.extend(keys)
+
+    def _might_contain(self, key: str) -> bool:
+        bloom = self._filter
+        if bloom is not None and key not in bloom:
+            self.negatives += 1
+            return False
+        self.probable_hits += 1
+        return True
+
+    def might_contain_email(self, email: str) -> bool:
+        return self._might_contain(self._mail_key(email))
+
+    def might_contain_phone(self, phone: str) -> bool:
+        return self._might_contain(self._phone_key(phone))
+
+    def record_false_positive(self):
+        self.false_positives += 1
+
+    def stats(self) -> dict:
+        bloom = self._filter
+        return {
+            "ready": bloom is not None,
+            "entries": bloom.count if bloom else 0,
+            "bytes": len(bloom._bits) if bloom else 0,
+            "hashes": bloom.num_hashes if bloom else 0,
+            "negatives": self.negatives,
+            "probable_hits": self.probable_hits,
+            "false_positives": self.false_positives,
+            "rebuilds": self.rebuilds,
+        }
+
+
+identity_filter = IdentityFilter(settings.BLOOM_CAPACITY, settings.BLOOM_ERROR_RATE, settings.BLOOM_REBUILD_SECONDS)
@@ -1,12 +1,14 @@
 import os
+import re
 import logging
 from dotenv import load_dotenv
+from logging_config import configure_logging
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+# Configure logging (queued, structured; see logging_config.py)
+configure_logging()
 
 class Settings:
     """Application settings with environment variable validation and exception handling."""
@@ -18,10 +20,116 @@ class Settings:
             self.DB_HOST: str = os.getenv("DB_HOST", "localhost")
             self.DB_PORT: int = int(os.getenv("DB_PORT", 3306))
             self.DB_NAME: str = os.getenv("DB_NAME", "genaicorelab")
+            self.DB_BACKEND: str = os.getenv("DB_BACKEND", "sync").lower()
+
+            # Connection pool sizing: DB_CONNECTION_BUDGET is shared by all WEB_CONCURRENCY workers (gunicorn reads the same variable);
+            # DB_POOL_SIZE / DB_MAX_OVERFLOW override the derived per-worker values
+            self.WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", 1))
+            self.DB_CONNECTION_BUDGET: int = int(os.getenv("DB_CONNECTION_BUDGET", 100))
+            self.DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 0))
+            self.DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", -1))
+            self.DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", 30))
+            self.DB_POOL_WARMUP: bool = os.getenv("DB_POOL_WARMUP", "true").lower() == "true"
+
+            # Read replicas (comma-separated SQLAlchemy URLs); async URLs default to the sync ones with the async driver
+            self.REPLICA_URLS: list = [u.strip() for u in os.getenv("REPLICA_URLS", "").split(",") if u.strip()]
+            self.ASYNC_REPLICA_URLS: list = [u.strip() for u in os.getenv("ASYNC_REPLICA_URLS", "").split(",") if u.strip()]
+            self.REPLICA_BALANCE: str = os.getenv("REPLICA_BALANCE", "round_robin").lower()
+            # Hash-sharded user storage: `name=url` entries (names must stay stable), ring points per shard,
+            # and shards being emptied by `manage.py rebalance-shards`
+            self.SHARD_URLS: list = [u.strip() for u in os.getenv("SHARD_URLS", "").split(",") if u.strip()]
+            self.SHARD_VNODES: int = int(os.getenv("SHARD_VNODES", 160))
+            self.SHARD_DRAIN: list = [n.strip() for n in os.getenv("SHARD_DRAIN", "").split(",") if n.strip()]
+            self.REPLICA_HEALTH_INTERVAL_SECONDS: float = float(os.getenv("REPLICA_HEALTH_INTERVAL_SECONDS", 5))
+            self.READ_YOUR_WRITES_SECONDS: float = float(os.getenv("READ_YOUR_WRITES_SECONDS", 10))
 
             self.SECRET_KEY: str = os.getenv("SECRET_KEY", "your_secret_key")
             self.ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
             self.ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+            self.REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 7))
+            self.REVOCATION_MAX_ENTRIES: int = int(os.getenv("REVOCATION_MAX_ENTRIES", 1000000))
+            self.TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+            self.TOKEN_CACHE_TTL_SECONDS: int = int(os.getenv("TOKEN_CACHE_TTL_SECONDS", 60))
+
+            # Write-through login record cache, optionally invalidated across workers over IP multicast
+            self.LOGIN_CACHE_ENABLED: bool = os.getenv("LOGIN_CACHE_ENABLED", "true").lower() == "true"
+            self.LOGIN_CACHE_SIZE: int = int(os.getenv("LOGIN_CACHE_SIZE", 100000))
+            self.LOGIN_CACHE_TTL_SECONDS: float = float(os.getenv("LOGIN_CACHE_TTL_SECONDS", 60))
+            self.LOGIN_CACHE_INVALIDATION_GROUP: str = os.getenv("LOGIN_CACHE_INVALIDATION_GROUP", "").strip()
+
+            # Opt-in memo of successful password checks (skips bcrypt for repeat logins)
+            self.CREDENTIAL_CACHE_ENABLED: bool = os.getenv("CREDENTIAL_CACHE_ENABLED", "false").lower() == "true"
+            self.CREDENTIAL_CACHE_SIZE: int = int(os.getenv("CREDENTIAL_CACHE_SIZE", 10000))
+            self.CREDENTIAL_CACHE_TTL_SECONDS: float = float(os.getenv("CREDENTIAL_CACHE_TTL_SECONDS", 300))
+
+            # Role / profession reference cache
+            self.REFDATA_TTL_SECONDS: int = int(os.getenv("REFDATA_TTL_SECONDS", 300))
+
+            # Admin endpoints are disabled unless a token is configured
+            self.ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+
+            # Login throttling (attempts per minute)
+            self.LOGIN_RATE_LIMIT_ENABLED: bool = os.getenv("LOGIN_RATE_LIMIT_ENABLED", "true").lower() == "true"
+            self.LOGIN_RATE_PER_IDENTITY: int = int(os.getenv("LOGIN_RATE_PER_IDENTITY", 10))
+            self.LOGIN_RATE_PER_IP: int = int(os.getenv("LOGIN_RATE_PER_IP", 60))
+            self.LOGIN_RATE_MAX_KEYS: int = int(os.getenv("LOGIN_RATE_MAX_KEYS", 100000))
+
+            # Idempotency-Key replay cache
+            self.IDEMPOTENCY_CACHE_SIZE: int = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 10000))
+            self.IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 86400))
+
+            # Load shedding thresholds
+            self.LOADSHED_ENABLED: bool = os.getenv("LOADSHED_ENABLED", "true").lower() == "true"
+            self.LOADSHED_MAX_IN_FLIGHT: int = int(os.getenv("LOADSHED_MAX_IN_FLIGHT", 200))
+            self.LOADSHED_MAX_THREADPOOL_UTILIZATION: float = float(os.getenv("LOADSHED_MAX_THREADPOOL_UTILIZATION", 0.95))
+            self.LOADSHED_MAX_DB_POOL_UTILIZATION: float = float(os.getenv("LOADSHED_MAX_DB_POOL_UTILIZATION", 0.9))
+            self.LOADSHED_TARGET_DELAY_MS: float = float(os.getenv("LOADSHED_TARGET_DELAY_MS", 0))
+            self.LOADSHED_RETRY_AFTER: int = int(os.getenv("LOADSHED_RETRY_AFTER", 1))
+            self.LOADSHED_EXEMPT_PATHS: list = [p.strip() for p in os.getenv("LOADSHED_EXEMPT_PATHS", "/,/ready,/metrics").split(",") if p.strip()]
+
+            # User listing and export
+            self.USERS_PAGE_MAX: int = int(os.getenv("USERS_PAGE_MAX", 500))
+            self.EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+            # Bulk registration limits
+            self.BULK_MAX_ROWS: int = int(os.getenv("BULK_MAX_ROWS", 10000))
+            self.BULK_CHUNK_SIZE: int = int(os.getenv("BULK_CHUNK_SIZE", 500))
+
+            # bcrypt cost factor; `python hashing.py` recommends one for BCRYPT_TARGET_MS on this host
+            self.BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", 12))
+            self.BCRYPT_TARGET_MS: float = float(os.getenv("BCRYPT_TARGET_MS", 250))
+
+            # Password hashing executor ("process" or "thread"); by default the host's cores are split across WEB_CONCURRENCY workers
+            self.HASH_EXECUTOR: str = os.getenv("HASH_EXECUTOR", "process").lower()
+            self.HASH_WORKERS: int = int(os.getenv("HASH_WORKERS", max(1, (os.cpu_count() or 1) // self.WEB_CONCURRENCY)))
+            self.HASH_MAX_QUEUE: int = int(os.getenv("HASH_MAX_QUEUE", 64))
+
+            # Bloom filter over registered emails/phones, rebuilt periodically to forget deleted users
+            self.BLOOM_CAPACITY: int = int(os.getenv("BLOOM_CAPACITY", 1000000))
+            self.BLOOM_ERROR_RATE: float = float(os.getenv("BLOOM_ERROR_RATE", 0.01))
+            self.BLOOM_REBUILD_SECONDS: int = int(os.getenv("BLOOM_REBUILD_SECONDS", 3600))
+
+            # Write-behind audit pipeline (registration log and user events)
+            self.AUDIT_ENABLED: bool = os.getenv("AUDIT_ENABLED", "true").lower() == "true"
+            self.AUDIT_QUEUE_SIZE: int = int(os.getenv("AUDIT_QUEUE_SIZE", 10000))
+            self.AUDIT_BATCH_SIZE: int = int(os.getenv("AUDIT_BATCH_SIZE", 500))
+            self.AUDIT_FLUSH_INTERVAL_MS: float = float(os.getenv("AUDIT_FLUSH_INTERVAL_MS", 1000))
+            self.AUDIT_OVERFLOW: str = os.getenv("AUDIT_OVERFLOW", "block").lower()
+            self.AUDIT_BLOCK_TIMEOUT_MS: float = float(os.getenv("AUDIT_BLOCK_TIMEOUT_MS", 50))
+
+            # Soft delete and the background purge of deregistered users
+            self.SOFT_DELETE: bool = os.getenv("SOFT_DELETE", "true").lower() == "true"
+            self.PURGE_ENABLED: bool = os.getenv("PURGE_ENABLED", "true").lower() == "true"
+            self.PURGE_RETENTION_HOURS: float = float(os.getenv("PURGE_RETENTION_HOURS", 24))
+            self.PURGE_WINDOW: str = os.getenv("PURGE_WINDOW", "02:00-05:00").strip()
+            self.PURGE_BATCH_SIZE: int = int(os.getenv("PURGE_BATCH_SIZE", 200))
+            self.PURGE_BATCH_PAUSE_MS: float = float(os.getenv("PURGE_BATCH_PAUSE_MS", 500))
+            self.PURGE_POLL_SECONDS: float = float(os.getenv("PURGE_POLL_SECONDS", 300))
+
+            # Per-request SQL profiling (DEBUG adds Server-Timing headers; SLOW_REQUEST_MS=0 disables the slow log)
+            self.DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
+            self.SQL_PROFILE_ENABLED: bool = os.getenv("SQL_PROFILE_ENABLED", "true").lower() == "true"
+            self.SLOW_REQUEST_MS: float = float(os.getenv("SLOW_REQUEST_MS", 1000))
 
             # Validate required environment variables
             self.validate_env_vars()
@@ -40,6 +148,81 @@ class Settings:
         if not self.SECRET_KEY:
             raise ValueError("❌ SECRET_KEY is missing. Ensure it is set in your environment variables.")
 
+        if self.REFRESH_TOKEN_EXPIRE_DAYS < 1 or self.REVOCATION_MAX_ENTRIES < 1:
+            raise ValueError("❌ REFRESH_TOKEN_EXPIRE_DAYS and REVOCATION_MAX_ENTRIES must be at least 1.")
+
+        if self.LOGIN_CACHE_SIZE < 1 or self.LOGIN_CACHE_TTL_SECONDS <= 0:
+            raise ValueError("❌ LOGIN_CACHE_SIZE must be at least 1 and LOGIN_CACHE_TTL_SECONDS positive.")
+
+        if self.LOGIN_CACHE_INVALIDATION_GROUP and not re.fullmatch(r"(22[4-9]|23\d)(\.\d{1,3}){3}:\d{1,5}", self.LOGIN_CACHE_INVALIDATION_GROUP):
+            raise ValueError("❌ LOGIN_CACHE_INVALIDATION_GROUP must be a multicast group:port, e.g. 239.255.42.42:45454.")
+
+        if self.CREDENTIAL_CACHE_SIZE < 1 or self.CREDENTIAL_CACHE_TTL_SECONDS <= 0:
+            raise ValueError("❌ CREDENTIAL_CACHE_SIZE must be at least 1 and CREDENTIAL_CACHE_TTL_SECONDS positive.")
+
+        if self.DB_BACKEND not in ("sync", "async"):
+            raise ValueError("❌ DB_BACKEND must be either 'sync' or 'async'.")
+
+        if self.WEB_CONCURRENCY < 1 or self.DB_CONNECTION_BUDGET < self.WEB_CONCURRENCY:
+            raise ValueError("❌ WEB_CONCURRENCY must be at least 1 and DB_CONNECTION_BUDGET at least one connection per worker.")
+
+        if self.DB_POOL_SIZE < 0 or self.DB_POOL_TIMEOUT < 1:
+            raise ValueError("❌ DB_POOL_SIZE cannot be negative and DB_POOL_TIMEOUT must be at least 1.")
+
+        if self.SHARD_VNODES < 1:
+            raise ValueError("❌ SHARD_VNODES must be at least 1.")
+
+        if self.SHARD_URLS and len(self.SHARD_DRAIN) >= len(self.SHARD_URLS):
+            raise ValueError("❌ SHARD_DRAIN must leave at least one shard in SHARD_URLS.")
+
+        if self.REPLICA_BALANCE not in ("round_robin", "least_connections"):
+            raise ValueError("❌ REPLICA_BALANCE must be either 'round_robin' or 'least_connections'.")
+
+        if len(self.ASYNC_REPLICA_URLS) > len(self.REPLICA_URLS) or self.REPLICA_HEALTH_INTERVAL_SECONDS <= 0:
+            raise ValueError("❌ ASYNC_REPLICA_URLS cannot list more replicas than REPLICA_URLS, and REPLICA_HEALTH_INTERVAL_SECONDS must be positive.")
+
+        if self.IDEMPOTENCY_CACHE_SIZE < 1 or self.IDEMPOTENCY_TTL_SECONDS < 1:
+            raise ValueError("❌ IDEMPOTENCY_CACHE_SIZE and IDEMPOTENCY_TTL_SECONDS must be at least 1.")
+
+        if self.LOGIN_RATE_PER_IDENTITY < 1 or self.LOGIN_RATE_PER_IP < 1 or self.LOGIN_RATE_MAX_KEYS < 1:
+            raise ValueError("❌ Login rate limits must be at least 1.")
+
+        if self.LOADSHED_MAX_IN_FLIGHT < 1 or self.LOADSHED_TARGET_DELAY_MS < 0:
+            raise ValueError("❌ LOADSHED_MAX_IN_FLIGHT must be at least 1 and LOADSHED_TARGET_DELAY_MS cannot be negative.")
+
+        if self.USERS_PAGE_MAX < 1 or self.EXPORT_BATCH_SIZE < 1:
+            raise ValueError("❌ USERS_PAGE_MAX and EXPORT_BATCH_SIZE must be at least 1.")
+
+        if self.BULK_MAX_ROWS < 1 or self.BULK_CHUNK_SIZE < 1:
+            raise ValueError("❌ BULK_MAX_ROWS and BULK_CHUNK_SIZE must be at least 1.")
+
+        if not 4 <= self.BCRYPT_ROUNDS <= 31:
+            raise ValueError("❌ BCRYPT_ROUNDS must be between 4 and 31.")
+
+        if self.HASH_EXECUTOR not in ("process", "thread"):
+            raise ValueError("❌ HASH_EXECUTOR must be either 'process' or 'thread'.")
+
+        if self.HASH_WORKERS < 1 or self.HASH_MAX_QUEUE < 0:
+            raise ValueError("❌ HASH_WORKERS must be at least 1 and HASH_MAX_QUEUE cannot be negative.")
+
+        if self.BLOOM_CAPACITY < 1 or not 0 < self.BLOOM_ERROR_RATE < 1 or self.BLOOM_REBUILD_SECONDS < 1:
+            raise ValueError("❌ BLOOM_CAPACITY and BLOOM_REBUILD_SECONDS must be at least 1 and BLOOM_ERROR_RATE between 0 and 1.")
+
+        if self.AUDIT_QUEUE_SIZE < 1 or self.AUDIT_BATCH_SIZE < 1 or self.AUDIT_FLUSH_INTERVAL_MS <= 0:
+            raise ValueError("❌ AUDIT_QUEUE_SIZE and AUDIT_BATCH_SIZE must be at least 1 and AUDIT_FLUSH_INTERVAL_MS positive.")
+
+        if self.AUDIT_OVERFLOW not in ("block", "drop"):
+            raise ValueError("❌ AUDIT_OVERFLOW must be either 'block' or 'drop'.")
+
+        if self.SLOW_REQUEST_MS < 0:
+            raise ValueError("❌ SLOW_REQUEST_MS cannot be negative.")
+
+        if self.PURGE_WINDOW and not re.fullmatch(r"([01]\d|2[0-3]):[0-5]\d-([01]\d|2[0-3]):[0-5]\d", self.PURGE_WINDOW):
+            raise ValueError("❌ PURGE_WINDOW must be empty or HH:MM-HH:MM.")
+
+        if self.PURGE_RETENTION_HOURS < 0 or self.PURGE_BATCH_SIZE < 1 or self.PURGE_BATCH_PAUSE_MS < 0 or self.PURGE_POLL_SECONDS <= 0:
+            raise ValueError("❌ PURGE_BATCH_SIZE must be at least 1, PURGE_POLL_SECONDS positive, and PURGE_RETENTION_HOURS and PURGE_BATCH_PAUSE_MS cannot be negative.")
+
     @property
     def DATABASE_URL(self) -> str:
         """Constructs the database connection URL with exception handling."""
@@ -1,27 +1,212 @@
+import asyncio
 import logging
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import bindparam, delete, insert, or_, select, tuple_, update
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from models import UserRegistration, UserMaster, RegistrationLog, UserRole, UserProfession
+from config import settings
+from database import run_db, open_session, close_session
+from models import UserRegistration, UserMaster, RegistrationLog, UserRole, UserProfession, UserDirectory
+from refcache import reference_cache
+from logincache import LoginRecord, login_cache
+from audit import audit_pipeline
+from bloom import identity_filter
+from replicas import replica_router
+from sharding import shard_router
+from revocation import revoke_user_tokens
+from metrics import user_operations_total
 from utils import hash_password, verify_password
+from hashing import hashing_executor, hash_password_async, verify_password_async, dummy_password_hash, needs_rehash
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+# The hot lookups are built once, with bind parameters for their inputs: building a
+# statement and its cache key again on every call costs more than running it on an
+# indexed column (see benchmarks/bench_statements.py), while these reuse the memoized
+# cache key and go straight to the engine's compiled-statement cache.
+_TAKEN_IDENTITIES = select(UserRegistration.user_mail, UserRegistration.user_number).where(or_(
+    UserRegistration.user_mail.in_(bindparam("mails", expanding=True)),
+    UserRegistration.user_number.in_(bindparam("phones", expanding=True)),
+)).union_all(select(UserMaster.user_mail, UserMaster.user_number).where(or_(
+    UserMaster.user_mail.in_(bindparam("mails", expanding=True)),
+    UserMaster.user_number.in_(bindparam("phones", expanding=True)),
+)))
+_DIRECTORY_LOOKUP = select(UserDirectory.user_number, UserDirectory.user_mail).where(
+    UserDirectory.user_number.in_(bindparam("phones", expanding=True))
+)
+_ACTIVE_BY_EMAIL = (UserMaster.user_mail == bindparam("email"), UserMaster.deregister_date.is_(None))
+_USER_BY_EMAIL = select(UserMaster).where(*_ACTIVE_BY_EMAIL).limit(1)
+_LOGIN_RECORD_BY_EMAIL = select(*(getattr(UserMaster, field) for field in LoginRecord._fields)).where(*_ACTIVE_BY_EMAIL).limit(1)
+_ACTIVE_BY_PHONES = (UserMaster.user_number.in_(bindparam("phones", expanding=True)), UserMaster.deregister_date.is_(None))
+_ACTIVE_PHONE_OWNERS = select(UserMaster.user_number, UserMaster.user_mail).where(*_ACTIVE_BY_PHONES)
+_DEREGISTER_BY_PHONES = update(UserMaster).where(*_ACTIVE_BY_PHONES).values(deregister_date=bindparam("now"))
+_SWAP_PASSWORD_HASH = update(UserMaster).where(
+    UserMaster.id == bindparam("user_id"), UserMaster.user_password == bindparam("old_hash")
+).values(user_password=bindparam("new_hash"))
 
 
-def create_user(db: Session, user_data):
+def taken_identities(db: Session, mails, phones) -> set:
     """
-    Registers a new user and saves data to UserRegistration, UserMaster, and RegistrationLog.
+    Returns the emails and phone numbers among `mails`/`phones` already used in UserRegistration or UserMaster
+    (indexed lookups). Deregistered users hold theirs until they are purged.
+    """
+    taken = set()
+    for mail, number in db.execute(_TAKEN_IDENTITIES, {"mails": list(mails), "phones": list(phones)}):
+        taken.update((mail, number))
+    return taken
+
+
+def directory_lookup(db: Session, phones) -> dict:
+    """Returns {phone: mail} from the UserDirectory for the numbers that have an entry."""
+    return dict(db.execute(_DIRECTORY_LOOKUP, {"phones": list(phones)}).all())
+
+
+def claim_phones(db: Session, pairs):
+    """
+    Records (phone, mail) pairs in the UserDirectory of a shard owning the phones.
+    Returns (claimed, owned): the phones inserted now, and those that
+    already pointed at the same mail (a retry, or a registration interrupted before the
+    shard insert). Phones owned by another mail are in neither set. Commits.
+    """
+    phones = [phone for phone, _ in pairs]
+    existing = directory_lookup(db, phones)
+    fresh = [{"user_number": phone, "user_mail": mail} for phone, mail in pairs if phone not in existing]
+    claimed = set()
+    if fresh:
+        try:
+            db.execute(insert(UserDirectory), fresh)
+            db.commit()
+            claimed = {row["user_number"] for row in fresh}
+        except IntegrityError:
+            # A concurrent registration claimed one of the numbers; claim row by row
+            db.rollback()
+            for row in fresh:
+                try:
+                    db.execute(insert(UserDirectory), [row])
+                    db.commit()
+                    claimed.add(row["user_number"])
+                except IntegrityError:
+                    db.rollback()
+    owned = {phone for phone, mail in pairs if existing.get(phone) == mail}
+    db.rollback()
+    return claimed, owned
+
+
+def release_phones(db: Session, pairs):
+    """Removes UserDirectory entries, each only while it still points at the given mail. Commits."""
+    if pairs:
+        db.execute(delete(UserDirectory).where(tuple_(UserDirectory.user_number, UserDirectory.user_mail).in_(list(pairs))))
+    db.commit()
+
+
+async def directory_lookup_async(phones) -> dict:
+    """directory_lookup on the shards owning the phone numbers."""
+    directory = {}
+    for found in await shard_router.run_grouped(shard_router.group_by_shard(phones), directory_lookup):
+        directory.update(found)
+    return directory
+
+
+async def claim_phones_async(pairs):
+    """claim_phones on the shards owning the phone numbers. Returns (claimed, owned) for all of them."""
+    claimed, owned = set(), set()
+    for shard_claimed, shard_owned in await shard_router.run_grouped(
+        shard_router.group_by_shard(pairs, lambda pair: pair[0]), claim_phones
+    ):
+        claimed |= shard_claimed
+        owned |= shard_owned
+    return claimed, owned
+
+
+async def release_phones_async(pairs):
+    """release_phones on the shards owning the phone numbers."""
+    await shard_router.run_grouped(shard_router.group_by_shard(pairs, lambda pair: pair[0]), release_phones)
+
+
+def delete_registration_logs(db: Session, mails):
+    """Deletes the RegistrationLog rows of `mails`. Commits."""
+    audit_pipeline.erasing(set(mails))
+    db.execute(delete(RegistrationLog).where(RegistrationLog.user_mail.in_(set(mails))))
+    db.commit()
+
+
+async def delete_primary_registration_logs_async(mails):
+    """
+    When sharded, the audit pipeline writes RegistrationLog rows to the primary, outside
+    the shard transaction that deleted the users, so they are deleted there as well.
+    """
+    if not audit_pipeline.enabled or not mails:
+        return
+    db = open_session()
+    try:
+        await run_db(db, delete_registration_logs, list(mails))
+    finally:
+        await close_session(db)
+
+
+async def taken_identities_async(db, mails, phones, replica: bool = False) -> set:
+    """
+    taken_identities for a Session or AsyncSession. When sharded, phone numbers are looked up
+    in the directory and emails on their shards; otherwise the query runs on a read replica
+    (`replica`) or on the primary session `db`.
+    """
+    if not shard_router.enabled:
+        if replica:
+            return await replica_router.read(db, taken_identities, mails, phones)
+        return await run_db(db, taken_identities, mails, phones)
+
+    taken = set()
+    if phones:
+        for phone, mail in (await directory_lookup_async(phones)).items():
+            taken.update((phone, mail))
+    for shard_taken in await shard_router.run_grouped(shard_router.group_by_shard(mails), taken_identities, []):
+        taken |= shard_taken
+    return taken
+
+
+def _probably_registered(user_data) -> bool:
+    """Bloom filter pre-check; False means the email and phone are certainly free."""
+    return identity_filter.might_contain_email(user_data.email) or identity_filter.might_contain_phone(user_data.phone)
+
+
+def _is_registered(db: Session, user_data) -> bool:
+    """
+    Exact check behind a probable Bloom filter hit. Ends the read transaction so the
+    connection goes back to the pool instead of being held while bcrypt runs.
+    """
+    taken = taken_identities(db, [user_data.email], [user_data.phone])
+    db.rollback()
+    if not taken:
+        identity_filter.record_false_positive()
+    return bool(taken)
+
+
+def _duplicate_error(user_data):
+    logging.warning(f"❌ Duplicate registration rejected before hashing: {user_data.email}")
+    user_operations_total.inc("register", "duplicate")
+    return {"error": "User already exists or invalid foreign key reference."}
+
+
+def create_user(db: Session, user_data, password_hash: str = None):
+    """
+    Registers a new user and saves data to UserRegistration and UserMaster.
+    The RegistrationLog row is written by the audit pipeline after commit (inline when it is disabled).
+    `password_hash` lets async callers hash on the hashing executor beforehand.
     Returns the user ID if successful, or an error message if failed.
     """
     try:
+        # Reject known duplicates before paying for bcrypt (async callers check before hashing)
+        if password_hash is None and _probably_registered(user_data) and _is_registered(db, user_data):
+            return _duplicate_error(user_data)
+
         # Hash password before storing
-        user_data.password = hash_password(user_data.password)
+        user_data.password = password_hash or hash_password(user_data.password)
 
-        # Fetch Role and Profession IDs
-        role = db.query(UserRole).filter_by(role_name=user_data.role).first()
-        profession = db.query(UserProfession).filter_by(profession_name=user_data.profession).first()
-        if not role or not profession:
+        # Resolve Role and Profession IDs from the reference cache
+        role_id = reference_cache.role_id(db, user_data.role)
+        profession_id = reference_cache.profession_id(db, user_data.profession)
+        if role_id is None or profession_id is None:
             logging.warning("❌ Invalid role or profession provided.")
+            user_operations_total.inc("register", "invalid_role")
             return {"error": "Invalid role or profession."}
 
         # Create and insert into UserRegistration table
@@ -30,13 +215,14 @@ def create_user(db: Session, user_data):
             user_mail=user_data.email,
             user_password=user_data.password,
             user_number=user_data.phone,
-            role_id=role.role_id,
-            profession_id=profession.profession_id,
+            role_id=role_id,
+            profession_id=profession_id,
             country=user_data.country,
             city=user_data.city
         )
         db.add(new_registration)
         db.flush()
+        registration_id = new_registration.id  # Read before commit expires it, which would cost a SELECT
 
         # Create and insert into UserMaster table
         new_user_master = UserMaster(
@@ -44,91 +230,713 @@ def create_user(db: Session, user_data):
             user_mail=user_data.email,
             user_password=user_data.password,
             user_number=user_data.phone,
-            role_id=role.role_id,
-            profession_id=profession.profession_id,
+            role_id=role_id,
+            profession_id=profession_id,
             country=user_data.country,
             city=user_data.city
         )
         db.add(new_user_master)
+        db.flush()
+        user_id = new_user_master.id
 
-        # Create and insert into RegistrationLog table
-        new_registration_log = RegistrationLog(
-            username=user_data.username,
-            user_mail=user_data.email,
-            role_id=role.role_id
-        )
-        db.add(new_registration_log)
+        # Without the audit pipeline, insert into RegistrationLog in the same transaction
+        if not audit_pipeline.enabled:
+            db.add(RegistrationLog(
+                username=user_data.username,
+                user_mail=user_data.email,
+                role_id=role_id
+            ))
 
         # Commit transaction
         db.commit()
+        identity_filter.add(user_data.email, user_data.phone)
+        replica_router.mark_written(user_data.email)
+        login_cache.put(LoginRecord(user_id, user_data.email, user_data.password, user_data.phone, role_id))
+        audit_pipeline.registered(user_data.username, user_data.email, role_id)
         logging.info(f"✅ User '{user_data.username}' registered successfully.")
-        return {"success": f"User registered with ID {new_registration.id}"}
+        user_operations_total.inc("register", "registered")
+        return {"success": f"User registered with ID {registration_id}"}
 
     except IntegrityError as e:
         db.rollback()
         logging.error(f"❌ Integrity Error: {e.orig}")
+        user_operations_total.inc("register", "duplicate")
         return {"error": "User already exists or invalid foreign key reference."}
     except SQLAlchemyError as e:
         db.rollback()
         logging.error(f"🔥 Database Error: {e}")
+        user_operations_total.inc("register", "db_error")
         return {"error": "Database error occurred."}
     except Exception as e:
         db.rollback()
         logging.critical(f"🚨 Unexpected Error: {e}")
+        user_operations_total.inc("register", "error")
         return {"error": "Unexpected error occurred."}
 
 
+async def create_user_async(db, user_data):
+    """
+    Async variant of create_user for a Session or AsyncSession.
+    A probable duplicate from the Bloom filter is confirmed with an indexed lookup,
+    and only then is the password hashed on the hashing executor.
+    """
+    if shard_router.enabled:
+        return await _create_user_sharded(db, user_data)
+    if _probably_registered(user_data) and await run_db(db, _is_registered, user_data):
+        return _duplicate_error(user_data)
+    password_hash = await hash_password_async(user_data.password)
+    return await run_db(db, create_user, user_data, password_hash)
+
+
+async def _create_user_sharded(db, user_data):
+    """
+    create_user_async across shards: the phone number is claimed in the directory of the
+    shard owning the phone, then the user is written to the shard owning the email. A failed
+    shard insert gives the claim back.
+    """
+    if _probably_registered(user_data):
+        if await taken_identities_async(db, [user_data.email], [user_data.phone]):
+            return _duplicate_error(user_data)
+        identity_filter.record_false_positive()
+    password_hash = await hash_password_async(user_data.password)
+
+    pair = (user_data.phone, user_data.email)
+    claimed, owned = await claim_phones_async([pair])
+    if not claimed and not owned:
+        logging.warning(f"❌ Phone number already registered on another account: {user_data.email}")
+        user_operations_total.inc("register", "duplicate")
+        return {"error": "User already exists or invalid foreign key reference."}
+
+    result = await shard_router.run_for_email(db, user_data.email, create_user, user_data, password_hash)
+    if "error" in result and claimed:
+        await release_phones_async([pair])
+    return result
+
+
+def get_reference_ids(db: Session, role_names, profession_names):
+    """Resolves the distinct role and profession names of a batch through the reference cache."""
+    roles = {name: reference_cache.role_id(db, name) for name in set(role_names)}
+    professions = {name: reference_cache.profession_id(db, name) for name in set(profession_names)}
+    return (
+        {name: role_id for name, role_id in roles.items() if role_id is not None},
+        {name: profession_id for name, profession_id in professions.items() if profession_id is not None},
+    )
+
+
+def _screen_batch(entries, roles, professions):
+    """Splits (index, user_data, ...) entries into accepted ones and per-row errors for unknown references or in-batch duplicates."""
+    accepted, errors = [], {}
+    seen_mails, seen_phones = set(), set()
+    for entry in entries:
+        index, user_data = entry[0], entry[1]
+        if user_data.role not in roles or user_data.profession not in professions:
+            errors[index] = {"index": index, "email": user_data.email, "error": "Invalid role or profession."}
+        elif user_data.email in seen_mails or user_data.phone in seen_phones:
+            errors[index] = {"index": index, "email": user_data.email, "error": "Duplicate email or phone in batch."}
+        else:
+            seen_mails.add(user_data.email)
+            seen_phones.add(user_data.phone)
+            accepted.append(entry)
+    return accepted, errors
+
+
+def _insert_rows(db: Session, entries, roles, professions):
+    """Writes UserRegistration and UserMaster (and, without the audit pipeline, RegistrationLog) rows with one executemany INSERT per table."""
+    rows = [
+        {
+            "username": user_data.username,
+            "user_mail": user_data.email,
+            "user_password": password_hash,
+            "user_number": user_data.phone,
+            "role_id": roles[user_data.role],
+            "profession_id": professions[user_data.profession],
+            "country": user_data.country,
+            "city": user_data.city,
+        }
+        for _, user_data, password_hash in entries
+    ]
+    db.execute(insert(UserRegistration), rows)
+    db.execute(insert(UserMaster), rows)
+    if not audit_pipeline.enabled:
+        db.execute(
+            insert(RegistrationLog),
+            [{"username": row["username"], "user_mail": row["user_mail"], "role_id": row["role_id"]} for row in rows],
+        )
+    mails = [row["user_mail"] for row in rows]
+    return dict(db.query(UserRegistration.user_mail, UserRegistration.id).filter(UserRegistration.user_mail.in_(mails)).all())
+
+
+def _insert_chunk(db: Session, chunk, roles, professions):
+    """Inserts one chunk in its own transaction and returns {index: result}."""
+    results = {}
+    taken = taken_identities(db, [user_data.email for _, user_data, _ in chunk], [user_data.phone for _, user_data, _ in chunk])
+
+    fresh = []
+    for entry in chunk:
+        index, user_data, _ = entry
+        if user_data.email in taken or user_data.phone in taken:
+            results[index] = {"index": index, "email": user_data.email, "error": "User already exists."}
+        else:
+            fresh.append(entry)
+    if not fresh:
+        return results
+
+    try:
+        ids = _insert_rows(db, fresh, roles, professions)
+        db.commit()
+    except IntegrityError:
+        # A concurrent writer won a race inside this chunk; retry row by row to attribute the conflict
+        db.rollback()
+        for entry in fresh:
+            index, user_data, _ = entry
+            try:
+                ids = _insert_rows(db, [entry], roles, professions)
+                db.commit()
+                identity_filter.add(user_data.email, user_data.phone)
+                audit_pipeline.registered(user_data.username, user_data.email, roles[user_data.role])
+                results[index] = {"index": index, "email": user_data.email, "success": f"User registered with ID {ids[user_data.email]}"}
+            except IntegrityError:
+                db.rollback()
+                results[index] = {"index": index, "email": user_data.email, "error": "User already exists."}
+        return results
+
+    for index, user_data, _ in fresh:
+        identity_filter.add(user_data.email, user_data.phone)
+        audit_pipeline.registered(user_data.username, user_data.email, roles[user_data.role])
+        results[index] = {"index": index, "email": user_data.email, "success": f"User registered with ID {ids[user_data.email]}"}
+    return results
+
+
+def _count_bulk_outcomes(results):
+    for result in results:
+        error = result.get("error", "")
+        if "success" in result:
+            outcome = "registered"
+        elif "role" in error:
+            outcome = "invalid_role"
+        elif "exists" in error or "Duplicate" in error:
+            outcome = "duplicate"
+        else:
+            outcome = "db_error"
+        user_operations_total.inc("bulk_register", outcome)
+
+
+def bulk_create_users(db: Session, entries, roles=None, professions=None, chunk_size: int = 500):
+    """
+    Registers many users at once. `entries` is a list of (index, user_data, password_hash).
+    Role and profession names are resolved once per batch, and rows are written with
+    executemany-style inserts, one transaction per chunk of `chunk_size` users.
+    Returns one result dict per entry, in input order.
+    """
+    if roles is None or professions is None:
+        roles, professions = get_reference_ids(
+            db, [entry[1].role for entry in entries], [entry[1].profession for entry in entries]
+        )
+    accepted, results = _screen_batch(entries, roles, professions)
+
+    for start in range(0, len(accepted), chunk_size):
+        chunk = accepted[start:start + chunk_size]
+        try:
+            results.update(_insert_chunk(db, chunk, roles, professions))
+        except SQLAlchemyError as e:
+            db.rollback()
+            logging.error(f"🔥 Database Error during bulk registration: {e}")
+            for index, user_data, _ in chunk:
+                results[index] = {"index": index, "email": user_data.email, "error": "Database error occurred."}
+
+    _count_bulk_outcomes(results.values())
+    registered = sum(1 for result in results.values() if "success" in result)
+    logging.info(f"✅ Bulk registration finished: {registered}/{len(entries)} users registered.")
+    return [results[entry[0]] for entry in entries]
+
+
+async def bulk_create_users_async(db, users):
+    """
+    Async variant of bulk_create_users for a Session or AsyncSession.
+    `users` is a list of (index, user_data). Rows that would be rejected anyway are
+    screened out before hashing, and the rest are hashed in parallel on the hashing
+    executor, never holding more than half of its workers so interactive logins keep flowing.
+    """
+    roles, professions = await run_db(
+        db, get_reference_ids, [user_data.role for _, user_data in users], [user_data.profession for _, user_data in users]
+    )
+    accepted, errors = _screen_batch(users, roles, professions)
+
+    # Confirm the Bloom filter's probable duplicates with one indexed lookup so they are never hashed
+    probable = [(index, user_data) for index, user_data in accepted if _probably_registered(user_data)]
+    if probable:
+        taken = await taken_identities_async(
+            db, [user_data.email for _, user_data in probable], [user_data.phone for _, user_data in probable]
+        )
+        for index, user_data in probable:
+            if user_data.email in taken or user_data.phone in taken:
+                errors[index] = {"index": index, "email": user_data.email, "error": "User already exists."}
+        accepted = [(index, user_data) for index, user_data in accepted if index not in errors]
+    _count_bulk_outcomes(errors.values())
+
+    semaphore = asyncio.Semaphore(max(1, hashing_executor.max_workers // 2))
+
+    async def _hash(user_data):
+        async with semaphore:
+            return await hash_password_async(user_data.password)
+
+    hashes = await asyncio.gather(*(_hash(user_data) for _, user_data in accepted))
+    entries = [(index, user_data, password_hash) for (index, user_data), password_hash in zip(accepted, hashes)]
+    if shard_router.enabled:
+        results = await bulk_create_users_sharded(entries, roles, professions, settings.BULK_CHUNK_SIZE)
+    else:
+        results = await run_db(db, bulk_create_users, entries, roles, professions, settings.BULK_CHUNK_SIZE)
+
+    results = {result["index"]: result for result in results}
+    results.update(errors)
+    return [results[index] for index, _ in users]
+
+
+async def bulk_create_users_sharded(entries, roles, professions, chunk_size: int):
+    """
+    bulk_create_users across shards. `entries` is a list of (index, user_data, password_hash)
+    without in-batch duplicates. Phone numbers are claimed in the directories of the shards
+    owning them, then every shard inserts its users concurrently; claims of rows that failed
+    are given back. Returns one result dict per entry.
+    """
+    claimed, owned = await claim_phones_async([(user_data.phone, user_data.email) for _, user_data, _ in entries])
+    results, accepted = {}, []
+    for entry in entries:
+        index, user_data, _ = entry
+        if user_data.phone in claimed or user_data.phone in owned:
+            accepted.append(entry)
+        else:
+            results[index] = {"index": index, "email": user_data.email, "error": "User already exists."}
+    _count_bulk_outcomes(results.values())
+
+    groups = shard_router.group_by_shard(accepted, lambda entry: entry[1].email)
+    for shard_results in await shard_router.run_grouped(groups, bulk_create_users, roles, professions, chunk_size):
+        results.update((result["index"], result) for result in shard_results)
+
+    failed = [(user_data.phone, user_data.email) for index, user_data, _ in accepted
+              if "error" in results[index] and user_data.phone in claimed]
+    if failed:
+        await release_phones_async(failed)
+    return [results[entry[0]] for entry in entries]
+
+
+def _verify_login_password(email: str, password: str, password_hash: str) -> bool:
+    """verify_password, answered from the verified-credential cache when this check succeeded recently."""
+    if login_cache.credentials_verified(email, password, password_hash):
+        return True
+    if verify_password(password, password_hash):
+        login_cache.remember_credentials(email, password, password_hash)
+        return True
+    return False
+
+
+async def _verify_login_password_async(email: str, password: str, password_hash: str) -> bool:
+    """_verify_login_password with bcrypt on the hashing executor."""
+    if login_cache.credentials_verified(email, password, password_hash):
+        return True
+    if await verify_password_async(password, password_hash):
+        login_cache.remember_credentials(email, password, password_hash)
+        return True
+    return False
+
+
 def authenticate_user(db: Session, email: str, password: str):
     """
-    Authenticates a user by email and password.
-    Returns the user object if credentials are valid, or an error message if not.
+    Authenticates a user by email and password, reading the login record cache first.
+    Returns the user's LoginRecord if credentials are valid, or an error message if not.
     """
     try:
-        user = db.query(UserMaster).filter_by(user_mail=email).first()
-        if user and verify_password(password, user.user_password):
+        user = login_cache.get(email)
+        if user is None:
+            generation = login_cache.generation()
+            user = get_login_record(db, email)
+            if user is not None:
+                login_cache.put(user, generation)
+        if user is None:
+            # Burn the same bcrypt cost for unknown emails so response time does not reveal which exist
+            verify_password(password, dummy_password_hash())
+        elif _verify_login_password(email, password, user.user_password):
             logging.info(f"✅ Authentication successful for user: {email}")
+            user_operations_total.inc("login", "auth_success")
+            audit_pipeline.login(email, user.id, success=True)
+            if needs_rehash(user.user_password):
+                _rehash_password_sync(db, email, user.id, user.user_password, password)
             return user
         logging.warning(f"❌ Authentication failed for user: {email}")
+        user_operations_total.inc("login", "auth_failed")
+        audit_pipeline.login(email, user.id if user else None, success=False)
         return {"error": "Invalid email or password."}
     except SQLAlchemyError as e:
         logging.error(f"🔥 Database Error during authentication: {e}")
+        user_operations_total.inc("login", "db_error")
         return {"error": "Database error occurred."}
     except Exception as e:
         logging.critical(f"🚨 Unexpected Error during authentication: {e}")
         return {"error": "Unexpected error occurred."}
 
 
+def get_user_by_email(db: Session, email: str):
+    """Fetches the active (not deregistered) UserMaster row for the given email, or None."""
+    return db.execute(_USER_BY_EMAIL, {"email": email}).scalars().first()
+
+
+def get_login_record(db: Session, email: str):
+    """
+    Fetches the LoginRecord of the active user with the given email (only the columns a login
+    needs, without building an ORM object), or None. Ends the read transaction so the connection
+    is back in the pool before the caller spends time on bcrypt.
+    """
+    row = db.execute(_LOGIN_RECORD_BY_EMAIL, {"email": email}).first()
+    db.rollback()
+    return LoginRecord(*row) if row is not None else None
+
+
+async def read_user_by_email(db, fn, email: str):
+    """
+    Runs the read-only lookup `fn(session, email)` on the shard owning `email` when sharded;
+    otherwise on a read replica when configured (the primary for emails this worker just
+    wrote), falling back to the primary session `db`.
+    """
+    if shard_router.enabled:
+        return await shard_router.run_for_email(db, email, fn, email)
+    return await replica_router.read(db, fn, email, key=email)
+
+
+async def authenticate_user_async(db, email: str, password: str):
+    """
+    Async variant of authenticate_user for a Session or AsyncSession.
+    Cache misses go through read_user_by_email and bcrypt runs on the hashing executor.
+    """
+    try:
+        user = login_cache.get(email)
+        if user is None:
+            generation = login_cache.generation()
+            user = await read_user_by_email(db, get_login_record, email)
+            if user is not None:
+                login_cache.put(user, generation)
+        if user is None:
+            # Burn the same bcrypt cost for unknown emails so response time does not reveal which exist
+            await verify_password_async(password, dummy_password_hash())
+        elif await _verify_login_password_async(email, password, user.user_password):
+            logging.info(f"✅ Authentication successful for user: {email}")
+            user_operations_total.inc("login", "auth_success")
+            audit_pipeline.login(email, user.id, success=True, wait=False)
+            if needs_rehash(user.user_password):
+                _schedule_rehash(email, user.id, user.user_password, password)
+            return user
+        logging.warning(f"❌ Authentication failed for user: {email}")
+        user_operations_total.inc("login", "auth_failed")
+        audit_pipeline.login(email, user.id if user else None, success=False, wait=False)
+        return {"error": "Invalid email or password."}
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        logging.error(f"🔥 Database Error during authentication: {e}")
+        user_operations_total.inc("login", "db_error")
+        return {"error": "Database error occurred."}
+    except Exception as e:
+        logging.critical(f"🚨 Unexpected Error during authentication: {e}")
+        return {"error": "Unexpected error occurred."}
+
+
+def user_listing_query(role: str = None, profession: str = None, country: str = None, city: str = None):
+    """
+    SELECT for active UserResponse rows ordered by UserMaster.id, with role and profession
+    names joined in rather than lazy-loaded per row. Filters are exact matches.
+    """
+    statement = (
+        select(
+            UserMaster.id,
+            UserMaster.username,
+            UserMaster.user_mail.label("email"),
+            UserMaster.user_number.label("phone"),
+            UserRole.role_name.label("role"),
+            UserProfession.profession_name.label("profession"),
+            UserMaster.country,
+            UserMaster.city,
+            UserMaster.registration_date,
+        )
+        .join(UserRole, UserMaster.role_id == UserRole.role_id)
+        .outerjoin(UserProfession, UserMaster.profession_id == UserProfession.profession_id)
+        .where(UserMaster.deregister_date.is_(None))
+        .order_by(UserMaster.id)
+    )
+    if role is not None:
+        statement = statement.where(UserRole.role_name == role)
+    if profession is not None:
+        statement = statement.where(UserProfession.profession_name == profession)
+    if country is not None:
+        statement = statement.where(UserMaster.country == country)
+    if city is not None:
+        statement = statement.where(UserMaster.city == city)
+    return statement
+
+
+# Sharded listings walk the shards in SHARD_URLS order; a cursor is shard position * span + id
+SHARD_CURSOR_SPAN = 1 << 40
+
+
+def list_users(db: Session, after_id: int, limit: int, filters: dict):
+    """
+    Returns one keyset page: up to `limit` users with id > `after_id` matching the
+    user_listing_query `filters`, and the cursor for the next page (None on the last one).
+    Each page is a single range scan on the primary key.
+    """
+    rows = db.execute(user_listing_query(**filters).where(UserMaster.id > after_id).limit(limit + 1)).all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return [row._asdict() for row in rows[:limit]], next_cursor
+
+
+async def list_users_async(db, after_id: int, limit: int, filters: dict):
+    """
+    list_users for a Session or AsyncSession, on a read replica when configured. When sharded,
+    pages are filled from one shard after another and the cursor also encodes the shard.
+    """
+    if not shard_router.enabled:
+        return await replica_router.read(db, list_users, after_id, limit, filters)
+
+    shards = shard_router.shards
+    position, after_id = divmod(after_id, SHARD_CURSOR_SPAN)
+    items = []
+    for index in range(position, len(shards)):
+        page, next_id = await shard_router.run(shards[index], list_users, after_id, limit - len(items), filters)
+        items.extend(page)
+        if next_id is not None:
+            return items, index * SHARD_CURSOR_SPAN + next_id
+        after_id = 0
+        if len(items) >= limit:
+            return items, (index + 1) * SHARD_CURSOR_SPAN if index + 1 < len(shards) else None
+    return items, None
+
+
+def _delete_by_phones(db: Session, phone_numbers) -> dict:
+    """
+    Deletes the users owning `phone_numbers` and their RegistrationLog rows with set-based
+    DELETE ... WHERE statements. Returns {phone: mail} for the numbers that matched a user.
+    The caller owns the transaction, and reports the deletions to the audit pipeline after commit.
+    """
+    registration_match = UserRegistration.user_number.in_(phone_numbers)
+    master_match = UserMaster.user_number.in_(phone_numbers)
+
+    found = dict(db.execute(
+        select(UserRegistration.user_number, UserRegistration.user_mail).where(registration_match)
+        .union(select(UserMaster.user_number, UserMaster.user_mail).where(master_match))
+    ).all())
+    if not found:
+        return found
+
+    audit_pipeline.erasing(set(found.values()))
+    db.execute(delete(RegistrationLog).where(RegistrationLog.user_mail.in_(set(found.values()))))
+    db.execute(delete(UserMaster).where(master_match))
+    db.execute(delete(UserRegistration).where(registration_match))
+    return found
+
+
+def _deregister_by_phones(db: Session, phone_numbers) -> dict:
+    """
+    Soft-deletes the active users owning `phone_numbers`: one UPDATE stamping
+    UserMaster.deregister_date, leaving the rows for the purge. Returns {phone: mail}
+    for the numbers that matched an active user. The caller owns the transaction.
+    """
+    phones = list(phone_numbers)
+    found = dict(db.execute(_ACTIVE_PHONE_OWNERS, {"phones": phones}).all())
+    if found:
+        db.execute(_DEREGISTER_BY_PHONES, {"phones": phones, "now": datetime.now()})
+    return found
+
+
+def _remove_by_phones(db: Session, phone_numbers) -> dict:
+    """Soft- or hard-deletes the users owning `phone_numbers`, depending on SOFT_DELETE. Returns {phone: mail}."""
+    return (_deregister_by_phones if settings.SOFT_DELETE else _delete_by_phones)(db, phone_numbers)
+
+
+def _removed(found: dict, soft: bool):
+    """Follow-up for committed deletions: read-your-writes, token revocation and the audit trail."""
+    mails = set(found.values())
+    replica_router.mark_written(*mails)
+    login_cache.invalidate(*mails)
+    revoke_user_tokens(*mails)
+    if soft:
+        audit_pipeline.deregistered(mails)
+    else:
+        audit_pipeline.deleted(mails)
+
+
 def delete_user_by_phone(db: Session, phone_number: str):
     """
-    Deletes a user by phone number from UserRegistration, UserMaster, and RegistrationLog.
+    Deletes a user by phone number. With SOFT_DELETE the UserMaster row is only marked
+    deregistered and the purge removes it later; otherwise UserRegistration, UserMaster
+    and RegistrationLog rows are deleted at once.
     Returns success message if deletion was successful, or an error message otherwise.
     """
     try:
-        user_reg = db.query(UserRegistration).filter_by(user_number=phone_number).first()
-        user_master = db.query(UserMaster).filter_by(user_number=phone_number).first()
-        user_log = db.query(RegistrationLog).filter_by(user_mail=user_reg.user_mail if user_reg else None).first()
-
-        if not user_reg and not user_master:
+        found = _remove_by_phones(db, [phone_number])
+        if not found:
             logging.warning(f"❌ No user found with phone number: {phone_number}")
+            user_operations_total.inc("delete", "not_found")
             return {"error": "User not found."}
 
-        # Delete user records
-        if user_reg:
-            db.delete(user_reg)
-        if user_master:
-            db.delete(user_master)
-        if user_log:
-            db.delete(user_log)
-
         db.commit()
+        _removed(found, settings.SOFT_DELETE)
         logging.info(f"✅ User with phone number '{phone_number}' deleted successfully.")
+        user_operations_total.inc("delete", "deleted")
         return {"success": f"User with phone number '{phone_number}' deleted."}
 
     except SQLAlchemyError as e:
         db.rollback()
         logging.error(f"🔥 Database Error during deletion: {e}")
+        user_operations_total.inc("delete", "db_error")
         return {"error": "Database error occurred while deleting user."}
     except Exception as e:
         db.rollback()
         logging.critical(f"🚨 Unexpected Error during deletion: {e}")
         return {"error": "Unexpected error occurred while deleting user."}
+
+
+def bulk_delete_users_by_phone(db: Session, phone_numbers, chunk_size: int = 500):
+    """
+    Permanently deletes many users by phone number (soft-deleted ones included, whatever SOFT_DELETE
+    says), one transaction per chunk of `chunk_size` numbers.
+    Returns the deleted count, the numbers that matched no user, and any numbers whose chunk failed.
+    """
+    phone_numbers = list(dict.fromkeys(phone_numbers))
+    deleted, not_found, failed = 0, [], []
+
+    for start in range(0, len(phone_numbers), chunk_size):
+        chunk = phone_numbers[start:start + chunk_size]
+        try:
+            found = _delete_by_phones(db, chunk)
+            db.commit()
+            _removed(found, soft=False)
+        except SQLAlchemyError as e:
+            db.rollback()
+            logging.error(f"🔥 Database Error during bulk deletion: {e}")
+            failed.extend(chunk)
+            continue
+        deleted += len(found)
+        not_found.extend(phone for phone in chunk if phone not in found)
+
+    user_operations_total.inc("bulk_delete", "deleted", amount=deleted)
+    user_operations_total.inc("bulk_delete", "not_found", amount=len(not_found))
+    user_operations_total.inc("bulk_delete", "db_error", amount=len(failed))
+    logging.info(f"✅ Bulk deletion finished: {deleted} deleted, {len(not_found)} not found, {len(failed)} failed.")
+    return {"deleted": deleted, "not_found": not_found, "failed": failed}
+
+
+def purge_deregistered_users(db: Session, cutoff: datetime, limit: int) -> dict:
+    """
+    Permanently deletes up to `limit` users deregistered before `cutoff`, oldest first,
+    in one transaction. Returns {phone: mail} for the purged users.
+    """
+    phone_numbers = list(db.scalars(
+        select(UserMaster.user_number).where(UserMaster.deregister_date < cutoff)
+        .order_by(UserMaster.deregister_date).limit(limit)
+    ))
+    if not phone_numbers:
+        db.rollback()
+        return {}
+    found = _delete_by_phones(db, phone_numbers)
+    db.commit()
+    audit_pipeline.deleted(set(found.values()))
+    return found
+
+
+def update_password_hash(db: Session, user_id: int, old_hash: str, new_hash: str) -> bool:
+    """Swaps a user's password hash only if it is still `old_hash`, so a concurrent password change is never overwritten."""
+    result = db.execute(_SWAP_PASSWORD_HASH, {"user_id": user_id, "old_hash": old_hash, "new_hash": new_hash},
+                        execution_options={"synchronize_session": False})
+    db.commit()
+    return result.rowcount == 1
+
+
+_rehash_tasks = set()
+
+
+async def _rehash_password(email: str, user_id: int, old_hash: str, password: str):
+    try:
+        new_hash = await hash_password_async(password)
+        db = shard_router.open_session(email)
+        try:
+            updated = await run_db(db, update_password_hash, user_id, old_hash, new_hash)
+        finally:
+            await close_session(db)
+        if updated:
+            _rehashed(email, user_id)
+    except Exception as e:
+        logging.error(f"❌ Failed to rehash password for user ID {user_id}: {e}")
+
+
+def _rehash_password_sync(db: Session, email: str, user_id: int, old_hash: str, password: str):
+    """
+    _rehash_password for synchronous callers, which have no event loop to schedule it on:
+    runs inline on their session, after the password was verified.
+    """
+    try:
+        if update_password_hash(db, user_id, old_hash, hash_password(password)):
+            _rehashed(email, user_id)
+    except Exception as e:
+        db.rollback()
+        logging.error(f"❌ Failed to rehash password for user ID {user_id}: {e}")
+
+
+def _rehashed(email: str, user_id: int):
+    login_cache.invalidate(email)
+    logging.info(f"🔁 Password hash for user ID {user_id} upgraded to cost {settings.BCRYPT_ROUNDS}.")
+    user_operations_total.inc("login", "rehashed")
+
+
+def _schedule_rehash(email: str, user_id: int, old_hash: str, password: str):
+    """Rehashes a password at the configured cost after the login response, off the request path."""
+    task = asyncio.create_task(_rehash_password(email, user_id, old_hash, password))
+    _rehash_tasks.add(task)
+    task.add_done_callback(_rehash_tasks.discard)
+
+
+async def delete_user_by_phone_async(db, phone_number: str):
+    """
+    Async variant of delete_user_by_phone for a Session or AsyncSession.
+    When sharded, the phone's directory entry names the user's email and so the
+    shard; the entry is removed once that shard no longer has the user (for soft
+    deletes, when the user is purged).
+    """
+    if not shard_router.enabled:
+        return await run_db(db, delete_user_by_phone, phone_number)
+
+    mail = (await directory_lookup_async([phone_number])).get(phone_number)
+    if mail is None:
+        logging.warning(f"❌ No user found with phone number: {phone_number}")
+        user_operations_total.inc("delete", "not_found")
+        return {"error": "User not found."}
+    result = await shard_router.run_for_email(db, mail, delete_user_by_phone, phone_number)
+    # A deregistered user keeps the phone number until the purge releases it
+    if not settings.SOFT_DELETE and ("success" in result or result.get("error") == "User not found."):
+        await release_phones_async([(phone_number, mail)])
+        await delete_primary_registration_logs_async([mail])
+    return result
+
+
+async def bulk_delete_users_by_phone_async(db, phone_numbers):
+    """
+    Async variant of bulk_delete_users_by_phone for a Session or AsyncSession.
+    When sharded, numbers are grouped by the shard of their directory email and
+    every shard deletes its share concurrently; their directory entries are released.
+    """
+    if not shard_router.enabled:
+        return await run_db(db, bulk_delete_users_by_phone, phone_numbers, settings.BULK_CHUNK_SIZE)
+
+    phone_numbers = list(dict.fromkeys(phone_numbers))
+    directory = await directory_lookup_async(phone_numbers)
+    result = {"deleted": 0, "not_found": [phone for phone in phone_numbers if phone not in directory], "failed": []}
+    user_operations_total.inc("bulk_delete", "not_found", amount=len(result["not_found"]))
+
+    groups = shard_router.group_by_shard(list(directory), lambda phone: directory[phone])
+    for shard_result in await shard_router.run_grouped(groups, bulk_delete_users_by_phone, settings.BULK_CHUNK_SIZE):
+        result["deleted"] += shard_result["deleted"]
+        result["not_found"].extend(shard_result["not_found"])
+        result["failed"].extend(shard_result["failed"])
+
+    failed = set(result["failed"])
+    released = [(phone, mail) for phone, mail in directory.items() if phone not in failed]
+    await release_phones_async(released)
+    await delete_primary_registration_logs_async([mail for _, mail in released])
+    return result
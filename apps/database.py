@@ -1,17 +1,20 @@
 import os
+import asyncio
 import logging
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from starlette.concurrency import run_in_threadpool
 from urllib.parse import quote_plus
 from dotenv import load_dotenv
 from sqlalchemy.exc import SQLAlchemyError
+from config import settings
+from metrics import timed_pool
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
-
 try:
     # Database Configuration
     DB_CONFIG = {
@@ -22,29 +25,66 @@ try:
         "name": os.getenv("DB_NAME"),
     }
 
-    # Validate database credentials
-    if not all(DB_CONFIG.values()):
+    # Validate database credentials (not needed when a full URL is supplied, e.g. a SQLite stand-in)
+    if not os.getenv("DATABASE_URL") and not all(DB_CONFIG.values()):
         raise ValueError("❌ Missing required database environment variables.")
 
-    # Create Database URL
-    DATABASE_URL = f"mysql+mysqlconnector://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['name']}"
+    # Create Database URLs
+    DATABASE_URL = os.getenv("DATABASE_URL") or f"mysql+mysqlconnector://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['name']}"
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or f"mysql+aiomysql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['name']}"
+
+    # With the async backend the sync engine only serves background work (audit writer,
+    # identity filter rebuilds, startup loads), so it keeps a small fixed share of the budget
+    BACKGROUND_CONNECTIONS = 2
+
+    def pool_sizing(background: bool = False) -> dict:
+        """
+        Per-worker pool size and overflow derived from DB_CONNECTION_BUDGET / WEB_CONCURRENCY,
+        so all workers together never open more connections than the budget. Half of a worker's
+        share is kept open (and warmed at startup); the rest is overflow for bursts.
+        """
+        per_worker = settings.DB_CONNECTION_BUDGET // settings.WEB_CONCURRENCY
+        if background:
+            connections = min(BACKGROUND_CONNECTIONS, per_worker)
+        elif settings.DB_BACKEND == "async":
+            connections = max(per_worker - BACKGROUND_CONNECTIONS, 1)
+        else:
+            connections = per_worker
+        pool_size = settings.DB_POOL_SIZE or max(connections // 2, 1)
+        max_overflow = settings.DB_MAX_OVERFLOW if settings.DB_MAX_OVERFLOW >= 0 else max(connections - pool_size, 0)
+        return {"pool_size": pool_size, "max_overflow": max_overflow}
+
+    def engine_options(url: str, background: bool = False, asynchronous: bool = False) -> dict:
+        """Pool settings for MySQL, with checkout waits timed; SQLite stand-ins keep SQLAlchemy's default pool."""
+        if url.startswith("sqlite"):
+            return {"echo": False, "connect_args": {"check_same_thread": False}}
+        return {
+            **pool_sizing(background),
+            "poolclass": timed_pool(AsyncAdaptedQueuePool if asynchronous else QueuePool),
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": 3600,
+            "echo": False,
+            "pool_pre_ping": True,  # Checks connection health before using it
+        }
 
     # Initialize Engine with Exception Handling
-    engine = create_engine(
-        DATABASE_URL,
-        pool_size=20,
-        max_overflow=50,
-        pool_timeout=60,
-        pool_recycle=3600,
-        echo=False,
-        pool_pre_ping=True,  # Checks connection health before using it
-    )
+    engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL, background=settings.DB_BACKEND == "async"))
 
     # SQLAlchemy Session & Base
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     Base = declarative_base()
 
-    logging.info("✅ Database connection initialized successfully.")
+    # Async engine, only built when the async backend is selected
+    async_engine = None
+    AsyncSessionLocal = None
+    if settings.DB_BACKEND == "async":
+        async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, asynchronous=True))
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    # Engine serving requests for the configured backend (pool introspection, instrumentation)
+    active_engine = async_engine.sync_engine if async_engine is not None else engine
+
+    logging.info(f"✅ Database connection initialized successfully ({settings.DB_BACKEND} backend).")
 
 except ValueError as ve:
     logging.critical(f"Environment Variable Error: {ve}")
@@ -69,4 +109,108 @@ def get_db():
         raise RuntimeError("Database session error occurred.") from e
     finally:
         db.close()
-        logging.info("✅ Database session closed.")
+        logging.debug("✅ Database session closed.")
+
+
+# Dependency to get an async database session
+async def get_async_db():
+    db = AsyncSessionLocal()
+    try:
+        yield db
+    except SQLAlchemyError as e:
+        logging.error(f"Database session error: {e}")
+        raise RuntimeError("Database session error occurred.") from e
+    finally:
+        await db.close()
+        logging.debug("✅ Async database session closed.")
+
+
+# Session dependency for the configured backend
+get_session = get_async_db if settings.DB_BACKEND == "async" else get_db
+
+
+def open_session():
+    """Opens a session for the configured backend outside of request dependencies."""
+    return AsyncSessionLocal() if settings.DB_BACKEND == "async" else SessionLocal()
+
+
+async def close_session(db):
+    if isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        await run_in_threadpool(db.close)
+
+
+async def stream_rows(statement, batch_size: int, db=None):
+    """
+    Streams the rows of `statement` in lists of up to `batch_size` on a dedicated session,
+    using a server-side cursor where the driver supports one, so memory stays flat for any result size.
+    `db` defaults to a new primary session; it is closed when the consumer finishes or stops iterating.
+    """
+    statement = statement.execution_options(yield_per=batch_size)
+    db = db or open_session()
+    try:
+        if isinstance(db, AsyncSession):
+            result = await db.stream(statement)
+            async for partition in result.partitions():
+                yield partition
+        else:
+            result = await run_in_threadpool(db.execute, statement)
+            while True:
+                partition = await run_in_threadpool(result.fetchmany, batch_size)
+                if not partition:
+                    break
+                yield partition
+    finally:
+        await close_session(db)
+
+
+def ping(db):
+    """Cheapest round trip that proves a session can reach the database."""
+    db.execute(text("SELECT 1"))
+
+
+async def warm_pool(count: int = None) -> int:
+    """
+    Opens and validates `count` connections (default: the pool size) on the request engine
+    concurrently, then returns them to the pool, so the first requests after a deploy skip
+    connection setup. Returns the number of connections opened.
+    """
+    pool = active_engine.pool
+    if count is None:
+        count = pool.size() if hasattr(pool, "size") else 1
+    connections = []
+
+    async def _open_async():
+        connection = await async_engine.connect()
+        connections.append(connection)
+        await connection.execute(text("SELECT 1"))
+
+    def _open():
+        connection = engine.connect()
+        connections.append(connection)
+        connection.execute(text("SELECT 1"))
+
+    try:
+        opening = (_open_async() if async_engine is not None else run_in_threadpool(_open) for _ in range(count))
+        # Let every attempt finish before closing, so no connection opened late is left checked out
+        errors = [e for e in await asyncio.gather(*opening, return_exceptions=True) if isinstance(e, Exception)]
+        if errors:
+            raise errors[0]
+    finally:
+        for connection in connections:
+            result = connection.close()
+            if result is not None:
+                await result
+    return len(connections)
+
+
+async def run_db(db, fn, *args):
+    """
+    Runs a sync crud function `fn(session, *args)` without blocking the event loop.
+    AsyncSession work runs natively on the async driver via run_sync; a sync
+    Session is handed to the threadpool.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args)
+    return await run_in_threadpool(fn, db, *args)
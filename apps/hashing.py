@@ -0,0 +1,179 @@
+import time
+import asyncio
+import logging
+import argparse
+import threading
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import bcrypt
+from fastapi import HTTPException
+from config import settings
+from metrics import password_hash_duration_seconds
+
+
+# bcrypt entry points submitted to the pool (top-level so they can be pickled for worker processes)
+def _hashpw(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def _checkpw(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+@lru_cache(maxsize=1)
+def dummy_password_hash() -> str:
+    """A throwaway hash verified for unknown users so failed lookups cost the same as failed passwords."""
+    return bcrypt.hashpw(b"dummy-password-for-timing", bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)).decode("utf-8")
+
+
+def hash_cost(hashed_password: str) -> int:
+    """Returns the cost factor encoded in a bcrypt hash ("$2b$<cost>$...")."""
+    return int(hashed_password.split("$")[2])
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """
+    True when a stored hash was created with a lower cost than the configured one. Hashes
+    above it are kept, so workers briefly running different BCRYPT_ROUNDS during a rollout
+    upgrade each user once instead of rehashing them back and forth.
+    """
+    try:
+        return hash_cost(hashed_password) < settings.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+
+def calibrate_rounds(target_ms: float, min_rounds: int = 10, max_rounds: int = 16, report=None) -> int:
+    """
+    Picks the highest bcrypt cost whose verify time on this host stays within `target_ms`,
+    never going below `min_rounds`. Each extra round doubles the work, so costs are timed
+    upwards until the target is crossed.
+    """
+    password = b"calibration-password"
+    chosen = min_rounds
+    for rounds in range(4, max_rounds + 1):
+        hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+        started = time.perf_counter()
+        bcrypt.checkpw(password, hashed)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if report:
+            report(rounds, elapsed_ms)
+        if elapsed_ms > target_ms:
+            break
+        chosen = max(rounds, min_rounds)
+    return chosen
+
+
+class HashingExecutor:
+    """
+    Runs bcrypt work on a dedicated process or thread pool so it never occupies
+    Starlette's request threadpool. At most `max_workers + max_queue` jobs may be
+    pending; anything beyond that is rejected with 503 instead of queueing forever.
+    """
+
+    def __init__(self, mode: str, max_workers: int, max_queue: int):
+        self.mode = mode
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def start(self):
+        """Creates the underlying pool. Called from the startup hook, or lazily on first use."""
+        with self._lock:
+            if self._pool is None:
+                if self.mode == "process":
+                    self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+                logging.info(f"✅ Hashing executor started ({self.mode}, {self.max_workers} workers, queue {self.max_queue}).")
+        return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+            logging.info("🛑 Hashing executor stopped.")
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Server is busy. Please retry shortly.",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+
+    async def run(self, fn, *args):
+        """Submits `fn(*args)` to the pool and awaits the result without blocking the event loop."""
+        self._acquire()
+        try:
+            pool = self._pool or self.start()
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+hashing_executor = HashingExecutor(settings.HASH_EXECUTOR, settings.HASH_WORKERS, settings.HASH_MAX_QUEUE)
+
+
+async def hash_password_async(password: str) -> str:
+    """Hashes the given password on the hashing executor."""
+    try:
+        with password_hash_duration_seconds.time("hash"):
+            hashed = await hashing_executor.run(_hashpw, password.encode("utf-8"), settings.BCRYPT_ROUNDS)
+        return hashed.decode("utf-8")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error hashing password: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error while hashing password.")
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verifies a password against its hashed version on the hashing executor."""
+    try:
+        with password_hash_duration_seconds.time("verify"):
+            return await hashing_executor.run(_checkpw, plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error verifying password: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error while verifying password.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate the bcrypt cost factor for this host.")
+    parser.add_argument("--target-ms", type=float, default=settings.BCRYPT_TARGET_MS, help="Target verify latency in milliseconds.")
+    parser.add_argument("--min-rounds", type=int, default=10)
+    parser.add_argument("--max-rounds", type=int, default=16)
+    args = parser.parse_args()
+
+    rounds = calibrate_rounds(
+        args.target_ms,
+        args.min_rounds,
+        args.max_rounds,
+        report=lambda r, ms: print(f"cost {r:>2}: {ms:8.1f} ms"),
+    )
+    print(f"\nRecommended setting for a {args.target_ms:.0f} ms target:\nBCRYPT_ROUNDS={rounds}")
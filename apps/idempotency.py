@@ -0,0 +1,135 @@
+"""
+Idempotency-Key support for retried writes.
+
+The first response for a key (per endpoint and caller) is stored and replayed to
+later requests carrying the same key, without running the handler again. Concurrent
+requests with a key that is still being processed wait for that result instead of
+repeating the work. Server errors are not stored, so they can be retried for real.
+
+MemoryIdempotencyStore keeps responses per worker; a retry that lands on another
+worker runs again. A shared backend (e.g. Redis, or a table keyed by the scoped key
+with an expiry column) implements the same interface to make replays global.
+"""
+import json
+import hmac
+import asyncio
+import hashlib
+from typing import Optional
+from fastapi import HTTPException, Response
+from cache import TTLCache
+from config import settings
+
+
+class IdempotencyStore:
+    """Storage interface for stored responses: key -> (fingerprint, status code, body, headers)."""
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, record: tuple):
+        raise NotImplementedError
+
+    def __len__(self):
+        """Number of stored responses, where the backend can report it cheaply."""
+        return 0
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """Per-process store bounded to `max_entries` responses, each kept for `ttl_seconds`."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self._cache = TTLCache(max_entries, ttl_seconds)
+
+    def get(self, key: str):
+        return self._cache.get(key)
+
+    def set(self, key: str, record: tuple):
+        self._cache.set(key, record)
+
+    def __len__(self):
+        return len(self._cache)
+
+
+class IdempotencyManager:
+    def __init__(self, store: IdempotencyStore):
+        self.store = store
+        self._in_flight = {}
+        self.executed = 0
+        self.replayed = 0
+        self.coalesced = 0
+        self.mismatched = 0
+
+    @staticmethod
+    def fingerprint(payload) -> str:
+        # Keyed so stored fingerprints reveal nothing about the bodies (which include passwords)
+        body = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        return hmac.new(settings.SECRET_KEY.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+    def _replay(self, record: tuple, fingerprint: str, response: Response):
+        stored_fingerprint, status_code, body, headers = record
+        if stored_fingerprint != fingerprint:
+            self.mismatched += 1
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request.")
+        self.replayed += 1
+        if status_code >= 400:
+            raise HTTPException(status_code=status_code, detail=body, headers={**(headers or {}), "Idempotent-Replayed": "true"})
+        response.headers["Idempotent-Replayed"] = "true"
+        return body
+
+    async def run(self, scope: str, key: Optional[str], payload, handler, response: Response):
+        """
+        Runs `handler()` once per (scope, key) and returns its result, or replays the stored one.
+        Without a key the handler simply runs.
+        """
+        if key is None:
+            return await handler()
+
+        cache_key = f"{scope}:{key}"
+        fingerprint = self.fingerprint(payload)
+        while True:
+            record = self.store.get(cache_key)
+            if record is not None:
+                return self._replay(record, fingerprint, response)
+            pending = self._in_flight.get(cache_key)
+            if pending is None:
+                break
+            # Same key still being processed: wait for it; if it stored nothing, go again
+            self.coalesced += 1
+            record = await asyncio.shield(pending)
+            if record is not None:
+                return self._replay(record, fingerprint, response)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[cache_key] = future
+        self.executed += 1
+        record = None
+        try:
+            body = await handler()
+            record = (fingerprint, 200, body, None)
+            return body
+        except HTTPException as e:
+            # Client errors are final answers for this request; server errors, throttling
+            # and authentication failures (a property of the credentials, not the request) are not
+            if e.status_code < 500 and e.status_code not in (401, 429):
+                record = (fingerprint, e.status_code, e.detail, e.headers)
+            raise
+        finally:
+            if record is not None:
+                self.store.set(cache_key, record)
+            del self._in_flight[cache_key]
+            future.set_result(record)
+
+    def stats(self) -> dict:
+        return {
+            "stored": len(self.store),
+            "in_flight": len(self._in_flight),
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "coalesced": self.coalesced,
+            "mismatched": self.mismatched,
+        }
+
+
+idempotency_manager = IdempotencyManager(
+    MemoryIdempotencyStore(settings.IDEMPOTENCY_CACHE_SIZE, settings.IDEMPOTENCY_TTL_SECONDS)
+)
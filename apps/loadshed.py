@@ -0,0 +1,148 @@
+import time
+import logging
+import anyio.to_thread
+from starlette.responses import JSONResponse
+from config import settings
+from database import active_engine, engine_options
+
+
+class LoadShedMiddleware:
+    """
+    ASGI middleware that rejects new work with 503 + Retry-After once the worker is
+    saturated, instead of letting requests queue on the threadpool or the DB pool.
+
+    Work is shed when any configured limit is exceeded:
+      * in-flight requests above `max_in_flight`
+      * threadpool tokens in use above `max_threadpool_utilization`
+      * checked-out DB connections above `max_db_pool_utilization` of pool_size + max_overflow
+      * the fastest request of the last interval took longer than `target_delay_ms`
+        (a CoDel-style queueing-delay signal; 0 disables it)
+    Exempt paths such as the `/` health check are always served.
+    """
+
+    def __init__(
+        self,
+        app,
+        max_in_flight: int,
+        max_threadpool_utilization: float,
+        max_db_pool_utilization: float,
+        target_delay_ms: float,
+        interval_seconds: float = 1.0,
+        retry_after: int = 1,
+        exempt_paths=("/",),
+    ):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.max_threadpool_utilization = max_threadpool_utilization
+        self.max_db_pool_utilization = max_db_pool_utilization
+        self.target_delay = target_delay_ms / 1000
+        self.interval = interval_seconds
+        self.retry_after = retry_after
+        self.exempt_paths = set(exempt_paths)
+        self.pool = active_engine.pool
+        # Configured pool_size + max_overflow; SQLite stand-ins keep the default pool and count only its size
+        options = engine_options(active_engine.url.drivername)
+        self.pool_capacity = options["pool_size"] + options["max_overflow"] if "pool_size" in options else None
+
+        self.in_flight = 0
+        self.shed = {"in_flight": 0, "threadpool": 0, "db_pool": 0, "queueing_delay": 0}
+        self._window_start = time.monotonic()
+        self._window_min = float("inf")
+        self._delayed = False
+        load_shedder.middleware = self
+
+    def _threadpool_utilization(self) -> float:
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        return limiter.borrowed_tokens / limiter.total_tokens
+
+    def _db_pool_utilization(self) -> float:
+        # Only QueuePool-style pools report checkouts; others never trigger shedding
+        if not hasattr(self.pool, "checkedout"):
+            return 0.0
+        capacity = self.pool_capacity or self.pool.size()
+        return self.pool.checkedout() / capacity if capacity else 0.0
+
+    def _roll_window(self, now: float):
+        if now - self._window_start >= self.interval:
+            # Even the fastest request of the interval waited too long: requests are queueing.
+            # An interval without completed requests clears the signal so shedding cannot latch on.
+            self._delayed = self.target_delay > 0 and self.target_delay < self._window_min < float("inf")
+            self._window_start, self._window_min = now, float("inf")
+
+    def _record_latency(self, elapsed: float):
+        self._window_min = min(self._window_min, elapsed)
+        self._roll_window(time.monotonic())
+
+    def _overload_reason(self):
+        if self.in_flight >= self.max_in_flight:
+            return "in_flight"
+        if self._threadpool_utilization() >= self.max_threadpool_utilization:
+            return "threadpool"
+        if self._db_pool_utilization() >= self.max_db_pool_utilization:
+            return "db_pool"
+        self._roll_window(time.monotonic())
+        if self._delayed:
+            return "queueing_delay"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        reason = self._overload_reason()
+        if reason:
+            self.shed[reason] += 1
+            logging.warning(f"⚠ Shedding {scope['method']} {scope['path']}: {reason} limit exceeded.")
+            response = JSONResponse(
+                status_code=503,
+                content={"error": "Server is overloaded. Please retry shortly."},
+                headers={"Retry-After": str(self.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        self.in_flight += 1
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            self._record_latency(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "threadpool_utilization": round(self._threadpool_utilization(), 3),
+            "db_pool_utilization": round(self._db_pool_utilization(), 3),
+            "queueing_delayed": self._delayed,
+            "shed": dict(self.shed),
+        }
+
+
+class _LoadShedder:
+    """Handle to the middleware instance Starlette builds, so routes can report its counters."""
+    middleware = None
+
+    def stats(self) -> dict:
+        if self.middleware is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.middleware.stats()}
+
+
+load_shedder = _LoadShedder()
+
+
+def add_load_shedding(app):
+    """Installs LoadShedMiddleware on `app` using the LOADSHED_* settings."""
+    if not settings.LOADSHED_ENABLED:
+        return
+    app.add_middleware(
+        LoadShedMiddleware,
+        max_in_flight=settings.LOADSHED_MAX_IN_FLIGHT,
+        max_threadpool_utilization=settings.LOADSHED_MAX_THREADPOOL_UTILIZATION,
+        max_db_pool_utilization=settings.LOADSHED_MAX_DB_POOL_UTILIZATION,
+        target_delay_ms=settings.LOADSHED_TARGET_DELAY_MS,
+        retry_after=settings.LOADSHED_RETRY_AFTER,
+        exempt_paths=settings.LOADSHED_EXEMPT_PATHS,
+    )
@@ -0,0 +1,128 @@
+"""
+Central logging setup: request threads only enqueue records, and a single
+QueueListener thread formats them as JSON lines and writes them out.
+
+Configured from the environment (read directly, since settings themselves log while loading):
+    LOG_LEVEL         root level, default INFO
+    LOG_FORMAT        "json" (default) or "text"
+    LOG_QUEUE_SIZE    records buffered before new ones are dropped, default 10000
+    LOG_SAMPLE_RATES  per-module sampling of INFO/DEBUG records, e.g. "crud=0.05,routes=0.05";
+                      WARNING and above are always kept
+"""
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import random
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "message": record.getMessage(),
+        }
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a `rate` fraction of INFO/DEBUG records per module; warnings and errors always pass."""
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.module)
+        if rate is None or rate >= 1 or random.random() < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message and traceback now, but leave formatting to the listener thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _parse_rates(value: str) -> dict:
+    rates = {}
+    for part in filter(None, (item.strip() for item in value.split(","))):
+        module, _, rate = part.partition("=")
+        rates[module.strip()] = float(rate)
+    return rates
+
+
+queue_handler = None
+sampling_filter = None
+
+
+def configure_logging():
+    """Installs the queued handler on the root logger. Safe to call more than once."""
+    global queue_handler, sampling_filter
+    if queue_handler is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+    else:
+        output.setFormatter(JSONFormatter())
+
+    log_queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", 10000)))
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    sampling_filter = SamplingFilter(_parse_rates(os.getenv("LOG_SAMPLE_RATES", "")))
+    queue_handler.addFilter(sampling_filter)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    listener = QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+
+def stats() -> dict:
+    return {
+        "queued": queue_handler.queue.qsize() if queue_handler else 0,
+        "dropped": queue_handler.dropped if queue_handler else 0,
+        "sampled_out": sampling_filter.sampled_out if sampling_filter else 0,
+    }
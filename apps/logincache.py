@@ -0,0 +1,258 @@
+"""
+Write-through cache of login records (on by default, LOGIN_CACHE_ENABLED).
+
+A login needs a handful of UserMaster columns, so it reads a compact LoginRecord (no
+ORM object) and each worker keeps it for LOGIN_CACHE_TTL_SECONDS, keyed by a keyed
+hash of the normalized email. crud writes new users through to the cache and drops
+entries whose user is deleted or whose password hash changes, so a warm login makes
+no database round trip at all.
+
+Other workers learn about those changes only through an invalidation channel. Without
+one (the default), a worker may serve a record for up to the TTL after another worker
+deleted that user, the same bound TOKEN_CACHE_TTL_SECONDS puts on verified tokens.
+With LOGIN_CACHE_INVALIDATION_GROUP set, UDPInvalidationChannel multicasts the
+invalidated keys to every worker that joined the group (on one host, or across a LAN
+that routes multicast); a shared backend such as Redis pub/sub implements the same
+interface. Messages carry only hashed keys, and can evict entries but never add them.
+
+CredentialCache (opt-in, CREDENTIAL_CACHE_ENABLED) remembers successful password checks
+so service clients that log in again and again skip bcrypt. It stores no plaintext: an
+entry is an HMAC, under a key that exists only in this worker's memory, of the email,
+the password and the stored hash, so a changed hash never matches. Entries live for
+CREDENTIAL_CACHE_TTL_SECONDS and are dropped with the user's login record. The cost is
+that anyone able to read the worker's memory can test password guesses against cached
+entries at HMAC speed rather than bcrypt speed; keep the TTL short.
+"""
+import os
+import hmac
+import json
+import socket
+import struct
+import hashlib
+import logging
+import threading
+from typing import NamedTuple
+from cache import TTLCache
+from config import settings
+
+
+class LoginRecord(NamedTuple):
+    """The UserMaster columns a login needs, named like the model's attributes."""
+    id: int
+    user_mail: str
+    user_password: str
+    user_number: str
+    role_id: int
+
+
+class InvalidationChannel:
+    """Fan-out of invalidated cache keys to the other workers."""
+
+    def publish(self, keys: list):
+        raise NotImplementedError
+
+    def start(self, on_message):
+        """Starts delivering keys published by other workers to `on_message(keys)`."""
+        raise NotImplementedError
+
+    def shutdown(self):
+        raise NotImplementedError
+
+
+class UDPInvalidationChannel(InvalidationChannel):
+    """IP multicast channel; datagrams are best effort, so the TTL still bounds anything lost."""
+
+    KEYS_PER_MESSAGE = 200  # ~7 KB datagrams
+
+    def __init__(self, group: str, port: int):
+        self.group = group
+        self.port = port
+        self._origin = os.urandom(8).hex()  # Our own messages loop back; skip them
+        self._sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self._sender.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+        self._stop = threading.Event()
+        self._thread = None
+        self.sent = 0
+        self.received = 0
+        self.failed = 0
+
+    def publish(self, keys: list):
+        for start in range(0, len(keys), self.KEYS_PER_MESSAGE):
+            message = json.dumps({"origin": self._origin, "keys": keys[start:start + self.KEYS_PER_MESSAGE]})
+            try:
+                self._sender.sendto(message.encode("utf-8"), (self.group, self.port))
+                self.sent += 1
+            except OSError as e:
+                self.failed += 1
+                logging.warning(f"⚠ Failed to publish login cache invalidations: {e}")
+
+    def start(self, on_message):
+        if self._thread is not None:
+            return
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        receiver.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        receiver.bind(("", self.port))
+        membership = struct.pack("4s4s", socket.inet_aton(self.group), socket.inet_aton("0.0.0.0"))
+        receiver.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        receiver.settimeout(0.5)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(receiver, on_message), name="login-cache-invalidation", daemon=True)
+        self._thread.start()
+        logging.info(f"✅ Login cache invalidations shared over {self.group}:{self.port}.")
+
+    def _run(self, receiver, on_message):
+        with receiver:
+            while not self._stop.is_set():
+                try:
+                    data, _ = receiver.recvfrom(65535)
+                    message = json.loads(data)
+                except socket.timeout:
+                    continue
+                except (OSError, ValueError) as e:
+                    logging.warning(f"⚠ Ignored a malformed login cache invalidation: {e}")
+                    continue
+                if isinstance(message, dict) and message.get("origin") != self._origin:
+                    self.received += 1
+                    on_message([str(key) for key in message.get("keys", [])])
+
+    def shutdown(self):
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+
+class CredentialCache:
+    """Successful password checks per login-cache key, as HMACs of (email, password, stored hash)."""
+
+    def __init__(self, enabled: bool, maxsize: int, ttl_seconds: float):
+        self.enabled = enabled
+        self._cache = TTLCache(maxsize, ttl_seconds)
+        self._hmac_key = os.urandom(32)  # Never persisted or shared; entries only mean something to this worker
+        self.hits = 0
+        self.misses = 0
+
+    def _digest(self, email: str, password: str, password_hash: str) -> bytes:
+        message = json.dumps([email.strip().lower(), password, password_hash]).encode("utf-8")
+        return hmac.new(self._hmac_key, message, hashlib.sha256).digest()
+
+    def check(self, key: str, email: str, password: str, password_hash: str) -> bool:
+        if not self.enabled:
+            return False
+        stored = self._cache.get(key)
+        if stored is not None and hmac.compare_digest(stored, self._digest(email, password, password_hash)):
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def remember(self, key: str, email: str, password: str, password_hash: str):
+        if self.enabled:
+            self._cache.set(key, self._digest(email, password, password_hash))
+
+    def drop(self, key: str):
+        self._cache.pop(key)
+
+    def stats(self) -> dict:
+        # Hits are checks answered without bcrypt; a cached entry for another password counts as a miss
+        return {"enabled": self.enabled, **self._cache.stats(), "hits": self.hits, "misses": self.misses}
+
+
+class LoginCache:
+    def __init__(self, enabled: bool, maxsize: int, ttl_seconds: float, channel: InvalidationChannel = None,
+                 credentials: CredentialCache = None):
+        self.enabled = enabled
+        self.channel = channel
+        self.credentials = credentials or CredentialCache(False, 1, 1)
+        self._cache = TTLCache(maxsize, ttl_seconds)
+        self._hash_key = hashlib.sha256(settings.SECRET_KEY.encode("utf-8")).digest()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.invalidations = 0
+        self.remote_invalidations = 0
+
+    def _key(self, email: str) -> str:
+        normalized = email.strip().lower().encode("utf-8")
+        return hashlib.blake2b(normalized, key=self._hash_key, digest_size=16).hexdigest()
+
+    def get(self, email: str):
+        """The cached LoginRecord for `email`, or None."""
+        return self._cache.get(self._key(email)) if self.enabled else None
+
+    def generation(self) -> int:
+        """Read before loading a record from the database, and pass it to `put` with the result."""
+        return self._generation
+
+    def put(self, record: LoginRecord, generation: int = None):
+        """
+        Caches `record`. With `generation`, the record is dropped instead if anything was
+        invalidated since, as it may have been read before that change.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is None or generation == self._generation:
+                self._cache.set(self._key(record.user_mail), record)
+
+    def credentials_verified(self, email: str, password: str, password_hash: str) -> bool:
+        """Whether this exact password was verified against `password_hash` for `email` within the credential TTL."""
+        return self.credentials.check(self._key(email), email, password, password_hash)
+
+    def remember_credentials(self, email: str, password: str, password_hash: str):
+        """Records a successful bcrypt check for credentials_verified."""
+        self.credentials.remember(self._key(email), email, password, password_hash)
+
+    def _drop(self, keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._cache.pop(key)
+                self.credentials.drop(key)
+
+    def invalidate(self, *emails):
+        """Drops the records and verified credentials of `emails` here and, through the channel, on the other workers."""
+        if not (self.enabled or self.credentials.enabled) or not emails:
+            return
+        keys = [self._key(email) for email in emails]
+        self._drop(keys)
+        self.invalidations += len(keys)
+        if self.channel is not None:
+            self.channel.publish(keys)
+
+    def _on_remote_invalidation(self, keys):
+        self._drop(keys)
+        self.remote_invalidations += len(keys)
+
+    def start(self):
+        if (self.enabled or self.credentials.enabled) and self.channel is not None:
+            self.channel.start(self._on_remote_invalidation)
+
+    def shutdown(self):
+        if self.channel is not None:
+            self.channel.shutdown()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            **self._cache.stats(),
+            "invalidations": self.invalidations,
+            "remote_invalidations": self.remote_invalidations,
+            "channel": type(self.channel).__name__ if self.channel is not None else None,
+            "credentials": self.credentials.stats(),
+        }
+
+
+def _invalidation_channel():
+    if not settings.LOGIN_CACHE_INVALIDATION_GROUP:
+        return None
+    group, port = settings.LOGIN_CACHE_INVALIDATION_GROUP.rsplit(":", 1)
+    return UDPInvalidationChannel(group, int(port))
+
+
+login_cache = LoginCache(
+    settings.LOGIN_CACHE_ENABLED,
+    settings.LOGIN_CACHE_SIZE,
+    settings.LOGIN_CACHE_TTL_SECONDS,
+    _invalidation_channel(),
+    CredentialCache(settings.CREDENTIAL_CACHE_ENABLED, settings.CREDENTIAL_CACHE_SIZE, settings.CREDENTIAL_CACHE_TTL_SECONDS),
+)
@@ -2,11 +2,25 @@ import logging
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, PlainTextResponse
 from routes import router
-
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+from hashing import hashing_executor, dummy_password_hash
+from config import settings
+from database import SessionLocal, active_engine, warm_pool, open_session, close_session, run_db, ping
+from refcache import reference_cache
+from ratelimit import login_rate_limiter
+from loadshed import add_load_shedding, load_shedder
+from audit import audit_pipeline
+from bloom import identity_filter
+from replicas import replica_router
+from sharding import shard_router
+from revocation import revocation_store
+from idempotency import idempotency_manager
+from purge import purge_worker
+from logincache import login_cache
+from metrics import registry, CallbackMetric, MetricsMiddleware, instrument_pool
+from sqlprofile import SQLProfileMiddleware
+import logging_config
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -15,6 +29,9 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Load Shedding - reject new work early with 503 once the worker is saturated (added first so CORS wraps it)
+add_load_shedding(app)
+
 # CORS Middleware - Restrict in production
 ALLOWED_ORIGINS = ["http://localhost:3000", "https://yourfrontend.com"]  # Update for production
 
@@ -26,16 +43,120 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# SQL Profiling - statements and DB time per request (Server-Timing headers in DEBUG)
+app.add_middleware(SQLProfileMiddleware)
+
+# Metrics Middleware - outermost, so shed and CORS-rejected requests are counted too
+app.add_middleware(MetricsMiddleware)
+
+# Metrics read from other components at scrape time
+instrument_pool(active_engine)
+registry.register(CallbackMetric("hashing_executor_pending", "bcrypt jobs running or queued.", lambda: hashing_executor.stats()["pending"]))
+registry.register(CallbackMetric("hashing_executor_rejected_total", "bcrypt jobs rejected because the queue was full.", lambda: hashing_executor.rejected, "counter"))
+registry.register(CallbackMetric(
+    "reference_cache_lookups_total", "Role/profession cache lookups.",
+    lambda: {("hit",): reference_cache.hits, ("miss",): reference_cache.misses}, "counter", ("result",)))
+registry.register(CallbackMetric(
+    "login_throttled_total", "Logins rejected by the rate limiter.",
+    lambda: {("identity",): login_rate_limiter.rejected_identity, ("ip",): login_rate_limiter.rejected_ip}, "counter", ("key",)))
+registry.register(CallbackMetric(
+    "load_shed_total", "Requests shed with 503.",
+    lambda: {(reason,): count for reason, count in load_shedder.stats().get("shed", {}).items()}, "counter", ("reason",)))
+registry.register(CallbackMetric(
+    "log_records_discarded_total", "Log records dropped on a full queue or sampled out.",
+    lambda: {("dropped",): logging_config.stats()["dropped"], ("sampled",): logging_config.stats()["sampled_out"]}, "counter", ("reason",)))
+registry.register(CallbackMetric("audit_queue_depth", "Audit events waiting to be written.", lambda: audit_pipeline.stats()["queued"]))
+registry.register(CallbackMetric(
+    "audit_events_total", "Audit events by outcome; backpressure counts producers that had to wait for queue space.",
+    lambda: {(outcome,): audit_pipeline.stats()[outcome] for outcome in ("enqueued", "written", "dropped", "failed", "backpressure")},
+    "counter", ("outcome",)))
+
+registry.register(CallbackMetric(
+    "identity_filter_checks_total", "Bloom filter lookups: negative answers skip the database, probable hits do not.",
+    lambda: {(result,): identity_filter.stats()[result] for result in ("negatives", "probable_hits", "false_positives")},
+    "counter", ("result",)))
+
+registry.register(CallbackMetric(
+    "replica_reads_total", "Routed reads by target; fallbacks are replica reads retried on the primary.",
+    lambda: {
+        **{(replica.name,): replica.reads for replica in replica_router.replicas},
+        ("primary",): replica_router.primary_reads,
+        ("fallback",): replica_router.fallbacks,
+    },
+    "counter", ("target",)))
+registry.register(CallbackMetric(
+    "replica_healthy", "1 while a replica passes health checks.",
+    lambda: {(replica.name,): int(replica.healthy) for replica in replica_router.replicas}, labelnames=("replica",)))
+registry.register(CallbackMetric(
+    "revocation_entries", "Revoked tokens and subjects held in this worker's denylist.",
+    lambda: {(kind,): revocation_store.stats()[kind] for kind in ("tokens", "subjects")}, labelnames=("kind",)))
+registry.register(CallbackMetric(
+    "revocation_evictions_total", "Denylist entries forgotten before expiry because the store was full.",
+    lambda: {(): revocation_store.stats()["evicted"]}, "counter"))
+registry.register(CallbackMetric(
+    "idempotent_requests_total", "Requests carrying an Idempotency-Key: executed, replayed from the store, "
+    "coalesced onto an in-flight duplicate, or rejected for reusing a key with a different body.",
+    lambda: {(outcome,): idempotency_manager.stats()[outcome] for outcome in ("executed", "replayed", "coalesced", "mismatched")},
+    "counter", ("outcome",)))
+registry.register(CallbackMetric(
+    "shard_operations_total", "Crud calls routed to each user shard.",
+    lambda: {(shard.name,): shard.operations for shard in shard_router.shards}, "counter", ("shard",)))
+registry.register(CallbackMetric("login_cache_entries", "Login records cached by this worker.", lambda: login_cache.stats()["size"]))
+registry.register(CallbackMetric(
+    "login_cache_lookups_total", "Login record cache lookups; hits skip the database.",
+    lambda: {(result,): login_cache.stats()[result] for result in ("hits", "misses")}, "counter", ("result",)))
+registry.register(CallbackMetric(
+    "login_cache_invalidations_total", "Login records dropped for deleted users or changed hashes, by where the change happened.",
+    lambda: {("local",): login_cache.invalidations, ("remote",): login_cache.remote_invalidations}, "counter", ("source",)))
+registry.register(CallbackMetric(
+    "credential_cache_lookups_total", "Verified-credential cache lookups; hits skip bcrypt.",
+    lambda: {(result,): login_cache.credentials.stats()[result] for result in ("hits", "misses")}, "counter", ("result",)))
+registry.register(CallbackMetric(
+    "purge_users_total", "Deregistered users permanently deleted by the purge.", lambda: {(): purge_worker.purged}, "counter"))
+registry.register(CallbackMetric(
+    "purge_batches_total", "Purge transactions run (each removes up to PURGE_BATCH_SIZE users).", lambda: {(): purge_worker.batches}, "counter"))
+registry.register(CallbackMetric(
+    "purge_failures_total", "Purge runs that stopped on an error.", lambda: {(): purge_worker.failures}, "counter"))
+registry.register(CallbackMetric("purge_running", "1 while a purge run is in progress.", lambda: int(purge_worker.running)))
+
+# Set once startup has finished; /ready reports 503 until then
+readiness = {"ready": False}
+
 # Log API Startup
 @app.on_event("startup")
 async def startup_event():
     logging.info("🚀 Iamsspm07 API is starting...")
+    hashing_executor.start()
+    audit_pipeline.start()
+    replica_router.start()
+    identity_filter.start()  # Builds in the background; every lookup is a probable hit until it is ready
+    purge_worker.start()
+    login_cache.start()
+    dummy_password_hash()  # Computed once here rather than on the event loop during the first unknown-email login
+
+    # Warm the role/profession cache; lookups reload it lazily if this fails
+    db = SessionLocal()
+    try:
+        reference_cache.load(db)
+    except Exception as e:
+        logging.error(f"❌ Failed to preload reference data: {e}")
+    finally:
+        db.close()
+
+    # Open and validate the minimum pool now rather than on the first requests
+    if settings.DB_POOL_WARMUP:
+        try:
+            opened = await warm_pool()
+            logging.info(f"✅ Database pool warmed with {opened} connections.")
+        except Exception as e:
+            logging.error(f"❌ Failed to warm the database pool: {e}")
+    readiness["ready"] = True
 
 # Global Exception Handler for HTTP Errors
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     logging.error(f"❌ HTTP Exception: {exc.detail} - {request.url}")
-    return JSONResponse(status_code=exc.status_code, content={"error": exc.detail})
+    return JSONResponse(status_code=exc.status_code, content={"error": exc.detail}, headers=exc.headers)
 
 # Global Exception Handler for Validation Errors
 @app.exception_handler(RequestValidationError)
@@ -54,6 +175,26 @@ async def generic_exception_handler(request: Request, exc: Exception):
 async def health_check():
     return {"message": "✅ Iamsspm07 is running!"}
 
+# Readiness Endpoint (startup finished and the database answers); "/" stays a pure liveness check
+@app.get("/ready")
+async def readiness_check():
+    if not readiness["ready"]:
+        return JSONResponse(status_code=503, content={"ready": False, "reason": "Starting up."})
+    db = open_session()
+    try:
+        await run_db(db, ping)
+    except Exception as e:
+        logging.warning(f"⚠ Readiness check failed: {e}")
+        return JSONResponse(status_code=503, content={"ready": False, "reason": "Database unavailable."})
+    finally:
+        await close_session(db)
+    return {"ready": True}
+
+# Metrics Endpoint (Prometheus text format)
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # Include Routes
 app.include_router(router)
 
@@ -61,3 +202,11 @@ app.include_router(router)
 @app.on_event("shutdown")
 async def shutdown_event():
     logging.info("🛑 Iamsspm07 is shutting down...")
+    readiness["ready"] = False
+    hashing_executor.shutdown()
+    audit_pipeline.shutdown()
+    identity_filter.shutdown()
+    await purge_worker.shutdown()
+    login_cache.shutdown()
+    await replica_router.shutdown()
+    await shard_router.shutdown()
@@ -0,0 +1,384 @@
+"""
+Offline maintenance commands, run from the apps/ directory:
+
+    python manage.py init-db
+    python manage.py import-users users.csv [--pre-hashed] [--chunk-size 1000] [--workers 8]
+    python manage.py init-shards
+    python manage.py rebalance-shards [--batch-size 500] [--dry-run]
+
+import-users streams a CSV (header row with the UserRegistrationRequest fields) or
+NDJSON file, validates every row, hashes passwords on a process pool (or takes
+bcrypt hashes as they are with --pre-hashed) and inserts each chunk in its own
+transaction through crud.bulk_create_users. After every chunk it records how many
+input rows are done in a checkpoint file, so re-running the same command resumes
+where it stopped. Rejected rows go to an NDJSON error file. With SHARD_URLS set,
+every chunk is spread over the shards like a bulk registration.
+
+init-shards creates the schema on every shard in SHARD_URLS and copies the role and
+profession tables to them. rebalance-shards moves every user whose email, and every
+directory entry whose phone number, now hashes to another shard (after a shard was added
+to SHARD_URLS or listed in SHARD_DRAIN): each batch is copied to its new shard in one
+transaction and only then deleted from the old one, so an interrupted run loses nothing
+and simply resumes. Rows being moved are not found by the API until their batch lands,
+so run it off-peak.
+"""
+import os
+
+# Write RegistrationLog rows in the import transactions rather than through the
+# request-time audit pipeline, which is not running here
+os.environ["AUDIT_ENABLED"] = "false"
+# The commands run plain threads and short-lived event loops; async engines are not needed
+os.environ["DB_BACKEND"] = "sync"
+
+import re
+import csv
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from pydantic import ValidationError
+from sqlalchemy import delete, select, union
+from config import settings
+from database import SessionLocal, engine
+from models import initialize_database, UserRole, UserProfession, UserRegistration, UserMaster, RegistrationLog, UserDirectory
+from schemas import UserRegistrationRequest
+from refcache import reference_cache
+from sharding import shard_router
+from crud import bulk_create_users, bulk_create_users_sharded, get_reference_ids
+from hashing import _hashpw
+
+BCRYPT_HASH = re.compile(r"^\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}$")
+
+
+def _hash_many(passwords, rounds: int):
+    return [_hashpw(password.encode("utf-8"), rounds).decode("utf-8") for password in passwords]
+
+
+def read_rows(path: str, fmt: str):
+    """Yields (record number, dict or None) from a CSV or NDJSON file without loading it into memory."""
+    with open(path, newline="", encoding="utf-8") as source:
+        if fmt == "csv":
+            yield from enumerate(csv.DictReader(source), 1)
+            return
+        for number, line in enumerate(filter(str.strip, source), 1):
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, None
+
+
+def _chunks(rows, size: int):
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _load_checkpoint(path: str, source: str) -> dict:
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("source") != os.path.abspath(source):
+            raise SystemExit(f"❌ Checkpoint {path} belongs to {checkpoint.get('source')}, not {source}.")
+        return checkpoint
+    return {"source": os.path.abspath(source), "rows_done": 0, "registered": 0, "failed": 0}
+
+
+def _save_checkpoint(path: str, checkpoint: dict):
+    # Write-then-rename so a crash never leaves a half-written checkpoint behind
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+
+class UserImporter:
+    def __init__(self, pool, chunk_size: int, workers: int, pre_hashed: bool, rounds: int):
+        self.pool = pool
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.pre_hashed = pre_hashed
+        self.rounds = rounds
+
+    def prepare(self, chunk):
+        """Validates one chunk and starts hashing it on the pool. Returns (last record number, users, hash futures, errors)."""
+        users, errors = [], []
+        for number, row in chunk:
+            if row is None:
+                errors.append({"row": number, "error": "Invalid JSON."})
+                continue
+            if not isinstance(row, dict):
+                errors.append({"row": number, "error": "Row is not a JSON object."})
+                continue
+            try:
+                user_data = UserRegistrationRequest.model_validate(row)
+            except ValidationError as e:
+                # Drop the echoed input so passwords never reach the error file
+                details = [{k: v for k, v in error.items() if k != "input"} for error in e.errors(include_url=False, include_context=False)]
+                errors.append({"row": number, "email": row.get("email"), "error": "Invalid row", "details": details})
+                continue
+            if self.pre_hashed and not BCRYPT_HASH.match(user_data.password):
+                errors.append({"row": number, "email": user_data.email, "error": "Password is not a bcrypt hash."})
+                continue
+            users.append((number, user_data))
+
+        futures = []
+        if users and not self.pre_hashed:
+            step = -(-len(users) // self.workers)
+            passwords = [user_data.password for _, user_data in users]
+            futures = [self.pool.submit(_hash_many, passwords[i:i + step], self.rounds) for i in range(0, len(passwords), step)]
+        return chunk[-1][0], users, futures, errors
+
+    def write(self, db, prepared):
+        """Waits for the chunk's hashes and inserts it in one transaction. Returns (last record number, registered, errors)."""
+        last_row, users, futures, errors = prepared
+        if self.pre_hashed:
+            hashes = [user_data.password for _, user_data in users]
+        else:
+            hashes = [password_hash for future in futures for password_hash in future.result()]
+
+        entries = [(number, user_data, password_hash) for (number, user_data), password_hash in zip(users, hashes)]
+        roles, professions = get_reference_ids(
+            db, [user_data.role for _, user_data in users], [user_data.profession for _, user_data in users]
+        )
+        if not entries:
+            results = []
+        elif shard_router.enabled:
+            results = asyncio.run(bulk_create_users_sharded(entries, roles, professions, len(entries)))
+        else:
+            results = bulk_create_users(db, entries, roles, professions, chunk_size=len(entries))
+
+        registered = sum(1 for result in results if "success" in result)
+        errors.extend({"row": result["index"], "email": result["email"], "error": result["error"]} for result in results if "error" in result)
+        return last_row, registered, errors
+
+
+def import_users(path: str, fmt: str, chunk_size: int, workers: int, pre_hashed: bool, rounds: int,
+                 checkpoint_path: str, errors_path: str):
+    checkpoint = _load_checkpoint(checkpoint_path, path)
+    if checkpoint["rows_done"]:
+        print(f"↩ Resuming after row {checkpoint['rows_done']} ({checkpoint['registered']} registered so far).", file=sys.stderr)
+
+    rows = islice(read_rows(path, fmt), checkpoint["rows_done"], None)
+    started, processed = time.perf_counter(), 0
+
+    db = SessionLocal()
+    try:
+        reference_cache.load(db)  # Roles and professions are resolved from memory from here on
+        with ProcessPoolExecutor(max_workers=workers) as pool, open(errors_path, "a", encoding="utf-8") as errors_file:
+            importer = UserImporter(pool, chunk_size, workers, pre_hashed, rounds)
+
+            def flush(prepared):
+                nonlocal processed
+                last_row, registered, errors = importer.write(db, prepared)
+                for error in errors:
+                    errors_file.write(json.dumps(error) + "\n")
+                errors_file.flush()
+                processed += last_row - checkpoint["rows_done"]
+                checkpoint.update(
+                    rows_done=last_row,
+                    registered=checkpoint["registered"] + registered,
+                    failed=checkpoint["failed"] + len(errors),
+                )
+                _save_checkpoint(checkpoint_path, checkpoint)
+                rate = processed / max(time.perf_counter() - started, 1e-9)
+                print(
+                    f"📥 {checkpoint['rows_done']} rows | {checkpoint['registered']} registered | "
+                    f"{checkpoint['failed']} failed | {rate:,.0f} rows/sec",
+                    file=sys.stderr,
+                )
+
+            # Hash chunk N+1 on the pool while chunk N is being inserted
+            pending = None
+            for chunk in _chunks(rows, chunk_size):
+                prepared = importer.prepare(chunk)
+                if pending is not None:
+                    flush(pending)
+                pending = prepared
+            if pending is not None:
+                flush(pending)
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"✅ Import finished: {checkpoint['registered']} registered, {checkpoint['failed']} failed "
+        f"({processed} rows in {elapsed:.1f} s). Errors: {errors_path}",
+        file=sys.stderr,
+    )
+    return checkpoint
+
+
+def init_shards():
+    """Creates the tables on the primary and every shard, and copies the reference data to the shards."""
+    if not shard_router.enabled:
+        raise SystemExit("❌ SHARD_URLS is empty.")
+    initialize_database(engine)
+    db = SessionLocal()
+    try:
+        roles = [(role.role_id, role.role_name) for role in db.query(UserRole)]
+        professions = [(profession.profession_id, profession.profession_name) for profession in db.query(UserProfession)]
+    finally:
+        db.close()
+
+    for shard in shard_router.shards:
+        initialize_database(shard.engine)
+        shard_db = shard.SessionLocal()
+        try:
+            # Same ids as the primary, so cached reference ids are valid on every shard
+            for role_id, role_name in roles:
+                shard_db.merge(UserRole(role_id=role_id, role_name=role_name))
+            for profession_id, profession_name in professions:
+                shard_db.merge(UserProfession(profession_id=profession_id, profession_name=profession_name))
+            shard_db.commit()
+        finally:
+            shard_db.close()
+        print(f"✅ Shard {shard.name} initialized ({len(roles)} roles, {len(professions)} professions).", file=sys.stderr)
+
+
+USER_TABLES = (UserRegistration, UserMaster, RegistrationLog)
+
+
+def _copy_users(source_db, target_db, mails):
+    """Copies the rows of `mails` from every user table, letting the target assign new ids. Commits on the target."""
+    present = set(target_db.scalars(select(UserMaster.user_mail).where(UserMaster.user_mail.in_(mails))))
+    present |= set(target_db.scalars(select(UserRegistration.user_mail).where(UserRegistration.user_mail.in_(mails))))
+    mails = [mail for mail in mails if mail not in present]  # Already copied by an interrupted run
+    for model in USER_TABLES:
+        columns = [column for column in model.__table__.columns if not column.primary_key]
+        rows = [dict(row._mapping) for row in source_db.execute(select(*columns).where(model.user_mail.in_(mails)))]
+        if rows:
+            target_db.execute(model.__table__.insert(), rows)
+    target_db.commit()
+
+
+def _delete_users(source_db, mails):
+    for model in USER_TABLES:
+        source_db.execute(delete(model).where(model.user_mail.in_(mails)))
+    source_db.commit()
+
+
+def _copy_directory(source_db, target_db, phones):
+    present = set(target_db.scalars(select(UserDirectory.user_number).where(UserDirectory.user_number.in_(phones))))
+    rows = [
+        {"user_number": phone, "user_mail": mail}
+        for phone, mail in source_db.execute(select(UserDirectory.user_number, UserDirectory.user_mail).where(UserDirectory.user_number.in_(phones)))
+        if phone not in present
+    ]
+    if rows:
+        target_db.execute(UserDirectory.__table__.insert(), rows)
+    target_db.commit()
+
+
+def _delete_directory(source_db, phones):
+    source_db.execute(delete(UserDirectory).where(UserDirectory.user_number.in_(phones)))
+    source_db.commit()
+
+
+# What rebalance-shards moves: the users (keyed by email) and the directory entries (keyed by phone)
+MOVABLE = (
+    ("users", union(select(UserRegistration.user_mail), select(UserMaster.user_mail)), _copy_users, _delete_users),
+    ("directory entries", select(UserDirectory.user_number), _copy_directory, _delete_directory),
+)
+
+
+def rebalance_shards(batch_size: int, dry_run: bool) -> dict:
+    """
+    Moves users and directory entries to the shard owning their key.
+    Returns {"<kind> source->target": rows moved (or to move)}.
+    """
+    if not shard_router.enabled:
+        raise SystemExit("❌ SHARD_URLS is empty.")
+    moves, started = {}, time.perf_counter()
+    for source in shard_router.shards:
+        source_db = source.SessionLocal()
+        try:
+            for kind, keys_statement, copy, remove in MOVABLE:
+                misplaced = {}
+                for key in source_db.scalars(keys_statement).all():
+                    target = shard_router.shard_for(key)
+                    if target is not source:
+                        misplaced.setdefault(target, []).append(key)
+
+                for target, keys in misplaced.items():
+                    moves[f"{kind} {source.name}->{target.name}"] = len(keys)
+                    if dry_run:
+                        continue
+                    target_db = target.SessionLocal()
+                    try:
+                        for start in range(0, len(keys), batch_size):
+                            batch = keys[start:start + batch_size]
+                            copy(source_db, target_db, batch)
+                            remove(source_db, batch)
+                            print(f"🔀 {kind} {source.name} -> {target.name}: {min(start + batch_size, len(keys))}/{len(keys)}", file=sys.stderr)
+                    finally:
+                        target_db.close()
+        finally:
+            source_db.close()
+
+    verb = "to move" if dry_run else "moved"
+    print(f"✅ Rebalance finished in {time.perf_counter() - started:.1f} s: {sum(moves.values())} rows {verb} {moves}", file=sys.stderr)
+    return moves
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline maintenance commands.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("init-db", help="Create the database tables.")
+
+    importer = commands.add_parser("import-users", help="Import users from a CSV or NDJSON file.")
+    importer.add_argument("path")
+    importer.add_argument("--format", choices=("csv", "ndjson"), help="Defaults to the file extension.")
+    importer.add_argument("--chunk-size", type=int, default=settings.BULK_CHUNK_SIZE, help="Rows per transaction.")
+    importer.add_argument("--workers", type=int, default=settings.HASH_WORKERS, help="Hashing processes.")
+    importer.add_argument("--rounds", type=int, default=settings.BCRYPT_ROUNDS, help="bcrypt cost for plaintext passwords.")
+    importer.add_argument("--pre-hashed", action="store_true", help="The password column already holds bcrypt hashes.")
+    importer.add_argument("--checkpoint", help="Defaults to <path>.checkpoint.")
+    importer.add_argument("--errors", help="Defaults to <path>.errors.ndjson.")
+    importer.add_argument("--init-db", action="store_true", help="Create missing tables first.")
+
+    commands.add_parser("init-shards", help="Create the tables on every shard and copy the reference data.")
+
+    rebalancer = commands.add_parser("rebalance-shards", help="Move users to the shard that owns their email.")
+    rebalancer.add_argument("--batch-size", type=int, default=500, help="Users per copy/delete transaction.")
+    rebalancer.add_argument("--dry-run", action="store_true", help="Only report how many users would move.")
+    args = parser.parse_args(argv)
+
+    if args.command == "init-db":
+        initialize_database(engine)
+        return
+    if args.command == "init-shards":
+        init_shards()
+        return
+    if args.command == "rebalance-shards":
+        if args.batch_size < 1:
+            parser.error("--batch-size must be at least 1.")
+        logging.getLogger().setLevel(logging.WARNING)
+        rebalance_shards(args.batch_size, args.dry_run)
+        return
+
+    if args.chunk_size < 1 or args.workers < 1 or not 4 <= args.rounds <= 31:
+        parser.error("--chunk-size and --workers must be at least 1 and --rounds between 4 and 31.")
+    if args.init_db:
+        initialize_database(engine)
+    # Per-chunk crud log lines would drown out the progress report
+    logging.getLogger().setLevel(logging.WARNING)
+    import_users(
+        args.path,
+        args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson"),
+        args.chunk_size,
+        args.workers,
+        args.pre_hashed,
+        args.rounds,
+        args.checkpoint or args.path + ".checkpoint",
+        args.errors or args.path + ".errors.ndjson",
+    )
+
+
+if __name__ == "__main__":
+    main()
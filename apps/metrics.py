@@ -0,0 +1,226 @@
+"""
+Prometheus-style metrics exposed at /metrics in the text exposition format.
+
+Every metric guards its own samples with a private lock that is held only for a
+dict update, so there is no global lock for request threads to queue behind.
+Values that other modules already track (pool state, cache and limiter counters)
+are read through callbacks at scrape time and cost nothing on the request path.
+
+Each gunicorn worker keeps its own registry and labels its series with
+worker="<pid>"; aggregate across workers with sum() in PromQL.
+"""
+import os
+import time
+import threading
+from functools import lru_cache
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values) -> str:
+    # Resolved at render time so workers forked from a preloaded app still report their own pid
+    pairs = [("worker", os.getpid()), *zip(names, values)]
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labelvalues, value in list(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        # Find the bucket outside the lock; only the increments are guarded
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labelvalues):
+        """Context manager observing the duration of its block."""
+        return _Timer(self, labelvalues)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for labelvalues, (counts, total, count) in list(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                labels = _format_labels((*self.labelnames, "le"), (*labelvalues, bound))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labelvalues):
+        self.histogram, self.labelvalues = histogram, labelvalues
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labelvalues)
+
+
+class CallbackMetric:
+    """A gauge or counter whose samples come from `callback()` at scrape time: a number, or {labelvalues: number}."""
+
+    def __init__(self, name: str, documentation: str, callback, metric_type: str = "gauge", labelnames=()):
+        self.name, self.documentation, self.callback = name, documentation, callback
+        self.metric_type, self.labelnames = metric_type, tuple(labelnames)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.metric_type}"
+        samples = self.callback()
+        if not isinstance(samples, dict):
+            samples = {(): samples}
+        for labelvalues, value in samples.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                # A failing callback must not take the whole scrape down
+                continue
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# HTTP
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route template and status code.", ("method", "route", "status")))
+http_request_duration_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route")))
+
+# Password hashing (includes time queued on the hashing executor)
+password_hash_duration_seconds = registry.register(Histogram(
+    "password_hash_duration_seconds", "bcrypt hash/verify latency, including executor queueing.", ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0)))
+
+# Database pool
+db_pool_checkouts_total = registry.register(Counter(
+    "db_pool_checkouts_total", "Connections checked out of the pool."))
+db_pool_checkout_wait_seconds = registry.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time taken to get a connection from the pool, including waits on an exhausted pool."))
+db_pool_connect_seconds = registry.register(Histogram(
+    "db_pool_connect_seconds", "Time taken to open a new database connection for the pool."))
+
+# crud outcomes
+user_operations_total = registry.register(Counter(
+    "user_operations_total", "crud outcomes such as registered, duplicate, invalid_role, auth_failed.", ("operation", "outcome")))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route request counts and latency."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Route templates keep label cardinality bounded; unmatched paths share one series
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_duration_seconds.observe(time.perf_counter() - started, scope["method"], route)
+            http_requests_total.inc(scope["method"], route, str(status))
+
+
+@lru_cache(maxsize=None)
+def timed_pool(pool_class):
+    """
+    Subclass of `pool_class` whose connect() records in db_pool_checkout_wait_seconds how
+    long each checkout took, so waits for a free connection show up before pool_timeout hits.
+    Passed to create_engine as `poolclass`; Pool.recreate() keeps the subclass.
+    """
+    class TimedPool(pool_class):
+        def connect(self):
+            with db_pool_checkout_wait_seconds.time():
+                return super().connect()
+
+    TimedPool.__name__ = TimedPool.__qualname__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+
+def instrument_pool(engine):
+    """
+    Counts checkouts and times new connections of `engine`'s pool through SQLAlchemy's
+    public dialect and pool events, and exposes the gauges of a QueuePool-style pool.
+    Checkout waits are timed by the pool class itself (see timed_pool).
+    """
+    pool = engine.pool
+
+    @event.listens_for(engine, "do_connect")
+    def _connect_started(dialect, connection_record, cargs, cparams):
+        connection_record.info["connect_started"] = time.perf_counter()
+
+    @event.listens_for(pool, "connect")
+    def _connected(dbapi_connection, connection_record):
+        started = connection_record.info.pop("connect_started", None)
+        if started is not None:
+            db_pool_connect_seconds.observe(time.perf_counter() - started)
+
+    @event.listens_for(pool, "checkout")
+    def _checked_out(dbapi_connection, connection_record, connection_proxy):
+        db_pool_checkouts_total.inc()
+
+    if not hasattr(pool, "checkedout"):
+        return
+    registry.register(CallbackMetric("db_pool_size", "Configured pool size.", pool.size))
+    registry.register(CallbackMetric("db_pool_checked_out", "Connections currently checked out.", pool.checkedout))
+    registry.register(CallbackMetric("db_pool_overflow", "Connections open beyond pool_size.", lambda: max(pool.overflow(), 0)))
@@ -3,9 +3,6 @@ from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, func, exc
 from sqlalchemy.orm import relationship
 from database import Base
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
-
 
 # User Role Model
 class UserRole(Base):
@@ -66,7 +63,7 @@ class UserMaster(Base):
     country = Column(String(100), nullable=False)
     city = Column(String(100), nullable=False)
     registration_date = Column(DateTime, default=func.now())
-    deregister_date = Column(DateTime, nullable=True)
+    deregister_date = Column(DateTime, nullable=True, index=True)  # Set by soft delete; the purge removes the rows later
 
     role = relationship("UserRole", back_populates="users")
     profession = relationship("UserProfession", back_populates="users")
@@ -81,7 +78,7 @@ class RegistrationLog(Base):
 
     log_id = Column(Integer, primary_key=True, autoincrement=True)
     username = Column(String(100), nullable=False)
-    user_mail = Column(String(255), nullable=False)
+    user_mail = Column(String(255), nullable=False, index=True)
     role_id = Column(Integer, ForeignKey("user_role.role_id", ondelete="CASCADE"), nullable=False)
     log_date = Column(DateTime, default=func.now())
 
@@ -89,6 +86,31 @@ class RegistrationLog(Base):
         return f"<RegistrationLog(log_id={self.log_id}, username={self.username}, user_mail={self.user_mail})>"
 
 
+# User Event Model (Login successes/failures and account deletions, written by the audit pipeline)
+class UserEvent(Base):
+    __tablename__ = "user_event"
+
+    event_id = Column(Integer, primary_key=True, autoincrement=True)
+    event_type = Column(String(32), nullable=False, index=True)
+    user_mail = Column(String(255), nullable=False, index=True)
+    user_id = Column(Integer, nullable=True)
+    event_date = Column(DateTime, default=func.now(), index=True)
+
+    def __repr__(self):
+        return f"<UserEvent(event_id={self.event_id}, event_type={self.event_type}, user_mail={self.user_mail})>"
+
+
+# User Directory Model (phone -> email for sharded deployments; each shard holds the entries for the phones hashing to it)
+class UserDirectory(Base):
+    __tablename__ = "user_directory"
+
+    user_number = Column(String(15), primary_key=True)
+    user_mail = Column(String(255), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<UserDirectory(user_number={self.user_number}, user_mail={self.user_mail})>"
+
+
 # Function to handle database initialization
 def initialize_database(engine):
     """
@@ -0,0 +1,153 @@
+"""
+Background purge of soft-deleted users.
+
+With SOFT_DELETE, /delete/ only stamps UserMaster.deregister_date: the user can no
+longer log in or show up in listings, but keeps the email and phone number until the
+purge removes the rows. Every PURGE_POLL_SECONDS, while the clock is inside
+PURGE_WINDOW (off-peak hours, local time), the worker deletes users deregistered more
+than PURGE_RETENTION_HOURS ago from UserMaster, UserRegistration and RegistrationLog,
+PURGE_BATCH_SIZE users per transaction with PURGE_BATCH_PAUSE_MS between batches, so
+row locks are short and live traffic gets the database in between. Each database
+holding users (every shard, when sharded) is purged in turn.
+
+Purging is idempotent, but every worker running it repeats the scans: enable it on one
+worker (PURGE_ENABLED), or disable the schedule and have a scheduler call
+POST /admin/purge, which starts a run on the worker that receives it, ignoring the window.
+"""
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from config import settings
+from database import open_session, close_session, run_db
+from sharding import shard_router
+from crud import purge_deregistered_users, release_phones_async, delete_primary_registration_logs_async
+
+
+def parse_window(window: str):
+    """PURGE_WINDOW "HH:MM-HH:MM" -> (start, end) minutes after midnight, or None for any time."""
+    if not window:
+        return None
+    start, end = window.split("-")
+    return tuple(int(part[:2]) * 60 + int(part[3:]) for part in (start, end))
+
+
+class PurgeWorker:
+    def __init__(self, enabled: bool, retention_hours: float, window: str, batch_size: int,
+                 batch_pause: float, poll_interval: float):
+        self.enabled = enabled
+        self.retention = timedelta(hours=retention_hours)
+        self.window = parse_window(window)
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.poll_interval = poll_interval
+        self._task = None
+        self._manual_task = None
+        self.running = False
+        self.purged = 0
+        self.batches = 0
+        self.failures = 0
+        self.last_run_purged = 0
+        self.last_run_finished = None
+
+    def in_window(self, now: datetime = None) -> bool:
+        if self.window is None:
+            return True
+        now = now or datetime.now()
+        minute, (start, end) = now.hour * 60 + now.minute, self.window
+        # A window such as 22:00-04:00 wraps past midnight
+        return start <= minute < end if start <= end else minute >= start or minute < end
+
+    async def _purge_batch(self, shard, cutoff: datetime) -> int:
+        if shard is None:
+            db = open_session()
+            try:
+                found = await run_db(db, purge_deregistered_users, cutoff, self.batch_size)
+            finally:
+                await close_session(db)
+        else:
+            found = await shard_router.run(shard, purge_deregistered_users, cutoff, self.batch_size)
+            if found:
+                await release_phones_async(list(found.items()))
+                await delete_primary_registration_logs_async(list(found.values()))
+        self.batches += 1
+        self.purged += len(found)
+        return len(found)
+
+    async def run_once(self, ignore_window: bool = False) -> int:
+        """
+        Purges every expired user, batch by batch, stopping early if the window closes.
+        Returns the number of users purged.
+        """
+        cutoff = datetime.now() - self.retention
+        purged = 0
+        self.running = True
+        try:
+            for shard in shard_router.shards if shard_router.enabled else [None]:
+                while ignore_window or self.in_window():
+                    count = await self._purge_batch(shard, cutoff)
+                    purged += count
+                    if count < self.batch_size:
+                        break
+                    await asyncio.sleep(self.batch_pause)
+        finally:
+            self.running = False
+            self.last_run_purged = purged
+            self.last_run_finished = time.time()
+        if purged:
+            logging.info(f"🧹 Purged {purged} deregistered users.")
+        return purged
+
+    async def _run_logged(self, ignore_window: bool = False):
+        try:
+            await self.run_once(ignore_window)
+        except Exception as e:
+            self.failures += 1
+            logging.error(f"❌ Purge of deregistered users failed: {e}")
+
+    async def _loop(self):
+        while True:
+            if self.in_window() and not self.running:
+                await self._run_logged()
+            await asyncio.sleep(self.poll_interval)
+
+    def trigger(self) -> bool:
+        """Starts a run now, whatever the window, unless one is in progress. Returns whether it started."""
+        if self.running or not settings.SOFT_DELETE:
+            return False
+        self.running = True
+        self._manual_task = asyncio.create_task(self._run_logged(ignore_window=True))
+        return True
+
+    def start(self):
+        if not (self.enabled and settings.SOFT_DELETE) or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._loop())
+        logging.info(f"✅ Purge of deregistered users scheduled ({settings.PURGE_WINDOW or 'any time'}, batches of {self.batch_size}).")
+
+    async def shutdown(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self._task is not None,
+            "running": self.running,
+            "in_window": self.in_window(),
+            "purged": self.purged,
+            "batches": self.batches,
+            "failures": self.failures,
+            "last_run_purged": self.last_run_purged,
+            "last_run_finished": self.last_run_finished,
+        }
+
+
+purge_worker = PurgeWorker(
+    settings.PURGE_ENABLED,
+    settings.PURGE_RETENTION_HOURS,
+    settings.PURGE_WINDOW,
+    settings.PURGE_BATCH_SIZE,
+    settings.PURGE_BATCH_PAUSE_MS / 1000,
+    settings.PURGE_POLL_SECONDS,
+)
@@ -0,0 +1,88 @@
+"""
+In-process name -> id cache for UserRole and UserProfession.
+
+Consistency across gunicorn workers: every worker process holds its own copy,
+loaded at startup and refreshed lazily once it is older than REFDATA_TTL_SECONDS.
+The admin reload endpoint only reaches the worker that serves the request, so after
+adding or renaming a role or profession, either wait one TTL (the staleness bound
+for every worker) or restart the workers. Unknown names are rejected from the
+cache without touching the database, so a newly added name is accepted by each
+worker only after that worker's next refresh.
+"""
+import time
+import logging
+import threading
+from sqlalchemy.orm import Session
+from models import UserRole, UserProfession
+from config import settings
+
+
+class ReferenceDataCache:
+    """Name -> id maps for roles and professions with TTL refresh and hit/miss counters."""
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._roles = {}
+        self._professions = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def load(self, db: Session):
+        """Reloads both maps from the database and swaps them in atomically."""
+        roles = dict(db.query(UserRole.role_name, UserRole.role_id).all())
+        professions = dict(db.query(UserProfession.profession_name, UserProfession.profession_id).all())
+        self._roles, self._professions = roles, professions
+        self._loaded_at = time.monotonic()
+        self.reloads += 1
+        logging.info(f"✅ Reference data loaded: {len(roles)} roles, {len(professions)} professions.")
+
+    def invalidate(self):
+        """Marks the cache stale so the next lookup reloads it."""
+        self._loaded_at = 0.0
+
+    def _refresh_if_stale(self, db: Session):
+        if time.monotonic() - self._loaded_at < self.ttl_seconds:
+            return
+        # Until the first load every caller waits; afterwards only one thread reloads and the rest keep serving stale data
+        if not self._lock.acquire(blocking=self.reloads == 0):
+            return
+        try:
+            if time.monotonic() - self._loaded_at >= self.ttl_seconds:
+                self.load(db)
+        finally:
+            self._lock.release()
+
+    def _lookup(self, mapping: dict, name: str):
+        value = mapping.get(name)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def role_id(self, db: Session, name: str):
+        """Returns the role id for `name`, or None if the role is unknown."""
+        self._refresh_if_stale(db)
+        return self._lookup(self._roles, name)
+
+    def profession_id(self, db: Session, name: str):
+        """Returns the profession id for `name`, or None if the profession is unknown."""
+        self._refresh_if_stale(db)
+        return self._lookup(self._professions, name)
+
+    def stats(self) -> dict:
+        return {
+            "roles": len(self._roles),
+            "professions": len(self._professions),
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+        }
+
+
+reference_cache = ReferenceDataCache(settings.REFDATA_TTL_SECONDS)
@@ -0,0 +1,170 @@
+"""
+Read-replica routing for read-only crud functions.
+
+`replica_router.read(db, fn, *args, key=...)` runs `fn` on a healthy replica chosen
+round-robin or by fewest checked-out connections, and falls back to the request's
+primary session `db` when no replica is configured or healthy, or when the replica fails.
+Writes never go through here.
+
+Read-your-writes: identities written by this worker (`mark_written`) are read from
+the primary for READ_YOUR_WRITES_SECONDS. Lookups that find nothing on a replica are
+not retried on the primary, so unknown-email traffic (credential stuffing) never
+doubles its reads or lands on the primary; a user who registered through another
+worker is visible once the replica has caught up.
+"""
+import asyncio
+import logging
+import itertools
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from cache import TTLCache
+from config import settings
+from database import engine_options, open_session, close_session, run_db, ping
+
+ASYNC_DRIVERS = {"mysql": "aiomysql", "sqlite": "aiosqlite"}
+
+
+def async_url(url: str) -> str:
+    """Maps a sync replica URL to the async driver used by the async backend."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+class Replica:
+    def __init__(self, name: str, url: str, async_url_: str = None):
+        self.name = name
+        self.healthy = True
+        self.reads = 0
+        self.failures = 0
+        if settings.DB_BACKEND == "async":
+            url = async_url_ or async_url(url)
+            self.engine = create_async_engine(url, **engine_options(url, asynchronous=True))
+            self._sessionmaker = async_sessionmaker(self.engine, autoflush=False, expire_on_commit=False)
+            self.pool = self.engine.sync_engine.pool
+        else:
+            self.engine = create_engine(url, **engine_options(url))
+            self._sessionmaker = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+            self.pool = self.engine.pool
+
+    def open_session(self):
+        return self._sessionmaker()
+
+    def checked_out(self) -> int:
+        return self.pool.checkedout() if hasattr(self.pool, "checkedout") else 0
+
+
+class ReplicaRouter:
+    def __init__(self, replicas, balance: str, sticky_seconds: float, health_interval: float):
+        self.replicas = replicas
+        self.balance = balance
+        self.health_interval = health_interval
+        self._recent_writes = TTLCache(100000, sticky_seconds)
+        self._round_robin = itertools.count()
+        self._health_task = None
+        self.primary_reads = 0
+        self.fallbacks = 0
+
+    def mark_written(self, *keys):
+        """Pins reads for these identities to the primary for READ_YOUR_WRITES_SECONDS."""
+        if self.replicas:
+            for key in keys:
+                self._recent_writes.set(key, True)
+
+    def pick(self, key=None):
+        """Returns the replica to read from, or None for the primary."""
+        if key is not None and self._recent_writes.get(key):
+            return None
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if self.balance == "least_connections":
+            return min(healthy, key=Replica.checked_out)
+        return healthy[next(self._round_robin) % len(healthy)]
+
+    async def read(self, db, fn, *args, key=None):
+        """Runs the read-only crud function `fn(session, *args)` on a replica, falling back to the primary session `db`."""
+        replica = self.pick(key)
+        if replica is None:
+            self.primary_reads += 1
+            return await run_db(db, fn, *args)
+
+        session = replica.open_session()
+        try:
+            result = await run_db(session, fn, *args)
+            replica.reads += 1
+        except DBAPIError as e:
+            # Connection-level failure: take the replica out until the next health check passes
+            replica.healthy = False
+            replica.failures += 1
+            self.fallbacks += 1
+            logging.warning(f"⚠ Replica {replica.name} failed, reading from the primary: {e}")
+            return await run_db(db, fn, *args)
+        finally:
+            await close_session(session)
+        return result
+
+    def open_read_session(self):
+        """A session on the next replica (or the primary) for callers that manage it themselves, such as streaming exports."""
+        replica = self.pick()
+        return replica.open_session() if replica is not None else open_session()
+
+    async def check_health(self):
+        for replica in self.replicas:
+            session = replica.open_session()
+            try:
+                await asyncio.wait_for(run_db(session, ping), timeout=self.health_interval)
+                healthy = True
+            except Exception as e:
+                healthy = False
+                logging.warning(f"⚠ Replica {replica.name} health check failed: {e}")
+            finally:
+                await close_session(session)
+            if healthy != replica.healthy:
+                logging.info(f"{'✅' if healthy else '❌'} Replica {replica.name} is now {'healthy' if healthy else 'unhealthy'}.")
+            replica.healthy = healthy
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self.check_health()
+
+    def start(self):
+        if self.replicas and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+            logging.info(f"✅ Routing reads to {len(self.replicas)} replica(s) ({self.balance}).")
+
+    async def shutdown(self):
+        task, self._health_task = self._health_task, None
+        if task is not None:
+            task.cancel()
+        for replica in self.replicas:
+            result = replica.engine.dispose()
+            if asyncio.iscoroutine(result):
+                await result
+
+    def stats(self) -> dict:
+        return {
+            "balance": self.balance,
+            "primary_reads": self.primary_reads,
+            "fallbacks": self.fallbacks,
+            "replicas": [
+                {"name": replica.name, "healthy": replica.healthy, "reads": replica.reads,
+                 "failures": replica.failures, "checked_out": replica.checked_out()}
+                for replica in self.replicas
+            ],
+        }
+
+
+replica_router = ReplicaRouter(
+    [
+        Replica(f"replica{i}", url, async_url_)
+        for i, (url, async_url_) in enumerate(itertools.zip_longest(settings.REPLICA_URLS, settings.ASYNC_REPLICA_URLS))
+    ],
+    settings.REPLICA_BALANCE,
+    settings.READ_YOUR_WRITES_SECONDS,
+    settings.REPLICA_HEALTH_INTERVAL_SECONDS,
+)
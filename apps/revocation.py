@@ -0,0 +1,121 @@
+"""
+Revoked-token store consulted on every authenticated request, so it never touches MySQL.
+
+Two kinds of entries, each kept only until the tokens it covers would have expired anyway:
+  * jti -> exp for individual tokens (logout, refresh-token rotation)
+  * subject -> cutoff for "every token issued up to now" (account deletion)
+
+MemoryRevocationStore is a per-process stand-in for a shared store: a revocation made
+by one gunicorn worker is not seen by the others. A shared backend (e.g. Redis with
+SET key EX ttl) implements the same interface to make revocations global.
+"""
+import time
+import heapq
+import logging
+import threading
+from config import settings
+
+
+class RevocationStore:
+    """Storage interface for revoked tokens."""
+
+    def revoke(self, jti: str, expires_at: float):
+        """Revokes one token until its expiry (epoch seconds)."""
+        raise NotImplementedError
+
+    def revoke_subject(self, subject: str, until: float):
+        """Revokes every token of `subject` issued up to now; the entry is kept until `until`."""
+        raise NotImplementedError
+
+    def is_revoked(self, jti: str, subject: str, issued_at: float) -> bool:
+        raise NotImplementedError
+
+    def __len__(self):
+        """Number of stored entries, where the backend can report it cheaply."""
+        return 0
+
+
+class _ExpiringMap:
+    """key -> (value, expires_at) with O(1) lookups and a heap for expiry-ordered eviction."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._heap = []
+        self.evicted = 0
+
+    def get(self, key, now: float):
+        item = self._entries.get(key)
+        if item is None or item[1] <= now:
+            return None
+        return item[0]
+
+    def set(self, key, value, expires_at: float, now: float):
+        self._entries[key] = (value, expires_at)
+        heapq.heappush(self._heap, (expires_at, key))
+        self._purge(now)
+
+    def _purge(self, now: float):
+        # Heap entries whose key was overwritten later are stale and simply skipped
+        while self._heap and (self._heap[0][0] <= now or len(self._entries) > self.max_entries):
+            expires_at, key = heapq.heappop(self._heap)
+            item = self._entries.get(key)
+            if item is None or item[1] != expires_at:
+                continue
+            del self._entries[key]
+            if expires_at > now:
+                # Full: the entry closest to expiring anyway goes first
+                self.evicted += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class MemoryRevocationStore(RevocationStore):
+    """Per-process revocation store bounded to `max_entries` tokens and as many subjects."""
+
+    def __init__(self, max_entries: int):
+        self._tokens = _ExpiringMap(max_entries)
+        self._subjects = _ExpiringMap(max_entries)
+        self._lock = threading.Lock()
+
+    def revoke(self, jti: str, expires_at: float):
+        now = time.time()
+        with self._lock:
+            evicted = self._tokens.evicted
+            self._tokens.set(jti, True, expires_at, now)
+            if self._tokens.evicted > evicted:
+                logging.warning("⚠ Revocation store is full; tokens closest to expiry were forgotten early.")
+
+    def revoke_subject(self, subject: str, until: float):
+        now = time.time()
+        with self._lock:
+            # Not rounded to the second: tokens carry a sub-second iat (see create_access_token)
+            self._subjects.set(subject, now, until, now)
+
+    def is_revoked(self, jti: str, subject: str, issued_at: float) -> bool:
+        now = time.time()
+        if jti is not None and self._tokens.get(jti, now):
+            return True
+        cutoff = self._subjects.get(subject, now)
+        return cutoff is not None and issued_at <= cutoff
+
+    def stats(self) -> dict:
+        return {
+            "tokens": len(self._tokens),
+            "subjects": len(self._subjects),
+            "evicted": self._tokens.evicted + self._subjects.evicted,
+        }
+
+    def __len__(self):
+        return len(self._tokens) + len(self._subjects)
+
+
+revocation_store = MemoryRevocationStore(settings.REVOCATION_MAX_ENTRIES)
+
+
+def revoke_user_tokens(*subjects: str):
+    """Revokes every access and refresh token issued so far to these users."""
+    until = time.time() + max(settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60, settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400)
+    for subject in subjects:
+        revocation_store.revoke_subject(subject, until)
@@ -91,38 +91,90 @@
 
 
 
+import io
+import csv
+import json
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.exc import SQLAlchemyError
-from datetime import timedelta
-from database import get_db
-from schemas import UserRegistrationRequest, UserLoginRequest, TokenResponse
-from crud import create_user, authenticate_user, delete_user_by_phone
-from utils import create_access_token
+from datetime import datetime, timedelta
+from database import get_session, run_db, open_session, close_session, stream_rows
+from schemas import UserRegistrationRequest, UserLoginRequest, TokenResponse, UserResponse, UserPageResponse
+from schemas import TokenRefreshRequest, LogoutRequest
+from crud import (
+    create_user_async,
+    bulk_create_users_async,
+    authenticate_user_async,
+    delete_user_by_phone_async,
+    bulk_delete_users_by_phone_async,
+    taken_identities_async,
+    list_users_async,
+    user_listing_query,
+)
+from utils import create_access_token, create_refresh_token, decode_access_token, require_admin
+from refcache import reference_cache
+from ratelimit import login_rate_limiter
+from auth import CurrentUser, get_current_user, get_token_claims, token_claims, user_for_token, check_not_revoked, verified_token_cache, bearer_scheme
+from revocation import revocation_store
+from loadshed import load_shedder
+from bloom import identity_filter
+from replicas import replica_router
+from sharding import shard_router
+from idempotency import idempotency_manager
+from purge import purge_worker
+from logincache import login_cache
 from config import settings
-from schemas import UserDeleteRequest  # Import it from schemas.py
+from schemas import UserDeleteRequest, UserBulkDeleteRequest  # Import it from schemas.py
 
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
-
 router = APIRouter()
 
+IdempotencyKey = Header(None, alias="Idempotency-Key", max_length=255, description="Repeating a key replays the first response.")
+
+
 @router.post("/register/", response_model=dict)
-def register_user(user_data: UserRegistrationRequest, db: Session = Depends(get_db)):
+async def register_user(
+    user_data: UserRegistrationRequest,
+    response: Response,
+    db=Depends(get_session),
+    idempotency_key: Optional[str] = IdempotencyKey,
+):
     """
     Registers a new user in the system.
-    Returns a success message along with the user ID.
+    Returns a success message along with the user ID. Retries sending the same
+    Idempotency-Key and body get the first response back without registering again.
     """
+    # Keys are not tied to a caller, so they are scoped by the body as well: two clients
+    # picking the same key for different registrations never see each other's response
+    payload = user_data.model_dump()
+    return await idempotency_manager.run(
+        f"register:{idempotency_manager.fingerprint(payload)}", idempotency_key, payload,
+        lambda: _register_user(db, user_data), response
+    )
+
+
+async def _register_user(db, user_data: UserRegistrationRequest):
     try:
-        user_id = create_user(db, user_data)
-        if not user_id:
+        user_id = await create_user_async(db, user_data)
+        if not user_id or user_id.get("error") == "Invalid role or profession.":
             raise HTTPException(status_code=400, detail="Invalid role or profession.")
-        
+
+        if user_id.get("error") == "User already exists or invalid foreign key reference.":
+            raise HTTPException(status_code=409, detail=user_id["error"])
+
+        # Raised rather than returned, so the idempotency manager never stores a server error
+        if "error" in user_id:
+            raise HTTPException(status_code=500, detail=user_id["error"])
+
         logging.info(f"✅ User registered successfully: {user_data.email}")
         return {"message": "User registered successfully!", "user_id": user_id}
 
+    except HTTPException:
+        raise
+
     except SQLAlchemyError as e:
         logging.error(f"❌ Database error during registration: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal Server Error.")
@@ -132,14 +184,116 @@ def register_user(user_data: UserRegistrationRequest, db: Session = Depends(get_
         raise HTTPException(status_code=500, detail="An unexpected error occurred.")
 
 
+async def _read_bulk_payload(request: Request) -> list:
+    """Reads a JSON array, or an NDJSON stream when the content type says so, capped at BULK_MAX_ROWS."""
+    try:
+        if "ndjson" in request.headers.get("content-type", ""):
+            items, buffer = [], b""
+            async for chunk in request.stream():
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                items.extend(json.loads(line) for line in lines if line.strip())
+                if len(items) > settings.BULK_MAX_ROWS:
+                    break
+            if buffer.strip():
+                items.append(json.loads(buffer))
+        else:
+            items = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON stream.")
+
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON stream.")
+    if len(items) > settings.BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {settings.BULK_MAX_ROWS} users.")
+    return items
+
+
+@router.post("/register/bulk", response_model=dict)
+async def register_users_bulk(request: Request, db=Depends(get_session)):
+    """
+    Registers a batch of users from a JSON array or NDJSON stream.
+    Returns a success or error entry for every row, in input order.
+    """
+    try:
+        items = await _read_bulk_payload(request)
+
+        users, errors = [], {}
+        for index, item in enumerate(items):
+            try:
+                users.append((index, UserRegistrationRequest.model_validate(item)))
+            except ValidationError as e:
+                # Drop the echoed input so passwords never appear in the response
+                details = [{k: v for k, v in error.items() if k != "input"} for error in e.errors(include_url=False, include_context=False)]
+                errors[index] = {"index": index, "error": "Invalid request data", "details": details}
+
+        results = {result["index"]: result for result in await bulk_create_users_async(db, users)} if users else {}
+        results.update(errors)
+        results = [results[index] for index in range(len(items))]
+
+        registered = sum(1 for result in results if "success" in result)
+        logging.info(f"✅ Bulk registration: {registered}/{len(items)} users registered.")
+        return {"message": "Bulk registration processed.", "registered": registered, "failed": len(items) - registered, "results": results}
+
+    except HTTPException:
+        raise
+
+    except SQLAlchemyError as e:
+        logging.error(f"❌ Database error during bulk registration: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error.")
+
+    except Exception as e:
+        logging.error(f"❌ Unexpected error: {str(e)}")
+        raise HTTPException(status_code=500, detail="An unexpected error occurred.")
+
+
+@router.get("/availability", response_model=dict)
+async def check_availability(
+    email: Optional[str] = Query(None, max_length=255),
+    phone: Optional[str] = Query(None, max_length=15),
+):
+    """
+    Reports whether an email and/or phone number is still free, for signup forms.
+    The Bloom filter answers most lookups; only probable hits reach the database.
+    """
+    if email is None and phone is None:
+        raise HTTPException(status_code=400, detail="Provide an email or a phone number.")
+
+    probable = {}
+    if email is not None:
+        probable["email"] = identity_filter.might_contain_email(email)
+    if phone is not None:
+        probable["phone"] = identity_filter.might_contain_phone(phone)
+
+    taken = set()
+    if any(probable.values()):
+        db = open_session()
+        try:
+            taken = await taken_identities_async(
+                db, [email] if probable.get("email") else [], [phone] if probable.get("phone") else [], replica=True
+            )
+        except SQLAlchemyError as e:
+            logging.error(f"❌ Database error during availability check: {str(e)}")
+            raise HTTPException(status_code=500, detail="Internal Server Error.")
+        finally:
+            await close_session(db)
+        if not taken:
+            identity_filter.record_false_positive()
+
+    values = {"email": email, "phone": phone}
+    return {f"{field}_available": values[field] not in taken for field in probable}
+
+
 @router.post("/login/", response_model=TokenResponse)
-def login(user_data: UserLoginRequest, db: Session = Depends(get_db)):
+async def login(user_data: UserLoginRequest, request: Request, db=Depends(get_session)):
     """
-    Authenticates a user and returns an access token if credentials are valid.
+    Authenticates a user and returns an access token and a refresh token if credentials are valid.
+    Attempts are throttled per email and per client IP before any database or bcrypt work.
     """
     try:
-        user = authenticate_user(db, user_data.email, user_data.password)
-        if not user:
+        login_rate_limiter.check(user_data.email, login_rate_limiter.client_ip(request))
+        user = await authenticate_user_async(db, user_data.email, user_data.password)
+        if not user or isinstance(user, dict):
             logging.warning(f"⚠ Login failed: Invalid credentials for {user_data.email}")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -151,7 +305,10 @@ def login(user_data: UserLoginRequest, db: Session = Depends(get_db)):
         access_token = create_access_token(data={"sub": user.user_mail}, expires_delta=access_token_expires)
 
         logging.info(f"✅ User logged in successfully: {user_data.email}")
-        return {"access_token": access_token, "token_type": "bearer"}
+        return {"access_token": access_token, "token_type": "bearer", "refresh_token": create_refresh_token(user.user_mail)}
+
+    except HTTPException:
+        raise
 
     except SQLAlchemyError as e:
         logging.error(f"❌ Database error during login: {str(e)}")
@@ -162,22 +319,291 @@ def login(user_data: UserLoginRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="An unexpected error occurred.")
 
 
+@router.post("/token/refresh", response_model=TokenResponse)
+async def refresh_token(token_data: TokenRefreshRequest):
+    """
+    Exchanges a refresh token for a new access token and a new refresh token.
+    The presented refresh token is revoked (rotation), so each one works only once.
+    Needs no database access: the signature, expiry and the revocation store decide.
+    """
+    payload = decode_access_token(token_data.refresh_token, token_type="refresh")
+    check_not_revoked(payload)
+    revocation_store.revoke(payload["jti"], payload["exp"])
+
+    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    return {
+        "access_token": create_access_token(data={"sub": payload["sub"]}, expires_delta=access_token_expires),
+        "token_type": "bearer",
+        "refresh_token": create_refresh_token(payload["sub"]),
+    }
+
+
+@router.post("/logout", response_model=dict)
+async def logout(
+    token_data: Optional[LogoutRequest] = None,
+    claims: dict = Depends(get_token_claims),
+    credentials=Depends(bearer_scheme),
+):
+    """
+    Revokes the bearer access token and, when given, the caller's refresh token.
+    """
+    if token_data is not None and token_data.refresh_token:
+        refresh_claims = decode_access_token(token_data.refresh_token, token_type="refresh")
+        if refresh_claims["sub"] != claims["sub"]:
+            raise HTTPException(status_code=403, detail="The refresh token belongs to another user.")
+        revocation_store.revoke(refresh_claims["jti"], refresh_claims["exp"])
+
+    # Tokens issued before revocation existed have no jti; they simply run out
+    if claims.get("jti"):
+        revocation_store.revoke(claims["jti"], claims["exp"])
+    verified_token_cache.pop(credentials.credentials)
+    logging.info(f"✅ User logged out: {claims['sub']}")
+    return {"message": "Logged out."}
+
+
 @router.delete("/delete/", response_model=dict)
-def delete_user(user_data: UserDeleteRequest, db: Session = Depends(get_db)):
+async def delete_user(
+    user_data: UserDeleteRequest,
+    response: Response,
+    db=Depends(get_session),
+    credentials=Depends(bearer_scheme),
+    idempotency_key: Optional[str] = IdempotencyKey,
+):
     """
     Deletes a user by phone number from the database.
+    Requires a bearer token; users may only delete their own account.
+    Retries sending the same Idempotency-Key get the first response back.
     """
+    # Keys are scoped by the token's signed subject, without a database read: the deletion
+    # revokes the token and removes the user, and a retry must still get the first response
+    claims = token_claims(credentials)
+    subject = claims["sub"] if claims is not None else None
+
+    async def attempt():
+        current_user = await (user_for_token(credentials.credentials, claims) if claims else get_current_user(credentials))
+        return await _delete_user(db, user_data, current_user)
+
+    return await idempotency_manager.run(
+        f"delete:{subject}", idempotency_key if subject else None, user_data.model_dump(), attempt, response
+    )
+
+
+async def _delete_user(db, user_data: UserDeleteRequest, current_user: CurrentUser):
     try:
         phone_number = user_data.phone  # Extract phone number from request body
-        success = delete_user_by_phone(db, phone_number)
+        if phone_number != current_user.phone:
+            logging.warning(f"⚠ User {current_user.email} attempted to delete another account: {phone_number}")
+            raise HTTPException(status_code=403, detail="You can only delete your own account.")
+
+        result = await delete_user_by_phone_async(db, phone_number)
 
-        if not success:
+        if result.get("error") == "User not found.":
             logging.warning(f"⚠ User deletion failed: No user found for phone {phone_number}")
             raise HTTPException(status_code=404, detail="User not found")
 
+        if "error" in result:
+            raise HTTPException(status_code=500, detail=result["error"])
+
         logging.info(f"✅ User deleted successfully: {phone_number}")
         return {"message": "User deleted successfully!"}
 
+    except HTTPException:
+        raise
+
     except Exception as e:
         logging.error(f"❌ Unexpected error: {str(e)}")
-        raise HTTPException(status_code=500, detail="An unexpected error occurred.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="An unexpected error occurred.")
+
+
+@router.delete("/delete/bulk", response_model=dict, dependencies=[Depends(require_admin)])
+async def delete_users_bulk(user_data: UserBulkDeleteRequest, db=Depends(get_session)):
+    """
+    Permanently deletes many users by phone number in chunked set-based statements,
+    including users already soft-deleted through /delete/. Reports the numbers that matched no user.
+    """
+    if len(user_data.phones) > settings.BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {settings.BULK_MAX_ROWS} phone numbers.")
+    try:
+        result = await bulk_delete_users_by_phone_async(db, user_data.phones)
+        logging.info(f"✅ Bulk deletion: {result['deleted']} users deleted.")
+        return {"message": "Bulk deletion processed.", **result}
+
+    except Exception as e:
+        logging.error(f"❌ Unexpected error: {str(e)}")
+        raise HTTPException(status_code=500, detail="An unexpected error occurred.")
+
+
+class UserFilters:
+    """Query parameters shared by the user listing and export endpoints."""
+
+    def __init__(self, role: Optional[str] = None, profession: Optional[str] = None,
+                 country: Optional[str] = None, city: Optional[str] = None):
+        self.role, self.profession, self.country, self.city = role, profession, country, city
+
+    def as_dict(self) -> dict:
+        return {"role": self.role, "profession": self.profession, "country": self.country, "city": self.city}
+
+
+@router.get("/users", response_model=UserPageResponse, dependencies=[Depends(require_admin)])
+async def get_users(
+    after: int = Query(0, ge=0, description="Cursor: the next_cursor of the previous page (unsharded: the last id seen)."),
+    limit: int = Query(50, ge=1, le=settings.USERS_PAGE_MAX),
+    filters: UserFilters = Depends(),
+    db=Depends(get_session),
+):
+    """
+    Lists users in id order with keyset pagination, optionally filtered by role, profession, country and city.
+    """
+    try:
+        items, next_cursor = await list_users_async(db, after, limit, filters.as_dict())
+        return {"items": items, "next_cursor": next_cursor}
+
+    except SQLAlchemyError as e:
+        logging.error(f"❌ Database error while listing users: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error.")
+
+
+EXPORT_FIELDS = list(UserResponse.model_fields)
+
+
+async def _export_partitions(statement):
+    """Row batches of `statement` from every shard in turn, or from a replica (or the primary) when unsharded."""
+    open_sessions = [shard.open_session for shard in shard_router.shards] if shard_router.enabled else [replica_router.open_read_session]
+    for open_read_session in open_sessions:
+        async for rows in stream_rows(statement, settings.EXPORT_BATCH_SIZE, open_read_session()):
+            yield rows
+
+
+async def _export_ndjson(statement):
+    async for rows in _export_partitions(statement):
+        yield "".join(json.dumps(row._asdict(), default=datetime.isoformat) + "\n" for row in rows)
+
+
+async def _export_csv(statement):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    async for rows in _export_partitions(statement):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@router.get("/users/export", dependencies=[Depends(require_admin)])
+async def export_users(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    filters: UserFilters = Depends(),
+):
+    """
+    Streams every matching user as NDJSON or CSV, one batch of EXPORT_BATCH_SIZE rows at a time.
+    """
+    statement = user_listing_query(**filters.as_dict())
+    logging.info(f"📤 User export started ({format}).")
+    if format == "csv":
+        return StreamingResponse(
+            _export_csv(statement), media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="users.csv"'},
+        )
+    return StreamingResponse(
+        _export_ndjson(statement), media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="users.ndjson"'},
+    )
+
+
+@router.get("/admin/reference-data", response_model=dict, dependencies=[Depends(require_admin)])
+async def reference_data_stats():
+    """
+    Returns the size, age and hit/miss counters of this worker's role/profession cache.
+    """
+    return reference_cache.stats()
+
+
+@router.post("/admin/reference-data/reload", response_model=dict, dependencies=[Depends(require_admin)])
+async def reload_reference_data(db=Depends(get_session)):
+    """
+    Reloads this worker's role/profession cache from the database.
+    """
+    try:
+        await run_db(db, reference_cache.load)
+        return {"message": "Reference data reloaded.", **reference_cache.stats()}
+
+    except SQLAlchemyError as e:
+        logging.error(f"❌ Database error while reloading reference data: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error.")
+
+
+@router.get("/admin/rate-limits", response_model=dict, dependencies=[Depends(require_admin)])
+async def rate_limit_stats():
+    """
+    Returns this worker's login throttling counters.
+    """
+    return login_rate_limiter.stats()
+
+
+@router.get("/admin/identity-filter", response_model=dict, dependencies=[Depends(require_admin)])
+async def identity_filter_stats():
+    """
+    Returns the size and hit counters of this worker's email/phone Bloom filter.
+    """
+    return identity_filter.stats()
+
+
+@router.get("/admin/replicas", response_model=dict, dependencies=[Depends(require_admin)])
+async def replica_stats():
+    """
+    Returns this worker's read-replica health and routing counters.
+    """
+    return replica_router.stats()
+
+
+@router.get("/admin/load", response_model=dict, dependencies=[Depends(require_admin)])
+async def load_stats():
+    """
+    Returns this worker's saturation signals and load shedding counters.
+    """
+    return load_shedder.stats()
+
+
+@router.get("/admin/idempotency", response_model=dict, dependencies=[Depends(require_admin)])
+async def idempotency_stats():
+    """
+    Returns this worker's Idempotency-Key store size and replay counters.
+    """
+    return idempotency_manager.stats()
+
+
+@router.get("/admin/shards", response_model=dict, dependencies=[Depends(require_admin)])
+async def shard_stats():
+    """
+    Returns the configured shards, whether each owns keys on the ring, and this worker's per-shard operation counts.
+    """
+    return shard_router.stats()
+
+
+@router.get("/admin/login-cache", response_model=dict, dependencies=[Depends(require_admin)])
+async def login_cache_stats():
+    """
+    Returns the size, hit counters and invalidation counts of this worker's login record cache.
+    """
+    return login_cache.stats()
+
+
+@router.get("/admin/purge", response_model=dict, dependencies=[Depends(require_admin)])
+async def purge_stats():
+    """
+    Returns this worker's purge schedule state and progress counters for deregistered users.
+    """
+    return purge_worker.stats()
+
+
+@router.post("/admin/purge", response_model=dict, status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_admin)])
+async def start_purge():
+    """
+    Starts purging expired deregistered users on this worker now, outside PURGE_WINDOW.
+    """
+    if not settings.SOFT_DELETE:
+        raise HTTPException(status_code=409, detail="Soft delete is disabled; there is nothing to purge.")
+    return {"started": purge_worker.trigger(), **purge_worker.stats()}
@@ -1,11 +1,7 @@
-import logging
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, Annotated
+from typing import Optional, Annotated, List
 from datetime import datetime
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
-
 # User Registration Request Schema
 class UserRegistrationRequest(BaseModel):
     username: str = Field(..., min_length=3, max_length=50, description="Username must be between 3 and 50 characters.")
@@ -29,6 +25,11 @@ class UserResponse(BaseModel):
     city: str
     registration_date: datetime
 
+# Keyset-paginated user listing
+class UserPageResponse(BaseModel):
+    items: List[UserResponse]
+    next_cursor: Optional[int] = Field(None, description="Pass as `after` to fetch the next page; null on the last page.")
+
 # User Login Schema
 class UserLoginRequest(BaseModel):
     email: EmailStr
@@ -38,7 +39,20 @@ class UserLoginRequest(BaseModel):
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+# Refresh Token Schema
+class TokenRefreshRequest(BaseModel):
+    refresh_token: str
+
+# Logout Schema (the refresh token, when given, is revoked along with the access token)
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
 
 # User Deletion Schema
 class UserDeleteRequest(BaseModel):
     phone: Annotated[str, Field(pattern=r"^[6-9]\d{9}$", description="Phone number must be a valid 10-digit Indian mobile number.")]
+
+# Bulk User Deletion Schema
+class UserBulkDeleteRequest(BaseModel):
+    phones: List[Annotated[str, Field(pattern=r"^[6-9]\d{9}$")]] = Field(..., min_length=1, description="Phone numbers of the users to delete.")
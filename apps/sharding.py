@@ -0,0 +1,150 @@
+"""
+Hash-sharded user storage.
+
+With SHARD_URLS set, UserRegistration / UserMaster (and inline RegistrationLog) rows
+live on the shard their email maps to on a consistent-hash ring, so adding a shard
+moves only about 1/N of the users. Phone numbers use a second key on the same ring:
+the UserDirectory row (phone -> email) lives on the shard the phone maps to, so its
+primary key keeps phone numbers unique across shards without a global table, and the
+email it holds names the user's shard. The primary keeps the reference and audit tables.
+
+Each shard is a complete schema (`python manage.py init-shards` creates it and copies
+the reference data); `python manage.py rebalance-shards` moves users whose owner
+changed after SHARD_URLS / SHARD_DRAIN were edited.
+
+Without SHARD_URLS the router is disabled and every call runs on the primary session.
+"""
+import bisect
+import asyncio
+import hashlib
+import logging
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from config import settings
+from database import engine_options, open_session, close_session, run_db
+from replicas import async_url
+
+
+def parse_shard_urls(entries) -> list:
+    """SHARD_URLS entries are `name=url` or a bare url (named shard<index>). Returns [(name, url)]."""
+    shards = []
+    for index, entry in enumerate(entries):
+        name, separator, url = entry.partition("=")
+        if not separator or "/" in name or ":" in name:
+            name, url = f"shard{index}", entry
+        shards.append((name.strip(), url.strip()))
+    return shards
+
+
+class Shard:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+        self.operations = 0
+        # The sync engine serves offline tools and background scans; requests use the async one when selected
+        self.engine = create_engine(url, **engine_options(url, background=settings.DB_BACKEND == "async"))
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.async_engine = None
+        if settings.DB_BACKEND == "async":
+            self.async_engine = create_async_engine(async_url(url), **engine_options(url, asynchronous=True))
+            self._async_sessionmaker = async_sessionmaker(self.async_engine, autoflush=False, expire_on_commit=False)
+
+    def open_session(self):
+        """A session for the configured backend."""
+        return self._async_sessionmaker() if self.async_engine is not None else self.SessionLocal()
+
+    async def dispose(self):
+        self.engine.dispose()
+        if self.async_engine is not None:
+            await self.async_engine.dispose()
+
+
+class HashRing:
+    """Consistent-hash ring with `vnodes` points per shard name."""
+
+    def __init__(self, names, vnodes: int):
+        points = sorted((self._hash(f"{name}#{i}"), name) for name in names for i in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._names = [name for _, name in points]
+        self.names = set(self._names)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+    def owner(self, key: str) -> str:
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._names[index]
+
+
+class ShardRouter:
+    def __init__(self, shards, draining=(), vnodes: int = 160):
+        self.shards = shards
+        self.by_name = {shard.name: shard for shard in shards}
+        # Draining shards stay reachable (for rebalance-shards) but own no keys
+        self.ring = HashRing([shard.name for shard in shards if shard.name not in draining], vnodes) if shards else None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.shards)
+
+    @staticmethod
+    def _key(key: str) -> str:
+        return key.strip().lower()
+
+    def shard_for(self, key: str) -> Shard:
+        """The shard owning an email (the user's rows) or a phone number (its directory entry)."""
+        return self.by_name[self.ring.owner(self._key(key))]
+
+    def group_by_shard(self, items, key=lambda item: item) -> dict:
+        """Splits `items` into {shard: [items]} by the shard owning each item's key (an email or a phone number)."""
+        groups = {}
+        for item in items:
+            groups.setdefault(self.shard_for(key(item)), []).append(item)
+        return groups
+
+    async def run(self, shard: Shard, fn, *args):
+        """Runs the sync crud function `fn(session, *args)` on its own session on `shard`."""
+        shard.operations += 1
+        session = shard.open_session()
+        try:
+            return await run_db(session, fn, *args)
+        finally:
+            await close_session(session)
+
+    async def run_for_email(self, db, email: str, fn, *args):
+        """Runs `fn(session, *args)` on the shard owning `email`, or on the primary session `db` when sharding is off."""
+        if not self.enabled:
+            return await run_db(db, fn, *args)
+        return await self.run(self.shard_for(email), fn, *args)
+
+    async def run_grouped(self, groups: dict, fn, *args) -> list:
+        """Runs `fn(session, items, *args)` concurrently on every shard in {shard: items}. Returns the results in group order."""
+        return await asyncio.gather(*(self.run(shard, fn, items, *args) for shard, items in groups.items()))
+
+    def open_session(self, email: str = None):
+        """A session on the shard owning `email` (`None`: the primary) for callers that manage it themselves."""
+        return self.shard_for(email).open_session() if self.enabled and email is not None else open_session()
+
+    async def shutdown(self):
+        for shard in self.shards:
+            await shard.dispose()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "shards": [
+                {"name": shard.name, "operations": shard.operations, "in_ring": shard.name in self.ring.names}
+                for shard in self.shards
+            ],
+        }
+
+
+shard_router = ShardRouter(
+    [Shard(name, url) for name, url in parse_shard_urls(settings.SHARD_URLS)],
+    settings.SHARD_DRAIN,
+    settings.SHARD_VNODES,
+)
+if shard_router.enabled:
+    logging.info(f"✅ Sharding users across {len(shard_router.shards)} databases.")
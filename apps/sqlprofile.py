@@ -0,0 +1,134 @@
+"""
+Per-request SQL profiling.
+
+SQLProfileMiddleware opens a RequestProfile for every HTTP request, and listeners on
+SQLAlchemy's Engine events add each statement's count and cursor time to the profile
+of the request that issued it. The listeners cover every engine in the process (the
+primary, shards and replicas, sync and async). Work started outside a request, such as
+the audit writer or the purge, is not attributed to any request.
+
+Per route, the statement count and database time feed the http_request_db_statements
+and http_request_db_seconds histograms. Requests slower than SLOW_REQUEST_MS are logged
+with their figures. With DEBUG on, responses carry them in a Server-Timing header,
+which browser dev tools show next to the request.
+"""
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import settings
+from metrics import registry, Histogram
+
+http_request_db_statements = registry.register(Histogram(
+    "http_request_db_statements", "SQL statements issued per HTTP request, by route template.", ("method", "route"),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100)))
+http_request_db_seconds = registry.register(Histogram(
+    "http_request_db_seconds", "Time spent executing SQL per HTTP request, by route template.", ("method", "route")))
+
+
+class RequestProfile:
+    __slots__ = ("statements", "db_seconds", "_lock")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self._lock = threading.Lock()  # Sharded requests run statements on several threads at once
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.statements += 1
+            self.db_seconds += seconds
+
+
+_current_profile: ContextVar = ContextVar("sql_profile", default=None)
+
+
+def current_profile():
+    """The RequestProfile of the request being served, or None outside a request."""
+    return _current_profile.get()
+
+
+@contextmanager
+def profiled():
+    """Collects the SQL issued inside the block (and the tasks and threadpool calls it starts) into a RequestProfile."""
+    profile = RequestProfile()
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        conn.info.setdefault("sql_profile_started", []).append(time.perf_counter())
+
+
+def _statement_finished(conn):
+    profile = _current_profile.get()
+    started = conn.info.get("sql_profile_started")
+    if profile is not None and started:
+        profile.record(time.perf_counter() - started.pop())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _statement_finished(conn)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute: count it here, or its start
+    # time stays on the pooled connection and is charged to the next statement it runs
+    if context.connection is not None:
+        _statement_finished(context.connection)
+
+
+def _server_timing(profile: RequestProfile, elapsed: float) -> bytes:
+    return (
+        f'db;dur={profile.db_seconds * 1000:.1f};desc="{profile.statements} queries", '
+        f"app;dur={elapsed * 1000:.1f}"
+    ).encode("latin-1")
+
+
+class SQLProfileMiddleware:
+    """ASGI middleware that profiles the SQL issued by each request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.SQL_PROFILE_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        with profiled() as profile:
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start" and settings.DEBUG:
+                    # Streamed responses report the statements issued before their first byte
+                    message["headers"] = [
+                        *message.get("headers", []), (b"server-timing", _server_timing(profile, time.perf_counter() - started))
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                self._report(scope, profile, time.perf_counter() - started)
+
+    @staticmethod
+    def _report(scope, profile: RequestProfile, elapsed: float):
+        route = getattr(scope.get("route"), "path", "unmatched")
+        http_request_db_statements.observe(profile.statements, scope["method"], route)
+        http_request_db_seconds.observe(profile.db_seconds, scope["method"], route)
+        if settings.SLOW_REQUEST_MS and elapsed * 1000 >= settings.SLOW_REQUEST_MS:
+            logging.warning(
+                f"🐢 Slow request {scope['method']} {route}: {elapsed * 1000:.0f} ms, "
+                f"{profile.statements} SQL statements taking {profile.db_seconds * 1000:.0f} ms."
+            )
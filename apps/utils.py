@@ -1,21 +1,23 @@
 import re
+import hmac
+import uuid
 import bcrypt
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from jose import jwt, JWTError
-from fastapi import HTTPException
-
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+from fastapi import HTTPException, Header
+from config import settings
+from metrics import password_hash_duration_seconds
 
 # Secret key and algorithm for JWT
-SECRET_KEY = "your_secret_key"
-ALGORITHM = "HS256"
+SECRET_KEY = settings.SECRET_KEY
+ALGORITHM = settings.ALGORITHM
 
 def hash_password(password: str) -> str:
     """Hashes the given password using bcrypt with exception handling."""
     try:
-        return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+        with password_hash_duration_seconds.time("hash"):
+            return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)).decode("utf-8")
     except Exception as e:
         logging.error(f"Error hashing password: {e}")
         raise HTTPException(status_code=500, detail="Internal server error while hashing password.")
@@ -23,7 +25,8 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifies a password against its hashed version with exception handling."""
     try:
-        return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+        with password_hash_duration_seconds.time("verify"):
+            return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
     except Exception as e:
         logging.error(f"Error verifying password: {e}")
         raise HTTPException(status_code=500, detail="Internal server error while verifying password.")
@@ -57,12 +60,14 @@ def validate_phone(phone: str):
         logging.error(f"Phone validation error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
-def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes=15)) -> str:
-    """Generates a JWT access token with exception handling."""
+def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes=15), token_type: str = "access") -> str:
+    """Generates a JWT access token with exception handling. Every token gets a unique jti so it can be revoked."""
     try:
         to_encode = data.copy()
-        expire = datetime.utcnow() + expires_delta
-        to_encode.update({"exp": expire})
+        now = datetime.utcnow()
+        # iat keeps sub-second precision so a token minted right after a revocation is not caught by its cutoff
+        issued_at = now.replace(tzinfo=timezone.utc).timestamp()
+        to_encode.update({"exp": now + expires_delta, "iat": issued_at, "jti": uuid.uuid4().hex, "type": token_type})
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
     except JWTError as e:
@@ -71,3 +76,30 @@ def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes
     except Exception as e:
         logging.error(f"Unexpected error creating access token: {e}")
         raise HTTPException(status_code=500, detail="Internal server error while generating access token.")
+
+def create_refresh_token(subject: str) -> str:
+    """Generates a long-lived refresh token, only accepted by the refresh endpoint."""
+    return create_access_token({"sub": subject}, timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS), token_type="refresh")
+
+def decode_access_token(token: str, token_type: str = "access") -> dict:
+    """
+    Verifies the signature, expiry and type of a token issued by create_access_token and returns its claims.
+    Revocation is checked separately against the revocation store.
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError as e:
+        logging.warning(f"⚠ Rejected {token_type} token: {e}")
+        raise HTTPException(status_code=401, detail="Invalid or expired token.", headers={"WWW-Authenticate": "Bearer"})
+    # Tokens issued before refresh tokens existed carry no type and count as access tokens
+    if not payload.get("sub") or payload.get("type", "access") != token_type:
+        raise HTTPException(status_code=401, detail="Invalid or expired token.", headers={"WWW-Authenticate": "Bearer"})
+    return payload
+
+def require_admin(x_admin_token: str = Header(default="")):
+    """Dependency guarding admin endpoints with the X-Admin-Token header."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled.")
+    if not hmac.compare_digest(x_admin_token.encode("utf-8"), settings.ADMIN_TOKEN.encode("utf-8")):
+        logging.warning("⚠ Rejected admin request with an invalid token.")
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
@@ -0,0 +1,43 @@
+"""
+Benchmarks for the API hot paths. Run them as modules from the repository root, e.g.
+
+    python -m benchmarks.loadtest --users 1000 --requests 5000 --concurrency 32
+    python -m benchmarks.bench_hashing
+    python -m benchmarks.bench_auth
+    python -m benchmarks.bench_credentials
+    python -m benchmarks.bench_statements
+    python -m benchmarks.bench_sharding --shards 0,1,2,4
+
+The application reads its settings at import time, so every benchmark calls
+`bootstrap()` before importing anything from apps/.
+"""
+import os
+import sys
+import tempfile
+
+APPS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "apps")
+
+
+def async_url_for(database_url: str) -> str:
+    """Maps a sync SQLAlchemy URL to its async-driver counterpart."""
+    scheme, rest = database_url.split("://", 1)
+    dialect = scheme.split("+")[0]
+    driver = {"sqlite": "aiosqlite", "mysql": "aiomysql"}[dialect]
+    return f"{dialect}+{driver}://{rest}"
+
+
+def bootstrap(database_url: str = None, **settings) -> str:
+    """
+    Points the application at `database_url` (a throwaway SQLite file by default),
+    applies any extra settings as environment variables and puts apps/ on sys.path.
+    Must run before any application module is imported. Returns the database URL.
+    """
+    if database_url is None:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_'), 'bench.db')}"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["ASYNC_DATABASE_URL"] = async_url_for(database_url)
+    for key, value in settings.items():
+        os.environ[key] = str(value)
+    if APPS_DIR not in sys.path:
+        sys.path.insert(0, APPS_DIR)
+    return database_url
@@ -0,0 +1,62 @@
+"""
+Microbenchmark of get_current_user with the verified-token cache warm and cold.
+
+Runs against a throwaway SQLite database, so no MySQL is needed.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_auth --requests 5000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks import bootstrap
+
+bootstrap()
+
+from datetime import timedelta  # noqa: E402
+from fastapi.security import HTTPAuthorizationCredentials  # noqa: E402
+import database  # noqa: E402
+import models  # noqa: E402
+from auth import get_current_user, verified_token_cache  # noqa: E402
+from utils import create_access_token  # noqa: E402
+
+
+def _seed() -> str:
+    models.initialize_database(database.engine)
+    db = database.SessionLocal()
+    role, profession = models.UserRole(role_name="bench"), models.UserProfession(profession_name="bench")
+    db.add_all([role, profession])
+    db.flush()
+    db.add(models.UserMaster(
+        username="bench", user_mail="bench@example.com", user_password="x", user_number="9000000000",
+        role_id=role.role_id, profession_id=profession.profession_id, country="IN", city="Bench",
+    ))
+    db.commit()
+    db.close()
+    return create_access_token({"sub": "bench@example.com"}, timedelta(minutes=30))
+
+
+async def _measure(credentials, requests: int, cold: bool) -> dict:
+    started = time.perf_counter()
+    for _ in range(requests):
+        if cold:
+            verified_token_cache.clear()
+        await get_current_user(credentials)
+    elapsed = time.perf_counter() - started
+    return {"requests_per_sec": round(requests / elapsed, 1), "mean_us": round(elapsed / requests * 1e6, 1)}
+
+
+async def main(args):
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=_seed())
+    results = {"cold": await _measure(credentials, args.requests, cold=True)}
+    await get_current_user(credentials)
+    results["warm"] = await _measure(credentials, args.requests, cold=False)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verified-token cache benchmark")
+    parser.add_argument("--requests", type=int, default=5000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,82 @@
+"""
+Repeat-login latency with the verified-credential cache off and on.
+
+One user logs in over and over with the same password, as a service client would,
+through crud.authenticate_user_async. The login record cache is warm in both runs, so
+the difference is the bcrypt check alone. Runs against a throwaway SQLite database.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_credentials --logins 20 --rounds 12
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from benchmarks import bootstrap
+
+bootstrap(HASH_EXECUTOR="thread", AUDIT_ENABLED="false", LOG_LEVEL="WARNING", LOGIN_CACHE_ENABLED="true", CREDENTIAL_CACHE_ENABLED="true")
+
+import bcrypt  # noqa: E402
+import database  # noqa: E402
+import models  # noqa: E402
+from crud import authenticate_user_async  # noqa: E402
+from hashing import hashing_executor  # noqa: E402
+from logincache import login_cache  # noqa: E402
+
+EMAIL, PASSWORD = "bench@example.com", "benchmark-password"
+
+
+def _seed(rounds: int):
+    models.initialize_database(database.engine)
+    db = database.SessionLocal()
+    role, profession = models.UserRole(role_name="bench"), models.UserProfession(profession_name="bench")
+    db.add_all([role, profession])
+    db.flush()
+    db.add(models.UserMaster(
+        username="bench", user_mail=EMAIL, user_password=bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds)).decode(),
+        user_number="9000000000", role_id=role.role_id, profession_id=profession.profession_id, country="IN", city="Bench",
+    ))
+    db.commit()
+    db.close()
+
+
+async def _measure(logins: int) -> dict:
+    samples = []
+    db = database.SessionLocal()
+    try:
+        for _ in range(logins):
+            started = time.perf_counter()
+            user = await authenticate_user_async(db, EMAIL, PASSWORD)
+            samples.append((time.perf_counter() - started) * 1000)
+            assert not isinstance(user, dict), user
+    finally:
+        db.close()
+    return {
+        "logins_per_sec": round(logins / (sum(samples) / 1000), 1),
+        "p50_ms": round(statistics.median(samples), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+async def main(args):
+    _seed(args.rounds)
+    hashing_executor.start()
+    try:
+        login_cache.credentials.enabled = False
+        results = {"rounds": args.rounds, "disabled": await _measure(args.logins)}
+        login_cache.credentials.enabled = True
+        await _measure(1)  # The first check still pays for bcrypt
+        results["enabled"] = await _measure(args.logins)
+    finally:
+        hashing_executor.shutdown()
+    results["speedup"] = round(results["enabled"]["logins_per_sec"] / results["disabled"]["logins_per_sec"], 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verified-credential cache benchmark")
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost of the stored hash.")
+    asyncio.run(main(parser.parse_args()))
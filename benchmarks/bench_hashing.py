@@ -0,0 +1,87 @@
+"""
+Compares login throughput with bcrypt on Starlette's request threadpool (before)
+against the dedicated hashing executor (after).
+
+While the logins run, a probe repeatedly schedules a trivial job on the request
+threadpool, standing in for any other sync endpoint; its latency shows how much
+the rest of the API stalls behind hashing.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_hashing --logins 200 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from benchmarks import bootstrap
+
+bootstrap()
+
+import bcrypt  # noqa: E402
+from starlette.concurrency import run_in_threadpool  # noqa: E402
+from hashing import HashingExecutor, _checkpw  # noqa: E402
+
+PASSWORD = b"benchmark-password"
+
+
+async def _probe(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await run_in_threadpool(lambda: None)
+        samples.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def _run(verify, logins: int, concurrency: int) -> dict:
+    hashed = bcrypt.hashpw(PASSWORD, bcrypt.gensalt())
+    semaphore = asyncio.Semaphore(concurrency)
+    stop, probe_samples = asyncio.Event(), []
+
+    async def one_login():
+        async with semaphore:
+            await verify(PASSWORD, hashed)
+
+    probe = asyncio.create_task(_probe(stop, probe_samples))
+    started = time.perf_counter()
+    await asyncio.gather(*(one_login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+
+    cores = os.cpu_count() or 1
+    probe_samples.sort()
+    return {
+        "logins_per_sec": round(logins / elapsed, 2),
+        "logins_per_sec_per_core": round(logins / elapsed / cores, 2),
+        "probe_p50_ms": round(statistics.median(probe_samples), 2) if probe_samples else None,
+        "probe_max_ms": round(probe_samples[-1], 2) if probe_samples else None,
+    }
+
+
+async def main(args):
+    results = {"cores": os.cpu_count(), "logins": args.logins, "concurrency": args.concurrency}
+
+    # Before: sync routes call bcrypt directly on the request threadpool
+    results["threadpool"] = await _run(lambda p, h: run_in_threadpool(_checkpw, p, h), args.logins, args.concurrency)
+
+    # After: bcrypt runs on the dedicated executor
+    for mode in ("thread", "process"):
+        executor = HashingExecutor(mode, args.workers, max_queue=args.logins)
+        executor.start()
+        try:
+            results[f"executor_{mode}"] = await _run(lambda p, h: executor.run(_checkpw, p, h), args.logins, args.concurrency)
+        finally:
+            executor.shutdown()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="bcrypt executor benchmark")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    asyncio.run(main(parser.parse_args()))
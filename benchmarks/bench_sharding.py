@@ -0,0 +1,187 @@
+"""
+Throughput of registrations, bulk registrations and email lookups by shard count.
+
+Each shard count gets fresh SQLite files: one primary (reference data) and one file per
+shard; "0" is the unsharded baseline. Like gunicorn workers, `--processes` processes
+drive the same files at once, and every phase starts on a barrier so the reported rate
+is the combined one. SQLite lets one writer at a time into a file, so the write numbers
+show how spreading users over files lifts that single-writer ceiling; on MySQL the same
+effect comes from separate primaries.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_sharding --shards 0,1,2,4 --processes 4 --users 2000
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from benchmarks import bootstrap
+
+
+def _configure(directory: str, shards: int):
+    """Points this process at the benchmark files. Must run before any application import."""
+    bootstrap(
+        f"sqlite:///{os.path.join(directory, 'primary.db')}",
+        SHARD_URLS=",".join(f"s{i}=sqlite:///{os.path.join(directory, f's{i}.db')}" for i in range(shards)),
+        DB_BACKEND="sync",
+        BCRYPT_ROUNDS=4,
+        HASH_EXECUTOR="thread",
+        AUDIT_ENABLED="false",
+        LOG_LEVEL="WARNING",
+    )
+
+
+def _setup(directory: str, shards: int):
+    _configure(directory, shards)
+    import database
+    import models
+    from sharding import shard_router
+
+    models.initialize_database(database.engine)
+    db = database.SessionLocal()
+    db.add_all([models.UserRole(role_name="bench"), models.UserProfession(profession_name="bench")])
+    db.commit()
+    db.close()
+    if shard_router.enabled:
+        from manage import init_shards
+        init_shards()
+
+
+def _user(number: int):
+    from schemas import UserRegistrationRequest
+    return UserRegistrationRequest(
+        username=f"bench{number}", email=f"bench{number}@example.com", password="benchpass123",
+        phone=f"9{number:09d}", role="bench", profession="bench", country="IN", city="Bench",
+    )
+
+
+async def _phase(barrier, jobs, concurrency: int) -> dict:
+    from database import open_session, close_session
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(job):
+        async with semaphore:
+            db = open_session()
+            try:
+                return await job(db)
+            except SQLAlchemyError as e:
+                # Lock timeouts are what the single-writer ceiling looks like under load: count them
+                return e
+            finally:
+                await close_session(db)
+
+    await asyncio.to_thread(barrier.wait)
+    started = time.time()
+    results = await asyncio.gather(*(run(job) for job in jobs))
+    return {"started": started, "finished": time.time(), "results": results}
+
+
+async def _measure(args, index: int, barrier) -> dict:
+    import database
+    from refcache import reference_cache
+    from crud import create_user_async, bulk_create_users_async, read_user_by_email, get_user_by_email
+    from hashing import hashing_executor
+    from bloom import identity_filter
+
+    db = database.SessionLocal()
+    reference_cache.load(db)
+    db.close()
+    hashing_executor.start()
+    identity_filter.rebuild()  # Empty database: every registration is a certain negative
+    try:
+        first = index * args.users
+        register = await _phase(barrier, [lambda db, n=n: create_user_async(db, _user(n)) for n in range(first, first + args.users)], args.concurrency)
+        register["failed"] = sum(1 for result in register.pop("results") if isinstance(result, Exception) or "error" in result)
+        register["operations"] = args.users
+
+        first = (args.processes + index) * args.users
+        batches = [
+            [(i, _user(n)) for i, n in enumerate(range(start, min(start + args.batch, first + args.users)))]
+            for start in range(first, first + args.users, args.batch)
+        ]
+        bulk = await _phase(barrier, [lambda db, batch=batch: bulk_create_users_async(db, batch) for batch in batches], args.concurrency)
+        bulk["failed"] = sum(
+            len(batch) if isinstance(results, Exception) else sum(1 for result in results if "error" in result)
+            for batch, results in zip(batches, bulk.pop("results"))
+        )
+        bulk["operations"] = args.users
+
+        registered = 2 * args.processes * args.users
+        lookup = await _phase(barrier, [
+            lambda db, n=n: read_user_by_email(db, get_user_by_email, f"bench{(n * 7919) % registered}@example.com")
+            for n in range(index * args.lookups, (index + 1) * args.lookups)
+        ], args.concurrency)
+        lookup["failed"] = sum(1 for result in lookup.pop("results") if result is None or isinstance(result, Exception))
+        lookup["operations"] = args.lookups
+    finally:
+        hashing_executor.shutdown()
+    return {"register": register, "bulk_register": bulk, "lookup": lookup}
+
+
+def _worker(directory: str, shards: int, index: int, args, barrier, queue):
+    _configure(directory, shards)
+    try:
+        queue.put(asyncio.run(_measure(args, index, barrier)))
+    except BaseException as e:
+        # Release the other processes and the parent instead of leaving them waiting
+        barrier.abort()
+        queue.put({"error": repr(e)})
+        raise
+
+
+def _run(shards: int, args) -> dict:
+    context = multiprocessing.get_context("spawn")
+    directory = tempfile.mkdtemp(prefix="bench_shards_")
+    setup = context.Process(target=_setup, args=(directory, shards))
+    setup.start()
+    setup.join()
+
+    barrier, queue = context.Barrier(args.processes), context.Queue()
+    workers = [context.Process(target=_worker, args=(directory, shards, index, args, barrier, queue)) for index in range(args.processes)]
+    for worker in workers:
+        worker.start()
+    reports = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    errors = [report["error"] for report in reports if "error" in report]
+    if errors:
+        raise RuntimeError(f"{shards} shard(s): a benchmark process failed: {errors[0]}")
+
+    # Combined rate per phase: all operations over the span from the first start to the last finish
+    row = {"shards": shards}
+    for phase in ("register", "bulk_register", "lookup"):
+        parts = [report[phase] for report in reports]
+        elapsed = max(part["finished"] for part in parts) - min(part["started"] for part in parts)
+        operations = sum(part["operations"] for part in parts)
+        row[phase] = {
+            "ops_per_sec": round(operations / elapsed, 1),
+            "seconds": round(elapsed, 2),
+            "failed": sum(part["failed"] for part in parts),
+        }
+    return row
+
+
+def main(args):
+    report = [_run(int(count), args) for count in args.shards.split(",")]
+    # Throughput relative to the first configuration listed
+    for row in report:
+        for phase in ("register", "bulk_register", "lookup"):
+            row[phase]["speedup"] = round(row[phase]["ops_per_sec"] / report[0][phase]["ops_per_sec"], 2)
+    print(json.dumps({"cores": os.cpu_count(), "config": vars(args), "results": report}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded storage throughput by shard count")
+    parser.add_argument("--shards", default="0,1,2,4", help="Shard counts to compare; 0 is the unsharded baseline.")
+    parser.add_argument("--processes", type=int, default=4, help="Worker processes sharing the databases.")
+    parser.add_argument("--users", type=int, default=500, help="Users each process registers one by one, and again in bulk batches.")
+    parser.add_argument("--batch", type=int, default=50, help="Users per bulk registration.")
+    parser.add_argument("--lookups", type=int, default=2000, help="Email lookups per process after the registrations.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent operations per process.")
+    main(parser.parse_args())
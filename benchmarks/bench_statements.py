@@ -0,0 +1,109 @@
+"""
+Per-call cost of the hot crud lookups when each call builds its statement, as crud used
+to, and with the statements crud now builds once at import.
+
+"before" builds the statement on every call (legacy Query objects, two SELECTs for the
+identity check), so SQLAlchemy constructs it and derives its cache key each time before
+it can find the compiled SQL; "after" calls the crud functions, which execute prebuilt
+statements with bind parameters. SQL statements per call come from
+sqlprofile.profiled(). Runs against a throwaway SQLite database, so the query itself is
+cheap and the difference is mostly Python-side overhead.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_statements --calls 2000 --rounds 5
+"""
+import argparse
+import json
+import time
+
+from benchmarks import bootstrap
+
+bootstrap(AUDIT_ENABLED="false", LOG_LEVEL="WARNING")
+
+from sqlalchemy import or_, select  # noqa: E402
+import database  # noqa: E402
+import models  # noqa: E402
+from models import UserMaster, UserRegistration  # noqa: E402
+from crud import get_user_by_email, get_login_record, taken_identities  # noqa: E402
+from sqlprofile import profiled  # noqa: E402
+
+EMAIL, PHONE = "bench@example.com", "9000000000"
+
+
+def _seed():
+    models.initialize_database(database.engine)
+    db = database.SessionLocal()
+    role, profession = models.UserRole(role_name="bench"), models.UserProfession(profession_name="bench")
+    db.add_all([role, profession])
+    db.flush()
+    row = dict(username="bench", user_mail=EMAIL, user_password="x", user_number=PHONE,
+               role_id=role.role_id, profession_id=profession.profession_id, country="IN", city="Bench")
+    db.add_all([UserRegistration(**row), UserMaster(**row)])
+    db.commit()
+    db.close()
+
+
+def _legacy_get_user_by_email(db, email):
+    return db.query(UserMaster).filter_by(user_mail=email, deregister_date=None).first()
+
+
+def _legacy_get_login_record(db, email):
+    row = db.execute(
+        select(UserMaster.id, UserMaster.user_mail, UserMaster.user_password, UserMaster.user_number, UserMaster.role_id)
+        .where(UserMaster.user_mail == email, UserMaster.deregister_date.is_(None))
+        .limit(1)
+    ).first()
+    db.rollback()
+    return row
+
+
+def _legacy_taken_identities(db, mails, phones):
+    taken = set()
+    for model in (UserRegistration, UserMaster):
+        for mail, number in db.query(model.user_mail, model.user_number).filter(
+            or_(model.user_mail.in_(mails), model.user_number.in_(phones))
+        ):
+            taken.update((mail, number))
+    return taken
+
+
+CASES = {
+    "get_user_by_email": (_legacy_get_user_by_email, get_user_by_email, (EMAIL,)),
+    "get_login_record": (_legacy_get_login_record, get_login_record, (EMAIL,)),
+    "taken_identities": (_legacy_taken_identities, taken_identities, ([EMAIL], [PHONE])),
+}
+
+
+def _measure(fn, args, calls: int) -> dict:
+    db = database.SessionLocal()
+    try:
+        with profiled() as profile:
+            started = time.perf_counter()
+            for _ in range(calls):
+                fn(db, *args)
+                db.expunge_all()
+            elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+    return {"us_per_call": round(elapsed / calls * 1e6, 1), "statements_per_call": round(profile.statements / calls, 2)}
+
+
+def main(args):
+    _seed()
+    results = {}
+    for name, (before, after, call_args) in CASES.items():
+        _measure(before, call_args, 10), _measure(after, call_args, 10)  # Warm the statement caches
+        runs = {"before": [], "after": []}
+        for _ in range(args.rounds):  # Interleaved, best round kept, to keep noise from other processes out
+            runs["before"].append(_measure(before, call_args, args.calls))
+            runs["after"].append(_measure(after, call_args, args.calls))
+        results[name] = {label: min(samples, key=lambda run: run["us_per_call"]) for label, samples in runs.items()}
+        results[name]["speedup"] = round(results[name]["before"]["us_per_call"] / results[name]["after"]["us_per_call"], 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prebuilt statement benchmark for the hot crud lookups")
+    parser.add_argument("--calls", type=int, default=2000, help="Calls per round.")
+    parser.add_argument("--rounds", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,47 @@
+"""
+The application reads its settings at import time, so the environment is set up here,
+before any test module imports from apps/: a throwaway SQLite database, the sync
+backend, a thread hashing executor and the cheapest bcrypt cost.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+APPS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "apps")
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix="tests_"), "test.db")
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{DATABASE_PATH}",
+    "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{DATABASE_PATH}",
+    "DB_BACKEND": "sync",
+    "SHARD_URLS": "",
+    "REPLICA_URLS": "",
+    "HASH_EXECUTOR": "thread",
+    "BCRYPT_ROUNDS": "4",
+    "LOG_LEVEL": "WARNING",
+})
+if APPS_DIR not in sys.path:
+    sys.path.insert(0, APPS_DIR)
+
+
+@pytest.fixture
+def db():
+    """A session on a freshly created schema holding one role ("admin") and one profession ("dev")."""
+    import database
+    import models
+    from logincache import login_cache
+    from refcache import reference_cache
+
+    models.Base.metadata.drop_all(database.engine)
+    login_cache._cache.clear()  # Records cached by earlier tests name users of the dropped schema
+    models.initialize_database(database.engine)
+    session = database.SessionLocal()
+    session.add_all([models.UserRole(role_name="admin"), models.UserProfession(profession_name="dev")])
+    session.commit()
+    reference_cache.load(session)
+    try:
+        yield session
+    finally:
+        session.close()
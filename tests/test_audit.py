@@ -0,0 +1,150 @@
+import time
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import delete
+
+import crud
+import audit as audit_module
+from audit import AuditPipeline
+from models import RegistrationLog, UserEvent
+from schemas import UserRegistrationRequest
+
+
+@pytest.fixture
+def pipeline(db):
+    pipelines = []
+
+    def make(max_queue=100, overflow="block", block_timeout=0.05):
+        pipeline = AuditPipeline(True, max_queue, 10, 0.01, overflow, block_timeout)
+        pipelines.append(pipeline)
+        return pipeline
+
+    yield make
+    for pipeline in pipelines:
+        pipeline.shutdown()
+
+
+def _logged_mails(db):
+    db.expire_all()
+    return sorted(mail for (mail,) in db.query(RegistrationLog.user_mail))
+
+
+def _events(db):
+    return sorted((event.event_type, event.user_mail) for event in db.query(UserEvent))
+
+
+def test_events_are_written_in_batches(db, pipeline):
+    audit = pipeline()
+    audit.start()
+    audit.registered("alice", "a@example.com", 1)
+    audit.login("a@example.com", 1, success=True)
+    audit.login("a@example.com", 1, success=False)
+    audit.shutdown()
+    assert _logged_mails(db) == ["a@example.com"]
+    assert _events(db) == [("login_failure", "a@example.com"), ("login_success", "a@example.com")]
+    assert audit.stats()["written"] == 3
+
+
+def test_registration_queued_before_a_deletion_is_discarded(db, pipeline):
+    audit = pipeline()
+    audit.registered("alice", "a@example.com", 1)
+    audit.erasing(["a@example.com"])
+    audit.deleted(["a@example.com"])
+    audit.registered("alice", "a@example.com", 1)  # Re-registration after the deletion
+    audit.registered("bob", "b@example.com", 1)
+    audit.start()
+    audit.shutdown()
+    assert _logged_mails(db) == ["a@example.com", "b@example.com"]
+    assert ("deleted", "a@example.com") in _events(db)
+
+
+def test_deletion_discards_queued_registrations_even_when_its_event_is_dropped(db, pipeline):
+    audit = pipeline(max_queue=1, overflow="drop")
+    audit.registered("alice", "a@example.com", 1)
+    audit.erasing(["a@example.com"])
+    audit.deleted(["a@example.com"])
+    assert audit.stats()["dropped"] == 1
+    audit.start()
+    audit.shutdown()
+    assert _logged_mails(db) == []
+
+
+def test_deletion_during_a_batch_write_sees_the_batch(db, pipeline, monkeypatch):
+    audit = pipeline()
+    writing = threading.Event()
+    session_factory = audit_module.SessionLocal
+
+    def slow_session():
+        session = session_factory()
+        execute = session.execute
+
+        def slow_execute(*args, **kwargs):
+            writing.set()
+            time.sleep(0.2)
+            return execute(*args, **kwargs)
+
+        session.execute = slow_execute
+        return session
+
+    monkeypatch.setattr(audit_module, "SessionLocal", slow_session)
+    writer = threading.Thread(target=audit._flush, args=([(0, "registration", {
+        "username": "alice", "user_mail": "a@example.com", "role_id": 1, "log_date": None})],))
+    writer.start()
+    writing.wait()
+    # What the deleting transaction does: mark the erasure, then delete the rows
+    audit.erasing(["a@example.com"])
+    db.execute(delete(RegistrationLog).where(RegistrationLog.user_mail == "a@example.com"))
+    db.commit()
+    writer.join()
+    assert _logged_mails(db) == []
+
+
+def test_erasures_are_forgotten_once_the_writer_is_past_them(db, pipeline):
+    audit = pipeline()
+    audit.registered("alice", "a@example.com", 1)
+    audit.erasing(["a@example.com"])
+    audit.registered("bob", "b@example.com", 1)
+    assert audit._erased
+    audit.start()
+    audit.shutdown()
+    assert audit._erased == {}
+    assert _logged_mails(db) == ["b@example.com"]
+
+
+def test_full_queue_never_blocks_the_event_loop(db, pipeline):
+    audit = pipeline(max_queue=1, block_timeout=1.0)
+    audit.registered("alice", "a@example.com", 1)
+
+    async def submit_on_loop():
+        started = time.perf_counter()
+        audit.registered("bob", "b@example.com", 1)
+        return time.perf_counter() - started
+
+    assert asyncio.run(submit_on_loop()) < 0.5
+    assert audit.stats()["dropped"] == 1
+
+
+def test_full_queue_applies_backpressure_off_the_loop(db, pipeline):
+    audit = pipeline(max_queue=1, block_timeout=0.1)
+    audit.registered("alice", "a@example.com", 1)
+    started = time.perf_counter()
+    audit.registered("bob", "b@example.com", 1)
+    assert time.perf_counter() - started >= 0.1
+    assert audit.stats()["backpressure"] == 1
+    assert audit.stats()["dropped"] == 1
+
+
+def test_deleting_a_user_removes_their_registration_log_in_the_same_transaction(db, monkeypatch):
+    # The module pipeline is enabled but never started: nothing it queues is written
+    monkeypatch.setattr(crud.audit_pipeline, "enabled", True)
+    monkeypatch.setattr(crud.settings, "SOFT_DELETE", False)
+    user = UserRegistrationRequest(username="alice", email="a@example.com", password="secret123",
+                                   phone="9876543210", role="admin", profession="dev", country="IN", city="Pune")
+    assert "success" in crud.create_user(db, user)
+    db.add(RegistrationLog(username="alice", user_mail="a@example.com", role_id=1))
+    db.commit()
+
+    assert "success" in crud.delete_user_by_phone(db, "9876543210")
+    assert _logged_mails(db) == []
@@ -0,0 +1,56 @@
+import asyncio
+
+import models
+from bloom import BloomFilter, IdentityFilter
+
+KEYS = [f"user{i}@example.com" for i in range(5000)]
+
+
+def test_added_keys_are_never_reported_missing():
+    bloom = BloomFilter(len(KEYS), 0.01)
+    for key in KEYS:
+        bloom.add(key)
+    assert all(key in bloom for key in KEYS)
+
+
+def test_false_positive_rate_stays_near_the_target():
+    bloom = BloomFilter(len(KEYS), 0.01)
+    for key in KEYS:
+        bloom.add(key)
+    false_positives = sum(f"other{i}@example.com" in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.02
+
+
+def test_every_identity_is_a_probable_hit_until_the_first_build():
+    identities = IdentityFilter(100, 0.01, 3600)
+    assert identities.might_contain_email("a@example.com")
+    assert identities.stats()["ready"] is False
+
+
+def test_rebuild_loads_registered_users_and_answers_negatives_exactly(db):
+    db.add(models.UserMaster(username="alice", user_mail="a@example.com", user_password="x", user_number="9876543210",
+                             role_id=1, profession_id=1, country="IN", city="Pune"))
+    db.commit()
+    identities = IdentityFilter(100, 0.01, 3600)
+    identities.rebuild()
+    assert identities.might_contain_email("a@example.com")
+    assert identities.might_contain_phone("9876543210")
+    assert not identities.might_contain_email("b@example.com")
+    assert identities.stats()["negatives"] == 1
+    # Registrations made after the build are seen at once
+    identities.add("b@example.com", "9876543211")
+    assert identities.might_contain_email("b@example.com")
+
+
+def test_availability_answers_bloom_negatives_without_the_database(db, monkeypatch):
+    import routes
+
+    async def taken_identities_async(*args, **kwargs):
+        raise AssertionError("negatives must not reach the database")
+
+    identities = IdentityFilter(100, 0.01, 3600)
+    identities.rebuild()
+    monkeypatch.setattr(routes, "identity_filter", identities)
+    monkeypatch.setattr(routes, "taken_identities_async", taken_identities_async)
+    result = asyncio.run(routes.check_availability(email="new@example.com", phone="9876543219"))
+    assert result == {"email_available": True, "phone_available": True}
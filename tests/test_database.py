@@ -0,0 +1,39 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import database
+
+
+class SlowEngine:
+    """Wraps the test engine so every new connection takes `delay` seconds, failing after `fail_after` of them."""
+
+    def __init__(self, delay, fail_after=None):
+        self.delay = delay
+        self.fail_after = fail_after
+        self.opened = 0
+        self.engine = database.engine
+
+    def connect(self):
+        time.sleep(self.delay)
+        self.opened += 1
+        if self.fail_after is not None and self.opened > self.fail_after:
+            raise OperationalError("SELECT 1", {}, Exception("connection refused"))
+        return self.engine.connect()
+
+
+def test_warm_pool_opens_connections_concurrently_and_returns_them(monkeypatch):
+    monkeypatch.setattr(database, "engine", SlowEngine(0.2))
+    started = time.perf_counter()
+    assert asyncio.run(database.warm_pool(4)) == 4
+    assert time.perf_counter() - started < 0.6
+    assert database.active_engine.pool.checkedout() == 0
+
+
+def test_warm_pool_failure_still_returns_every_opened_connection(monkeypatch):
+    monkeypatch.setattr(database, "engine", SlowEngine(0.05, fail_after=2))
+    with pytest.raises(OperationalError):
+        asyncio.run(database.warm_pool(4))
+    assert database.active_engine.pool.checkedout() == 0
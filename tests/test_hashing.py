@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+import crud
+import hashing
+from hashing import HashingExecutor
+from schemas import UserRegistrationRequest
+
+
+def test_full_executor_rejects_with_503():
+    executor = HashingExecutor("thread", 1, 1)
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.create_task(executor.run(release.wait))
+        queued = asyncio.create_task(executor.run(release.wait))
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as raised:
+            await executor.run(release.wait)
+        release.set()
+        await asyncio.gather(running, queued)
+        return raised.value
+
+    rejection = asyncio.run(scenario())
+    executor.shutdown()
+    assert rejection.status_code == 503
+    assert rejection.headers["Retry-After"] == "1"
+    assert executor.stats()["rejected"] == 1
+    assert executor.stats()["pending"] == 0
+    assert executor.stats()["completed"] == 2
+
+
+def test_hashing_passes_the_rejection_through(monkeypatch):
+    saturated = HashingExecutor("thread", 1, 0)
+    saturated._pending = 1
+    monkeypatch.setattr(hashing, "hashing_executor", saturated)
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(hashing.hash_password_async("secret123"))
+    assert raised.value.status_code == 503
+
+
+def test_hash_and_verify_round_trip():
+    hashed = asyncio.run(hashing.hash_password_async("secret123"))
+    assert asyncio.run(hashing.verify_password_async("secret123", hashed))
+    assert not asyncio.run(hashing.verify_password_async("wrong-password", hashed))
+
+
+def test_bulk_import_leaves_half_the_hashing_workers_to_logins(db, monkeypatch):
+    active, peak = 0, 0
+
+    async def hash_password_async(password):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return "hashed"
+
+    monkeypatch.setattr(crud, "hash_password_async", hash_password_async)
+    monkeypatch.setattr(crud.hashing_executor, "max_workers", 4)
+    users = [(i, UserRegistrationRequest(username=f"user{i}", email=f"user{i}@example.com", password="secret123",
+                                         phone=f"98765432{i:02d}", role="admin", profession="dev", country="IN", city="Pune"))
+             for i in range(12)]
+    results = asyncio.run(crud.bulk_create_users_async(db, users))
+    assert all("success" in result for result in results)
+    assert peak == 2
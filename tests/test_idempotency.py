@@ -0,0 +1,195 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException, Response
+
+from idempotency import IdempotencyManager, MemoryIdempotencyStore
+
+
+@pytest.fixture
+def manager():
+    return IdempotencyManager(MemoryIdempotencyStore(100, 60))
+
+
+class Handler:
+    """Counts its calls and returns (or raises) what it is given."""
+
+    def __init__(self, result=None, error=None, gate=None):
+        self.calls = 0
+        self.result = result or {"message": "done"}
+        self.error = error
+        self.gate = gate
+
+    async def __call__(self):
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def run(manager, handler, key="k1", payload=None, scope="register", response=None):
+    return manager.run(scope, key, payload or {"email": "a@example.com"}, handler, response or Response())
+
+
+def test_without_key_the_handler_always_runs(manager):
+    handler = Handler()
+    asyncio.run(run(manager, handler, key=None))
+    asyncio.run(run(manager, handler, key=None))
+    assert handler.calls == 2
+
+
+def test_repeated_key_replays_the_first_response(manager):
+    handler = Handler()
+    first = asyncio.run(run(manager, handler))
+    response = Response()
+    second = asyncio.run(run(manager, handler, response=response))
+    assert second == first
+    assert handler.calls == 1
+    assert response.headers["Idempotent-Replayed"] == "true"
+    assert manager.stats()["replayed"] == 1
+
+
+def test_keys_are_scoped(manager):
+    handler = Handler()
+    asyncio.run(run(manager, handler, scope="delete:a@example.com"))
+    asyncio.run(run(manager, handler, scope="delete:b@example.com"))
+    assert handler.calls == 2
+
+
+def test_key_reused_with_another_payload_is_rejected(manager):
+    asyncio.run(run(manager, Handler()))
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(run(manager, Handler(), payload={"email": "b@example.com"}))
+    assert raised.value.status_code == 422
+    assert manager.stats()["mismatched"] == 1
+
+
+def test_client_errors_are_stored_and_replayed(manager):
+    handler = Handler(error=HTTPException(status_code=409, detail="User already exists."))
+    for _ in range(2):
+        with pytest.raises(HTTPException) as raised:
+            asyncio.run(run(manager, handler))
+        assert raised.value.status_code == 409
+    assert handler.calls == 1
+    assert raised.value.headers["Idempotent-Replayed"] == "true"
+
+
+@pytest.mark.parametrize("status_code", [500, 503, 401, 429])
+def test_server_errors_throttling_and_auth_failures_are_not_stored(manager, status_code):
+    failing = Handler(error=HTTPException(status_code=status_code, detail="try again"))
+    with pytest.raises(HTTPException):
+        asyncio.run(run(manager, failing))
+    succeeding = Handler()
+    assert asyncio.run(run(manager, succeeding)) == succeeding.result
+    assert succeeding.calls == 1
+
+
+def test_concurrent_requests_with_one_key_run_the_handler_once(manager):
+    async def scenario():
+        gate = asyncio.Event()
+        handler = Handler(gate=gate)
+        first = asyncio.create_task(run(manager, handler))
+        second = asyncio.create_task(run(manager, handler))
+        await asyncio.sleep(0.01)
+        assert manager.stats()["in_flight"] == 1
+        gate.set()
+        return handler, await first, await second
+
+    handler, first, second = asyncio.run(scenario())
+    assert first == second == handler.result
+    assert handler.calls == 1
+    assert manager.stats()["coalesced"] == 1
+    assert manager.stats()["in_flight"] == 0
+
+
+def test_waiter_runs_the_handler_itself_when_the_first_attempt_failed(manager):
+    async def scenario():
+        gate = asyncio.Event()
+        failing = Handler(error=HTTPException(status_code=500, detail="boom"), gate=gate)
+        succeeding = Handler()
+        first = asyncio.create_task(run(manager, failing))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(run(manager, succeeding))
+        await asyncio.sleep(0.01)
+        gate.set()
+        with pytest.raises(HTTPException):
+            await first
+        return succeeding, await second
+
+    succeeding, second = asyncio.run(scenario())
+    assert second == succeeding.result
+    assert succeeding.calls == 1
+
+
+@pytest.mark.parametrize("error, status_code", [
+    ("Invalid role or profession.", 400),
+    ("User already exists or invalid foreign key reference.", 409),
+    ("Database error occurred.", 500),
+    ("Unexpected error occurred.", 500),
+])
+def test_registration_failures_are_raised_not_returned(manager, monkeypatch, error, status_code):
+    import routes
+
+    async def create_user_async(db, user_data):
+        return {"error": error}
+
+    monkeypatch.setattr(routes, "create_user_async", create_user_async)
+    for _ in range(2):
+        with pytest.raises(HTTPException) as raised:
+            asyncio.run(run(manager, lambda: routes._register_user(None, None)))
+        assert raised.value.status_code == status_code
+    # Client errors are final and replayed; server errors run again on retry
+    assert manager.stats()["executed"] == (1 if status_code < 500 else 2)
+
+
+def _user(email="a@example.com", phone="9876543210"):
+    from schemas import UserRegistrationRequest
+
+    return UserRegistrationRequest(username="alice", email=email, password="secret123", phone=phone,
+                                   role="admin", profession="dev", country="IN", city="Pune")
+
+
+def test_register_keys_are_scoped_by_body(db, manager, monkeypatch):
+    import routes
+
+    monkeypatch.setattr(routes, "idempotency_manager", manager)
+    first = asyncio.run(routes.register_user(_user(), Response(), db, "shared-key"))
+    # Another client picking the same key for its own registration is not answered with the first response
+    other = asyncio.run(routes.register_user(_user("b@example.com", "9876543211"), Response(), db, "shared-key"))
+    assert first["user_id"] != other["user_id"]
+    response = Response()
+    assert asyncio.run(routes.register_user(_user(), response, db, "shared-key")) == first
+    assert response.headers["Idempotent-Replayed"] == "true"
+    assert manager.stats()["executed"] == 2
+
+
+def test_delete_retry_replays_without_reading_the_database(db, manager, monkeypatch):
+    import auth
+    import crud
+    import routes
+    from fastapi.security import HTTPAuthorizationCredentials
+    from schemas import UserDeleteRequest
+    from utils import create_access_token
+
+    monkeypatch.setattr(routes, "idempotency_manager", manager)
+    assert "success" in crud.create_user(db, _user())
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=create_access_token({"sub": "a@example.com"}))
+    request = UserDeleteRequest(phone="9876543210")
+    first = asyncio.run(routes.delete_user(request, Response(), db, credentials, "delete-key"))
+    assert first == {"message": "User deleted successfully!"}
+
+    async def read_user_by_email(*args):
+        raise AssertionError("a replay must not read the database")
+
+    monkeypatch.setattr(auth, "read_user_by_email", read_user_by_email)
+    auth.verified_token_cache.clear()
+    response = Response()
+    assert asyncio.run(routes.delete_user(request, response, db, credentials, "delete-key")) == first
+    assert response.headers["Idempotent-Replayed"] == "true"
+    # Without the key the revoked token is rejected as usual
+    monkeypatch.undo()
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(routes.delete_user(request, Response(), db, credentials, None))
+    assert raised.value.status_code == 401
@@ -0,0 +1,72 @@
+import crud
+from logincache import InvalidationChannel, LoginCache, LoginRecord, login_cache
+from schemas import UserRegistrationRequest
+
+RECORD = LoginRecord(1, "a@example.com", "hash", "9876543210", 1)
+
+
+class RecordingChannel(InvalidationChannel):
+    def __init__(self):
+        self.published = []
+
+    def publish(self, keys: list):
+        self.published.extend(keys)
+
+
+def _register(db):
+    user = UserRegistrationRequest(username="alice", email="a@example.com", password="secret123",
+                                   phone="9876543210", role="admin", profession="dev", country="IN", city="Pune")
+    assert "success" in crud.create_user(db, user)
+
+
+def test_records_are_keyed_by_the_normalized_email():
+    cache = LoginCache(True, 10, 60)
+    cache.put(RECORD)
+    assert cache.get(" A@Example.com ") == RECORD
+    assert LoginCache(False, 10, 60).get("a@example.com") is None
+
+
+def test_records_read_before_an_invalidation_are_not_cached():
+    cache = LoginCache(True, 10, 60)
+    generation = cache.generation()
+    cache.invalidate("a@example.com")  # E.g. a deletion committed while the record was being read
+    cache.put(RECORD, generation)
+    assert cache.get("a@example.com") is None
+    cache.put(RECORD, cache.generation())
+    assert cache.get("a@example.com") == RECORD
+
+
+def test_invalidations_reach_other_workers_as_hashed_keys():
+    channel = RecordingChannel()
+    sender, receiver = LoginCache(True, 10, 60, channel), LoginCache(True, 10, 60)
+    receiver.put(RECORD)
+    sender.invalidate("a@example.com")
+    assert channel.published and "a@example.com" not in channel.published[0]
+    receiver._on_remote_invalidation(channel.published)
+    assert receiver.get("a@example.com") is None
+    assert receiver.stats()["remote_invalidations"] == 1
+
+
+def test_login_cache_is_enabled_and_written_through_on_registration(db):
+    assert login_cache.enabled
+    _register(db)
+    assert login_cache.get("a@example.com").user_number == "9876543210"
+    assert crud.authenticate_user(db, "a@example.com", "secret123").user_mail == "a@example.com"
+
+
+def test_deleting_a_user_drops_their_cached_record(db):
+    _register(db)
+    assert not isinstance(crud.authenticate_user(db, "a@example.com", "secret123"), dict)
+    assert "success" in crud.delete_user_by_phone(db, "9876543210")
+    assert login_cache.get("a@example.com") is None
+    assert "error" in crud.authenticate_user(db, "a@example.com", "secret123")
+
+
+def test_rehashing_a_password_drops_the_cached_record(db):
+    _register(db)
+    record = crud.authenticate_user(db, "a@example.com", "secret123")
+    assert login_cache.get("a@example.com") == record
+    crud._rehash_password_sync(db, "a@example.com", record.id, record.user_password, "secret123")
+    assert login_cache.get("a@example.com") is None
+    refreshed = crud.authenticate_user(db, "a@example.com", "secret123")
+    assert refreshed.user_password != record.user_password
@@ -0,0 +1,56 @@
+import threading
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+import metrics
+from database import engine_options
+from metrics import db_pool_checkout_wait_seconds, timed_pool
+
+
+def _observed():
+    _, total, count = db_pool_checkout_wait_seconds._series.get((), [None, 0.0, 0])
+    return total, count
+
+
+def test_checkout_waits_on_an_exhausted_pool_are_timed(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=timed_pool(QueuePool),
+                           pool_size=1, max_overflow=0, pool_timeout=5)
+    total_before, count_before = _observed()
+    held = engine.connect()
+    threading.Timer(0.2, held.close).start()
+    with engine.connect() as connection:  # Waits until the held connection is returned
+        connection.execute(text("SELECT 1"))
+    total, count = _observed()
+    engine.dispose()
+    assert count - count_before == 2
+    assert total - total_before >= 0.2
+
+
+def test_mysql_engines_use_the_timed_pools():
+    assert issubclass(engine_options("mysql+pymysql://u:p@db/app")["poolclass"], QueuePool)
+    assert issubclass(engine_options("mysql+aiomysql://u:p@db/app", asynchronous=True)["poolclass"], AsyncAdaptedQueuePool)
+    assert timed_pool(QueuePool) is engine_options("mysql+pymysql://u:p@db/app")["poolclass"]
+    assert "poolclass" not in engine_options("sqlite:///app.db")
+
+
+def test_instrumented_pool_counts_checkouts(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics.registry, "register", lambda metric: metric)
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    metrics.instrument_pool(engine)
+    before = metrics.db_pool_checkouts_total._values.get((), 0)
+    for _ in range(3):
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    engine.dispose()
+    assert metrics.db_pool_checkouts_total._values.get((), 0) - before == 3
+
+
+def test_load_shedder_measures_against_the_configured_pool_capacity(monkeypatch):
+    import loadshed
+
+    monkeypatch.setattr(loadshed, "engine_options", lambda url: {"pool_size": 4, "max_overflow": 6})
+    monkeypatch.setattr(loadshed.load_shedder, "middleware", None)
+    shedder = loadshed.LoadShedMiddleware(None, 100, 1.0, 0.9, 0)
+    monkeypatch.setattr(shedder, "pool", type("Pool", (), {"size": lambda self: 4, "checkedout": lambda self: 5})())
+    assert shedder._db_pool_utilization() == 0.5
@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+import crud
+import models
+from purge import PurgeWorker, parse_window
+from schemas import UserRegistrationRequest
+
+
+def _register(db, email, phone):
+    user = UserRegistrationRequest(username="alice", email=email, password="secret123",
+                                   phone=phone, role="admin", profession="dev", country="IN", city="Pune")
+    assert "success" in crud.create_user(db, user)
+    db.add(models.RegistrationLog(username="alice", user_mail=email, role_id=1))
+    db.commit()
+
+
+def _mails(db, model):
+    return sorted(db.scalars(select(model.user_mail)))
+
+
+def test_delete_is_soft_by_default(db):
+    _register(db, "a@example.com", "9876543210")
+    assert crud.settings.SOFT_DELETE
+    assert "success" in crud.delete_user_by_phone(db, "9876543210")
+    deregistered = db.scalar(select(models.UserMaster.deregister_date))
+    assert deregistered is not None
+    assert _mails(db, models.RegistrationLog) == ["a@example.com"]
+    # The user is gone for every read path, and cannot be deleted twice
+    assert crud.get_user_by_email(db, "a@example.com") is None
+    assert "error" in crud.authenticate_user(db, "a@example.com", "secret123")
+    assert "error" in crud.delete_user_by_phone(db, "9876543210")
+
+
+def test_bulk_delete_erases_at_once_including_soft_deleted_users(db):
+    _register(db, "a@example.com", "9876543210")
+    _register(db, "b@example.com", "9876543211")
+    crud.delete_user_by_phone(db, "9876543210")
+    result = crud.bulk_delete_users_by_phone(db, ["9876543210", "9876543211", "9876543219"])
+    assert result == {"deleted": 2, "not_found": ["9876543219"], "failed": []}
+    assert _mails(db, models.UserMaster) == []
+    assert _mails(db, models.UserRegistration) == []
+    assert _mails(db, models.RegistrationLog) == []
+
+
+def test_purge_erases_only_users_deregistered_before_the_cutoff(db):
+    _register(db, "a@example.com", "9876543210")
+    _register(db, "b@example.com", "9876543211")
+    _register(db, "c@example.com", "9876543212")
+    crud.delete_user_by_phone(db, "9876543210")
+    crud.delete_user_by_phone(db, "9876543211")
+    db.execute(models.UserMaster.__table__.update().where(models.UserMaster.user_mail == "a@example.com")
+               .values(deregister_date=datetime.now() - timedelta(days=2)))
+    db.commit()
+
+    assert crud.purge_deregistered_users(db, datetime.now() - timedelta(days=1), 10) == {"9876543210": "a@example.com"}
+    assert _mails(db, models.UserMaster) == ["b@example.com", "c@example.com"]
+    assert _mails(db, models.RegistrationLog) == ["b@example.com", "c@example.com"]
+    assert crud.purge_deregistered_users(db, datetime.now() - timedelta(days=1), 10) == {}
+
+
+def test_purge_run_works_through_every_batch(db):
+    for index in range(5):
+        _register(db, f"user{index}@example.com", f"987654321{index}")
+        crud.delete_user_by_phone(db, f"987654321{index}")
+    worker = PurgeWorker(True, 0, "", 2, 0, 60)
+    assert asyncio.run(worker.run_once()) == 5
+    assert worker.stats()["batches"] == 3
+    assert _mails(db, models.UserMaster) == []
+
+
+def test_purge_window_may_wrap_past_midnight():
+    assert parse_window("") is None
+    assert parse_window("22:00-04:30") == (1320, 270)
+    worker = PurgeWorker(True, 24, "22:00-04:30", 100, 0, 60)
+    assert worker.in_window(datetime(2024, 1, 1, 23, 15))
+    assert worker.in_window(datetime(2024, 1, 1, 4, 29))
+    assert not worker.in_window(datetime(2024, 1, 1, 12, 0))
+    assert PurgeWorker(True, 24, "", 100, 0, 60).in_window()
@@ -0,0 +1,39 @@
+import pytest
+from fastapi import HTTPException
+
+from ratelimit import LoginRateLimiter, MemoryTokenBucketStore
+
+
+def test_bucket_allows_its_capacity_then_reports_the_wait():
+    store = MemoryTokenBucketStore(10)
+    assert [store.take("k", 3, 1) for _ in range(3)] == [0, 0, 0]
+    assert 0.9 < store.take("k", 3, 1) <= 1
+
+
+def test_full_store_evicts_only_the_least_recently_used_bucket():
+    store = MemoryTokenBucketStore(3)
+    for key in ("a", "b", "c"):
+        store.take(key, 1, 0.001)
+    store.take("a", 1, 0.001)  # "a" is now the most recently used, "b" the least
+    store.take("d", 1, 0.001)
+    assert len(store) == 3
+    assert set(store._buckets) == {"c", "a", "d"}
+    # The evicted bucket starts over full (evicting "c" in turn); the others are still drained
+    assert store.take("b", 1, 0.001) == 0
+    assert store.take("a", 1, 0.001) > 0
+
+
+def test_limiter_rejects_with_429_per_identity_and_per_ip():
+    limiter = LoginRateLimiter(MemoryTokenBucketStore(100), identity_per_minute=2, ip_per_minute=3)
+    limiter.check("A@example.com", "10.0.0.1")
+    limiter.check("a@example.com ", "10.0.0.1")
+    with pytest.raises(HTTPException) as raised:
+        limiter.check("a@example.com", "10.0.0.1")
+    assert raised.value.status_code == 429
+    assert int(raised.value.headers["Retry-After"]) >= 1
+    with pytest.raises(HTTPException):
+        limiter.check("b@example.com", "10.0.0.1")
+    limiter.check("b@example.com", "10.0.0.2")
+    assert limiter.stats()["rejected_identity"] == 1
+    assert limiter.stats()["rejected_ip"] == 1
+    assert limiter.stats()["allowed"] == 3
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+import models
+from replicas import Replica, ReplicaRouter
+
+
+def _mail(session, email):
+    return session.scalar(select(models.UserMaster.user_mail).where(models.UserMaster.user_mail == email))
+
+
+def _add_user(session, email):
+    session.add(models.UserMaster(username="alice", user_mail=email, user_password="x", user_number="9876543210",
+                                  role_id=1, profession_id=1, country="IN", city="Pune"))
+    session.commit()
+
+
+@pytest.fixture
+def replica(tmp_path):
+    replica = Replica("replica0", f"sqlite:///{tmp_path / 'replica.db'}")
+    models.initialize_database(replica.engine)
+    yield replica
+    replica.engine.dispose()
+
+
+def test_reads_go_to_the_replica(db, replica):
+    session = replica.open_session()
+    _add_user(session, "a@example.com")
+    session.close()
+    router = ReplicaRouter([replica], "round_robin", 10, 5)
+    assert asyncio.run(router.read(db, _mail, "a@example.com", key="a@example.com")) == "a@example.com"
+    assert replica.reads == 1
+    assert router.stats()["primary_reads"] == 0
+
+
+def test_unknown_emails_are_not_retried_on_the_primary(db, replica):
+    _add_user(db, "a@example.com")  # Only on the primary: the replica lags behind
+    router = ReplicaRouter([replica], "round_robin", 10, 5)
+    assert asyncio.run(router.read(db, _mail, "a@example.com", key="a@example.com")) is None
+    assert router.stats()["primary_reads"] == 0
+    assert router.stats()["fallbacks"] == 0
+
+
+def test_identities_written_by_this_worker_are_read_from_the_primary(db, replica):
+    _add_user(db, "a@example.com")
+    router = ReplicaRouter([replica], "round_robin", 10, 5)
+    router.mark_written("a@example.com")
+    assert asyncio.run(router.read(db, _mail, "a@example.com", key="a@example.com")) == "a@example.com"
+    assert router.stats()["primary_reads"] == 1
+    assert replica.reads == 0
+
+
+def test_failing_replica_falls_back_to_the_primary_and_is_taken_out(db, tmp_path):
+    _add_user(db, "a@example.com")
+    broken = Replica("replica0", f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    router = ReplicaRouter([broken], "round_robin", 10, 5)
+    assert asyncio.run(router.read(db, _mail, "a@example.com")) == "a@example.com"
+    assert not broken.healthy
+    assert router.stats()["fallbacks"] == 1
+    # While unhealthy, reads go straight to the primary
+    asyncio.run(router.read(db, _mail, "a@example.com"))
+    assert router.stats()["primary_reads"] == 1
+    broken.engine.dispose()
@@ -0,0 +1,84 @@
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import revocation
+from revocation import MemoryRevocationStore
+
+
+def test_revoked_jti_until_expiry():
+    store = MemoryRevocationStore(100)
+    now = time.time()
+    store.revoke("live", now + 60)
+    store.revoke("expired", now - 1)
+    assert store.is_revoked("live", "a@example.com", now)
+    assert not store.is_revoked("other", "a@example.com", now)
+    assert not store.is_revoked("expired", "a@example.com", now)
+    assert not store.is_revoked(None, "a@example.com", now)
+
+
+def test_subject_cutoff_covers_tokens_issued_up_to_now():
+    store = MemoryRevocationStore(100)
+    now = time.time()
+    store.revoke_subject("a@example.com", now + 60)
+    assert store.is_revoked(None, "a@example.com", now - 3600)
+    assert store.is_revoked("any-jti", "a@example.com", int(now))
+    # Tokens issued after the cutoff (a later login) stay valid, as do other users' tokens
+    assert not store.is_revoked(None, "a@example.com", now + 2)
+    assert not store.is_revoked(None, "b@example.com", now - 3600)
+
+
+def test_subject_cutoff_is_forgotten_once_its_tokens_expired():
+    store = MemoryRevocationStore(100)
+    store.revoke_subject("a@example.com", time.time() - 1)
+    assert not store.is_revoked(None, "a@example.com", 0)
+    assert len(store) == 0
+
+
+def test_full_store_forgets_the_entry_closest_to_expiry():
+    store = MemoryRevocationStore(2)
+    now = time.time()
+    store.revoke("soonest", now + 10)
+    store.revoke("later", now + 100)
+    store.revoke("latest", now + 1000)
+    assert not store.is_revoked("soonest", "a@example.com", now)
+    assert store.is_revoked("later", "a@example.com", now)
+    assert store.is_revoked("latest", "a@example.com", now)
+    assert store.stats()["evicted"] == 1
+
+
+def test_revoke_user_tokens_outlives_refresh_tokens(monkeypatch):
+    store = MemoryRevocationStore(100)
+    monkeypatch.setattr(revocation, "revocation_store", store)
+    revocation.revoke_user_tokens("a@example.com", "b@example.com")
+    assert store.is_revoked(None, "a@example.com", time.time() - 1)
+    assert store.is_revoked(None, "b@example.com", time.time() - 1)
+    # Kept as long as the longest-lived token issued before it
+    _, until = store._subjects._entries["a@example.com"]
+    assert until >= time.time() + revocation.settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400 - 5
+
+
+def test_token_minted_right_after_the_cutoff_in_the_same_second_stays_valid(monkeypatch):
+    monkeypatch.setattr(revocation.time, "time", lambda: 1760000000.25)
+    store = MemoryRevocationStore(100)
+    store.revoke_subject("a@example.com", 1760000600)
+    assert store.is_revoked(None, "a@example.com", 1760000000.2)
+    assert not store.is_revoked(None, "a@example.com", 1760000000.3)
+
+
+def test_relogin_after_revoking_every_token_is_accepted(monkeypatch):
+    from jose import jwt
+
+    from auth import check_not_revoked
+    from utils import ALGORITHM, SECRET_KEY, create_access_token
+
+    store = MemoryRevocationStore(100)
+    monkeypatch.setattr(revocation, "revocation_store", store)
+    monkeypatch.setattr("auth.revocation_store", store)
+    old = jwt.decode(create_access_token({"sub": "a@example.com"}), SECRET_KEY, algorithms=[ALGORITHM])
+    revocation.revoke_user_tokens("a@example.com")
+    new = jwt.decode(create_access_token({"sub": "a@example.com"}), SECRET_KEY, algorithms=[ALGORITHM])
+    check_not_revoked(new)
+    with pytest.raises(HTTPException):
+        check_not_revoked(old)
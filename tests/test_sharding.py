@@ -0,0 +1,116 @@
+import pytest
+from sqlalchemy import func, select
+
+import manage
+import models
+from sharding import HashRing, Shard, ShardRouter, parse_shard_urls
+
+KEYS = [f"user{i}@example.com" for i in range(4000)]
+
+
+class _FakeShard:
+    def __init__(self, name):
+        self.name = name
+
+
+def _owners(ring):
+    return {key: ring.owner(key) for key in KEYS}
+
+
+def test_parse_shard_urls_names_bare_urls_by_position():
+    assert parse_shard_urls(["a=sqlite:////tmp/a.db", "mysql+pymysql://u:p@host/db"]) == [
+        ("a", "sqlite:////tmp/a.db"),
+        ("shard1", "mysql+pymysql://u:p@host/db"),
+    ]
+
+
+def test_ring_spreads_keys_evenly():
+    counts = {}
+    for owner in _owners(HashRing(["a", "b", "c", "d"], 160)).values():
+        counts[owner] = counts.get(owner, 0) + 1
+    assert set(counts) == {"a", "b", "c", "d"}
+    assert all(0.15 < count / len(KEYS) < 0.35 for count in counts.values())
+
+
+def test_adding_a_shard_moves_only_its_share_of_keys():
+    before = _owners(HashRing(["a", "b", "c"], 160))
+    after = _owners(HashRing(["a", "b", "c", "d"], 160))
+    moved = [key for key in KEYS if before[key] != after[key]]
+    # Keys only ever move to the new shard, and about 1/4 of them do
+    assert all(after[key] == "d" for key in moved)
+    assert 0.15 < len(moved) / len(KEYS) < 0.35
+
+
+def test_draining_shard_owns_no_keys_and_others_keep_theirs():
+    names = ["a", "b", "c"]
+    full = ShardRouter([_FakeShard(name) for name in names])
+    drained = ShardRouter([_FakeShard(name) for name in names], draining=["c"])
+    for key in KEYS:
+        owner = drained.shard_for(key).name
+        assert owner != "c"
+        if full.shard_for(key).name != "c":
+            assert owner == full.shard_for(key).name
+
+
+def test_keys_are_normalized():
+    router = ShardRouter([_FakeShard(name) for name in ("a", "b", "c")])
+    assert router.shard_for("  User7@Example.com ") is router.shard_for("user7@example.com")
+
+
+@pytest.fixture
+def shards(tmp_path):
+    created = []
+    for name in ("a", "b"):
+        shard = Shard(name, f"sqlite:///{tmp_path / name}.db")
+        models.initialize_database(shard.engine)
+        session = shard.SessionLocal()
+        session.add_all([models.UserRole(role_id=1, role_name="admin"), models.UserProfession(profession_id=1, profession_name="dev")])
+        session.commit()
+        session.close()
+        created.append(shard)
+    yield created
+    for shard in created:
+        shard.engine.dispose()
+
+
+def _count(shard, model):
+    session = shard.SessionLocal()
+    try:
+        return session.scalar(select(func.count()).select_from(model))
+    finally:
+        session.close()
+
+
+def test_rebalance_moves_users_and_directory_entries_to_their_owners(shards, monkeypatch):
+    a, b = shards
+    session = a.SessionLocal()
+    for i in range(40):
+        row = dict(username=f"user{i}", user_mail=f"user{i}@example.com", user_password="x", user_number=f"9{i:09d}",
+                   role_id=1, profession_id=1, country="IN", city="Pune")
+        session.add_all([models.UserRegistration(**row), models.UserMaster(**row), models.RegistrationLog(
+            username=row["username"], user_mail=row["user_mail"], role_id=1)])
+        session.add(models.UserDirectory(user_number=row["user_number"], user_mail=row["user_mail"]))
+    session.commit()
+    session.close()
+
+    # Every row starts on "a"; adding "b" to the ring makes it own part of them
+    router = ShardRouter([a, b])
+    monkeypatch.setattr(manage, "shard_router", router)
+
+    planned = manage.rebalance_shards(batch_size=7, dry_run=True)
+    assert set(planned) == {"users a->b", "directory entries a->b"}
+    assert _count(b, models.UserMaster) == 0
+
+    assert manage.rebalance_shards(batch_size=7, dry_run=False) == planned
+    for model in (models.UserRegistration, models.UserMaster, models.RegistrationLog, models.UserDirectory):
+        assert _count(a, model) + _count(b, model) == 40
+    for shard in shards:
+        session = shard.SessionLocal()
+        try:
+            assert all(router.shard_for(mail) is shard for mail in session.scalars(select(models.UserMaster.user_mail)))
+            assert all(router.shard_for(phone) is shard for phone in session.scalars(select(models.UserDirectory.user_number)))
+        finally:
+            session.close()
+
+    # Nothing is left to move
+    assert manage.rebalance_shards(batch_size=7, dry_run=False) == {}
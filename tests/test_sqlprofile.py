@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from sqlprofile import profiled
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'profile.db'}")
+    yield engine
+    engine.dispose()
+
+
+def test_statements_are_counted_into_the_current_profile(engine):
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))  # Outside any request: not profiled
+        with profiled() as profile:
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("SELECT 2"))
+    assert profile.statements == 2
+    assert profile.db_seconds > 0
+
+
+def test_failed_statements_do_not_leave_their_start_time_on_the_connection(engine):
+    with engine.connect() as connection:
+        with profiled() as failing:
+            with pytest.raises(OperationalError):
+                connection.execute(text("SELECT * FROM missing"))
+        assert connection.info.get("sql_profile_started") == []
+        with profiled() as following:
+            connection.execute(text("SELECT 1"))
+        assert connection.info.get("sql_profile_started") == []
+    assert failing.statements == 1
+    assert following.statements == 1